@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# ============================================================================
+#  Copyright (c) nexB Inc. http://www.nexb.com/ - All rights reserved.
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#      http://www.apache.org/licenses/LICENSE-2.0
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ============================================================================
+
+"""
+Read ABOUT files and the files they reference directly from zip and tar
+archives without extracting them.
+
+An opened archive is a virtual directory: the location of the archive file is
+used as the root directory of its members such that the member "docs/x.ABOUT"
+of "/src/project.zip" has the "/src/project.zip/docs/x.ABOUT" location. The
+functions of this module accept both virtual and regular locations: path
+existence checks are lookups in the index of the archive members and files are
+read from the archive. Nothing is extracted: a compressed tar archive is only
+decompressed once to an anonymous temporary file such that its members can be
+read in any order.
+"""
+
+import atexit
+import bz2
+import gzip
+import io
+import lzma
+import os
+import posixpath
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+from attributecode import util
+
+
+# extensions of the archives that can be opened as virtual directories
+ARCHIVE_EXTENSIONS = (
+    '.zip',
+    '.tar',
+    '.tar.gz',
+    '.tgz',
+    '.tar.bz2',
+    '.tbz2',
+    '.tar.xz',
+    '.txz',
+)
+
+# {normalized archive location: ArchiveIndex} of the opened archives
+opened_archives = {}
+
+# (magic bytes, open function) of the compressed tar archives
+TAR_DECOMPRESSORS = (
+    (b'\x1f\x8b', gzip.open),
+    (b'BZh', bz2.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+)
+
+
+def is_archive(location):
+    """
+    Return True if `location` is the path to an archive that can be opened as a
+    virtual directory based on its extension.
+    """
+    return location.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+class ArchiveIndex(object):
+    """
+    An index of the members of a zip or tar archive by their normalized posix
+    path.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        # anonymous temporary file of a decompressed tar archive
+        self.decompressed = None
+        # {path: zip or tar member} of the files
+        self.files = {}
+        # paths of the directories, including the directories that are only
+        # implied by the paths of the files
+        self.dirs = set([''])
+
+        if zipfile.is_zipfile(location):
+            self.archive = zipfile.ZipFile(location)
+            for info in self.archive.infolist():
+                self.add(info.filename, info, info.is_dir())
+        elif tarfile.is_tarfile(location):
+            self.archive = self.open_tar(location)
+            for info in self.archive.getmembers():
+                if info.isdir():
+                    self.add(info.name, info, True)
+                elif info.isfile() or info.islnk() or info.issym():
+                    self.add(info.name, info, False)
+        else:
+            raise Exception('Incorrect archive file %(location)r' % locals())
+
+    def add(self, name, member, is_dir):
+        path = util.normalize_member_name(name)
+        if not path:
+            return
+        if is_dir:
+            self.dirs.add(path)
+        else:
+            self.files[path] = member
+        parent = posixpath.dirname(path)
+        while parent not in self.dirs:
+            self.dirs.add(parent)
+            parent = posixpath.dirname(parent)
+
+    def open_tar(self, location):
+        """
+        Return a TarFile for the tar archive at `location`. A compressed
+        archive is decompressed first as reading its members in another order
+        than the archive order, such as the sorted order of their paths, would
+        otherwise decompress the archive again from its start for each member.
+        """
+        with open(location, 'rb') as inp:
+            magic = inp.read(6)
+        for prefix, open_compressed in TAR_DECOMPRESSORS:
+            if magic.startswith(prefix):
+                self.decompressed = tempfile.TemporaryFile()
+                with open_compressed(location) as inp:
+                    shutil.copyfileobj(inp, self.decompressed, util.EXTRACT_CHUNK_SIZE)
+                self.decompressed.seek(0)
+                return tarfile.open(fileobj=self.decompressed)
+        return tarfile.open(location)
+
+    def exists(self, path):
+        return path in self.files or path in self.dirs
+
+    def read(self, path):
+        """
+        Return the content of the file member at `path` as bytes.
+        """
+        member = self.files[path]
+        if isinstance(self.archive, zipfile.ZipFile):
+            return self.archive.read(member)
+        with self.archive.extractfile(member) as inp:
+            return inp.read()
+
+    def close(self):
+        self.archive.close()
+        if self.decompressed:
+            self.decompressed.close()
+
+
+def open_archive(location):
+    """
+    Open the zip or tar archive at `location` as a virtual directory and return
+    the absolute posix location of this virtual directory.
+    Raise an Exception if this is not a valid archive.
+    """
+    root = util.to_posix(util.get_absolute(location))
+    key = util.norm(root)
+    if key not in opened_archives:
+        if not opened_archives:
+            atexit.register(close_archives)
+        opened_archives[key] = ArchiveIndex(location)
+    return root
+
+
+def close_archives():
+    """
+    Close all the opened archives.
+    """
+    for index in opened_archives.values():
+        index.close()
+    opened_archives.clear()
+
+
+def find_member(location):
+    """
+    Return a tuple of (ArchiveIndex, member path) if `location` is in an opened
+    archive or (None, None) otherwise.
+    """
+    if not opened_archives:
+        return None, None
+    path = util.norm(location)
+    for key, index in opened_archives.items():
+        if path == key:
+            return index, ''
+        if path.startswith(key + '/'):
+            return index, path[len(key) + 1:]
+    return None, None
+
+
+def exists(location):
+    """
+    Return True if a file or directory exists at `location`.
+    """
+    index, path = find_member(location)
+    if index:
+        return index.exists(path)
+    return os.path.exists(location)
+
+
+def read_text(location):
+    """
+    Return the text of the UTF-8 file at `location`.
+    """
+    index, path = find_member(location)
+    if index:
+        # decode with universal newlines as for a regular file
+        with io.TextIOWrapper(io.BytesIO(index.read(path)), encoding='utf-8') as txt:
+            return txt.read()
+    with io.open(util.add_unc(location), encoding='utf-8') as txt:
+        return txt.read()
+
+
+def get_about_locations(location):
+    """
+    Return a list of locations of ABOUT files given the `location` of a file,
+    a directory tree or an opened archive containing ABOUT files.
+    File locations are normalized using posix path separators.
+    """
+    index, path = find_member(location)
+    if not index:
+        return list(util.get_about_locations(location))
+
+    root = util.to_posix(location).rstrip('/')
+    locations = []
+    for member in sorted(index.files):
+        if not util.is_about_file(member):
+            continue
+        if member == path:
+            locations.append(root)
+        elif not path:
+            locations.append(posixpath.join(root, member))
+        elif member.startswith(path + '/'):
+            locations.append(posixpath.join(root, member[len(path) + 1:]))
+    return locations
@@ -16,6 +16,7 @@
 
 import collections
 import datetime
+import hashlib
 import io
 import os
 
@@ -29,10 +30,20 @@ from attributecode.licenses import COMMON_LICENSES
 from attributecode.model import detect_special_char
 from attributecode.model import parse_license_expression
 from attributecode.util import add_unc
-from attributecode.attrib_util import multi_sort
+from attributecode.attrib_util import get_template
 
-DEFAULT_TEMPLATE_FILE = os.path.join(
-    os.path.dirname(os.path.realpath(__file__)), '../../templates', 'default_html.template')
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../../templates')
+
+DEFAULT_TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, 'default_html.template')
+
+# built-in templates used for a split attribution
+SPLIT_INDEX_TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, 'split_index_html.template')
+SPLIT_COMPONENTS_TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, 'split_components_html.template')
+SPLIT_LICENSES_TEMPLATE_FILE = os.path.join(TEMPLATES_DIR, 'split_licenses_html.template')
+
+SPLIT_INDEX_PAGE = 'index.html'
+SPLIT_LICENSES_PAGE = 'licenses.html'
+SPLIT_COMPONENTS_PAGE = 'components-{page_number}.html'
 
 
 def generate(abouts, template=None, variables=None):
@@ -44,8 +55,6 @@ def generate(abouts, template=None, variables=None):
     Return a tuple of (error, attribution text) where error is an Error object
     or None and attribution text is the generated text or None.
     """
-    rendered = None
-    error = None
     template_error = check_template(template)
     if template_error:
         lineno, message = template_error
@@ -55,125 +64,197 @@ def generate(abouts, template=None, variables=None):
         )
         return error, None
 
-    template = jinja2.Template(template)
-
     try:
-        captured_license = []
-        license_file_key_and_context = {}
-        sorted_license_file_key_and_context = {}
-        license_file_name_and_license_file_key = {}
-        license_key_and_license_name = {}
-        license_name_and_license_key = {}
-        license_key_and_license_file_name = {}
-        license_file_key_and_license_key = {}
-        # FIXME: This need to be simplified
-        for about in abouts:
-            # about.license_file.value is a OrderDict with license_file_name as
-            # the key and the license text as the value
-            if about.license_file:
-                # We want to create a dictionary which have the license file key as
-                # the key and license text as the value
-                # The reason we want to use license file key as the key instead of the
-                # license key is because there is a scenario such that the input only provide
-                # license_file but not license_key
-                # The license file key is bascially a license_key or a license file
-                # name if it's not generated from DJE. The reason for not using
-                # license file name as the key at the first place is because
-                # we need the license_key to match with the common license list
-                for license_file_name in about.license_file.value:
-                    if not license_file_name in captured_license:
-                        captured_license.append(license_file_name)
-                        license_file_key = get_license_file_key(license_file_name)
-                        license_file_key_and_context[license_file_key] = about.license_file.value[license_file_name]
-                        sorted_license_file_key_and_context = collections.OrderedDict(sorted(license_file_key_and_context.items()))
-                        license_file_name_and_license_file_key[license_file_name] = license_file_key
-
-            lic_list = []
-            lic_name_list = []
-            lic_name_expression_list = []
-            # Convert/map the key to name
-            if about.license_name.value:
-                if about.license_expression.value or about.license_key.value:
-                    if about.license_expression.value:
-                        special_char, lic_list = parse_license_expression(about.license_expression.value)
-                        about.license_key.value = lic_list
-                    else:
-                        lic_list = about.license_key.value
-                        special_char = []
-                        for lic in lic_list:
-                            special_char_list = detect_special_char(lic)
-                            if special_char_list:
-                                for char in special_char_list:
-                                    special_char.append(char)
-                    if special_char:
-                        error = Error(CRITICAL, 'Special character(s) are not allowed in '
-                                      'license_expression or license_key: %s' % special_char)
-                        return error, ''
+        error, license_mappings = get_license_mappings(abouts)
+        if error:
+            return error, ''
+    except Exception as e:
+        return get_template_processing_error(e), None
+
+    return render(template, abouts, license_mappings, variables)
+
+
+def get_license_mappings(abouts):
+    """
+    Return a tuple of (error, license mappings) where error is an Error object
+    or None and license mappings is a dict of the license-related template
+    variables computed from an `abouts` list of About objects.
+
+    These mappings are computed once and can be used to render any number of
+    templates from the same `abouts`.
+    Note: the About objects license_key and license_name_expression are updated
+    as a side effect.
+    """
+    error = None
+    captured_license = []
+    license_file_key_and_context = {}
+    license_file_name_and_license_file_key = {}
+    license_key_and_license_name = {}
+    license_name_and_license_key = {}
+    license_key_and_license_file_name = {}
+    license_file_key_and_license_key = {}
+    license_file_key_and_license_text_hash = {}
+    license_text_hash_and_context = {}
+    license_text_hash_and_license_file_keys = collections.defaultdict(list)
+    license_text_hash_and_abouts = collections.defaultdict(list)
+    # FIXME: This need to be simplified
+    for about in abouts:
+        # about.license_file.value is a OrderDict with license_file_name as
+        # the key and the license text as the value
+        if about.license_file:
+            # We want to create a dictionary which have the license file key as
+            # the key and license text as the value
+            # The reason we want to use license file key as the key instead of the
+            # license key is because there is a scenario such that the input only provide
+            # license_file but not license_key
+            # The license file key is bascially a license_key or a license file
+            # name if it's not generated from DJE. The reason for not using
+            # license file name as the key at the first place is because
+            # we need the license_key to match with the common license list
+            for license_file_name in about.license_file.value:
+                if not license_file_name in captured_license:
+                    captured_license.append(license_file_name)
+                    license_file_key = get_license_file_key(license_file_name)
+                    license_text = about.license_file.value[license_file_name]
+                    license_file_key_and_context[license_file_key] = license_text
+                    license_file_name_and_license_file_key[license_file_name] = license_file_key
+                    # Group the license files that share the same text
+                    # under different names so the text is only emitted once
+                    if license_text:
+                        text_hash = get_license_text_hash(license_text)
+                        license_file_key_and_license_text_hash[license_file_key] = text_hash
+                        license_text_hash_and_context.setdefault(text_hash, license_text)
+                        license_text_hash_and_license_file_keys[text_hash].append(license_file_key)
+
+                text_hash = license_file_key_and_license_text_hash.get(
+                    license_file_name_and_license_file_key[license_file_name])
+                if text_hash:
+                    referencing_abouts = license_text_hash_and_abouts[text_hash]
+                    # abouts are processed one at a time: only the last one
+                    # can already reference this text
+                    if not referencing_abouts or referencing_abouts[-1] is not about:
+                        referencing_abouts.append(about)
+
+        lic_list = []
+        lic_name_list = []
+        lic_name_expression_list = []
+        # Convert/map the key to name
+        if about.license_name.value:
+            if about.license_expression.value or about.license_key.value:
+                if about.license_expression.value:
+                    special_char, lic_list = parse_license_expression(about.license_expression.value)
+                    about.license_key.value = lic_list
                 else:
-                    # No license_key or license_expression present. We will put
-                    # None as the value of license key
-                    about.license_key.value = about.license_file.value.keys()
-                    lic_list = about.license_file.value.keys()
-
-                lic_name_list = about.license_name.value
-
-                # The order of the license_name and key should be the same
-                # The length for both list should be the same
-                assert len(lic_name_list) == len(lic_list)
-
-                # Map the license key to license name
-                index_for_license_name_list = 0
-                for key in lic_list:
-                    license_key_and_license_file_name[key] = list(about.license_file.value.keys())[index_for_license_name_list]
-                    license_key_and_license_name[key] = lic_name_list[index_for_license_name_list]
-                    license_name_and_license_key[lic_name_list[index_for_license_name_list]] = key
-                    license_file_key = license_file_name_and_license_file_key[license_key_and_license_file_name[key]]
-                    license_file_key_and_license_key[license_file_key] = key
-                    index_for_license_name_list = index_for_license_name_list + 1
-
-                # Create a license expression with license name instead of key
-                for segment in about.license_expression.value.split():
-                    if segment in license_key_and_license_name:
-                        lic_name_expression_list.append(license_key_and_license_name[segment])
-                    else:
-                        lic_name_expression_list.append(segment)
-
-                # Join the license name expression into a single string
-                lic_name_expression = ' '.join(lic_name_expression_list)
-
-                # Add the license name expression string into the about object
-                about.license_name_expression = lic_name_expression
+                    lic_list = about.license_key.value
+                    special_char = []
+                    for lic in lic_list:
+                        special_char_list = detect_special_char(lic)
+                        if special_char_list:
+                            for char in special_char_list:
+                                special_char.append(char)
+                if special_char:
+                    error = Error(CRITICAL, 'Special character(s) are not allowed in '
+                                  'license_expression or license_key: %s' % special_char)
+                    return error, {}
+            else:
+                # No license_key or license_expression present. We will put
+                # None as the value of license key
+                about.license_key.value = about.license_file.value.keys()
+                lic_list = about.license_file.value.keys()
+
+            lic_name_list = about.license_name.value
+
+            # The order of the license_name and key should be the same
+            # The length for both list should be the same
+            assert len(lic_name_list) == len(lic_list)
+
+            # Map the license key to license name
+            index_for_license_name_list = 0
+            for key in lic_list:
+                license_key_and_license_file_name[key] = list(about.license_file.value.keys())[index_for_license_name_list]
+                license_key_and_license_name[key] = lic_name_list[index_for_license_name_list]
+                license_name_and_license_key[lic_name_list[index_for_license_name_list]] = key
+                license_file_key = license_file_name_and_license_file_key[license_key_and_license_file_name[key]]
+                license_file_key_and_license_key[license_file_key] = key
+                index_for_license_name_list = index_for_license_name_list + 1
+
+            # Create a license expression with license name instead of key
+            for segment in about.license_expression.value.split():
+                if segment in license_key_and_license_name:
+                    lic_name_expression_list.append(license_key_and_license_name[segment])
+                else:
+                    lic_name_expression_list.append(segment)
+
+            # Join the license name expression into a single string
+            lic_name_expression = ' '.join(lic_name_expression_list)
+
+            # Add the license name expression string into the about object
+            about.license_name_expression = lic_name_expression
+
+    sorted_license_file_key_and_context = collections.OrderedDict(
+        sorted(license_file_key_and_context.items()))
+
+    # Sort the unique license texts using their first license file key
+    for file_keys in license_text_hash_and_license_file_keys.values():
+        file_keys.sort()
+    sorted_license_text_hash_and_context = collections.OrderedDict(
+        sorted(license_text_hash_and_context.items(),
+               key=lambda item: license_text_hash_and_license_file_keys[item[0]][0]))
+
+    license_mappings = dict(
+        license_file_key_and_context=sorted_license_file_key_and_context,
+        license_file_key_and_license_key=license_file_key_and_license_key,
+        license_file_name_and_license_file_key=license_file_name_and_license_file_key,
+        license_key_and_license_file_name=license_key_and_license_file_name,
+        license_key_and_license_name=license_key_and_license_name,
+        license_name_and_license_key=license_name_and_license_key,
+        license_file_key_and_license_text_hash=license_file_key_and_license_text_hash,
+        license_text_hash_and_context=sorted_license_text_hash_and_context,
+        license_text_hash_and_license_file_keys=dict(license_text_hash_and_license_file_keys),
+        license_text_hash_and_abouts=dict(license_text_hash_and_abouts),
+    )
+    return error, license_mappings
 
+
+def render(template, abouts, license_mappings, variables=None, **extra_context):
+    """
+    Render a `template` template text using an `abouts` list of About objects,
+    a `license_mappings` dict as returned by get_license_mappings() and a
+    `variables` optional dict of extra variables. Extra keyword arguments are
+    passed as-is to the template.
+
+    Return a tuple of (error, attribution text) where error is an Error object
+    or None and attribution text is the generated text or None.
+    """
+    rendered = None
+    error = None
+    try:
+        template = get_template(template)
         # Get the current UTC time
         utcnow = datetime.datetime.utcnow()
         rendered = template.render(
             abouts=abouts, common_licenses=COMMON_LICENSES,
-            license_file_key_and_context=sorted_license_file_key_and_context,
-            license_file_key_and_license_key=license_file_key_and_license_key,
-            license_file_name_and_license_file_key=license_file_name_and_license_file_key,
-            license_key_and_license_file_name=license_key_and_license_file_name,
-            license_key_and_license_name=license_key_and_license_name,
-            license_name_and_license_key=license_name_and_license_key,
             utcnow=utcnow,
             tkversion=__version__,
-            variables=variables
+            variables=variables,
+            **dict(license_mappings, **extra_context)
         )
     except Exception as e:
-        lineno = getattr(e, 'lineno', '') or ''
-        if lineno:
-            lineno = ' at line: {}'.format(lineno)
-        err = getattr(e, 'message', '') or ''
-#        error = Error(
-#            CRITICAL,
-#            'Template processing error {lineno}: {err}'.format(**locals()),
-#        )
-        error = Error(
-            CRITICAL,
-            'Template processing error:' + str(e),
-        )
+        error = get_template_processing_error(e)
     return error, rendered
 
 
+def get_template_processing_error(e):
+    """
+    Return a CRITICAL Error for an `e` exception raised when processing a
+    template.
+    """
+    return Error(
+        CRITICAL,
+        'Template processing error:' + str(e),
+    )
+
+
 def get_license_file_key(license_text_name):
     if license_text_name.endswith('.LICENSE'):
         # See https://github.com/nexB/aboutcode-toolkit/issues/439
@@ -183,14 +264,24 @@ def get_license_file_key(license_text_name):
         return license_text_name
 
 
+def get_license_text_hash(license_text):
+    """
+    Return a hash string for a `license_text` computed on its normalized content
+    such that the same license text stored in files with different line endings,
+    trailing spaces or surrounding empty lines have the same hash.
+    """
+    lines = (line.rstrip() for line in license_text.strip().splitlines())
+    normalized = '\n'.join(lines)
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
 def check_template(template_string):
     """
     Check the syntax of a template. Return an error tuple (line number,
     message) if the template is invalid or None if it is valid.
     """
     try:
-        jinja2.filters.FILTERS['multi_sort'] = multi_sort
-        jinja2.Template(template_string)
+        get_template(template_string)
     except (jinja2.TemplateSyntaxError, jinja2.TemplateAssertionError) as e:
         return e.lineno, e.message
 
@@ -217,7 +308,27 @@ def generate_and_save(abouts, output_location, template_loc=None, variables=None
     `template_loc` template file location and a `variables` optional
     dict of extra variables. Save the generated attribution text in the
     `output_location` file.
-    Return a list of Error objects if any.
+    Return a tuple of (list of Error objects, attribution text or None).
+    """
+    errors, rendered_texts = generate_and_save_all(
+        abouts,
+        template_and_output_locations=[(template_loc, output_location)],
+        variables=variables,
+    )
+    return errors, rendered_texts[0]
+
+
+def generate_and_save_all(abouts, template_and_output_locations, variables=None):
+    """
+    Generate attribution texts from an `abouts` list of About objects for each
+    (template file location, output file location) tuple of a
+    `template_and_output_locations` list and a `variables` optional dict of
+    extra variables. Save each generated attribution text in its output file.
+
+    The license mappings are computed only once and shared by all the
+    templates.
+    Return a tuple of (list of Error objects, list of attribution texts or
+    None, one for each template).
     """
     errors = []
 
@@ -231,18 +342,129 @@ def generate_and_save(abouts, output_location, template_loc=None, variables=None
                    str(special_char_in_expression))
             errors.append(Error(ERROR, msg))
 
-    rendering_error, rendered = generate_from_file(
-        abouts,
-        template_loc=template_loc,
-        variables=variables
-    )
+    try:
+        mapping_error, license_mappings = get_license_mappings(abouts)
+    except Exception as e:
+        mapping_error = get_template_processing_error(e)
+        license_mappings = None
+
+    if mapping_error:
+        errors.append(mapping_error)
+        return errors, [None for _ in template_and_output_locations]
+
+    rendered_texts = []
+    for template_loc, output_location in template_and_output_locations:
+        template_loc = add_unc(template_loc or DEFAULT_TEMPLATE_FILE)
+        with io.open(template_loc, encoding='utf-8') as tplf:
+            template = tplf.read()
+
+        template_error = check_template(template)
+        if template_error:
+            lineno, message = template_error
+            errors.append(Error(
+                CRITICAL,
+                'Template validation error at line: {lineno}: "{message}"'.format(**locals())
+            ))
+            rendered_texts.append(None)
+            continue
 
-    if rendering_error:
-        errors.append(rendering_error)
+        rendering_error, rendered = render(template, abouts, license_mappings, variables)
+        if rendering_error:
+            errors.append(rendering_error)
 
-    if rendered:
-        output_location = add_unc(output_location)
-        with io.open(output_location, 'w', encoding='utf-8') as of:
+        if rendered:
+            output_location = add_unc(output_location)
+            with io.open(output_location, 'w', encoding='utf-8') as of:
+                of.write(rendered)
+        rendered_texts.append(rendered)
+
+    return errors, rendered_texts
+
+
+def generate_split_and_save(abouts, output_dir, split_size=1000, variables=None):
+    """
+    Generate a split attribution from an `abouts` list of About objects and
+    a `variables` optional dict of extra variables as a set of HTML files saved
+    in the `output_dir` directory:
+
+     - an index page with links to every component,
+     - component pages with at most `split_size` components each,
+     - a license page with each unique license text.
+
+    Each page is rendered and saved on its own such that the size of each page
+    stays bounded regardless of the number of components.
+    Return a tuple of (list of Error objects, list of generated file locations).
+    """
+    errors = []
+    generated = []
+
+    if split_size < 1:
+        raise ValueError('split_size must be a positive integer.')
+
+    try:
+        mapping_error, license_mappings = get_license_mappings(abouts)
+    except Exception as e:
+        mapping_error = get_template_processing_error(e)
+
+    if mapping_error:
+        errors.append(mapping_error)
+        return errors, generated
+
+    output_dir = add_unc(output_dir)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    chunks = [abouts[start:start + split_size]
+              for start in range(0, len(abouts), split_size)]
+    page_count = len(chunks)
+    component_pages = [SPLIT_COMPONENTS_PAGE.format(page_number=page_number)
+                       for page_number in range(1, page_count + 1)]
+
+    # map each About object identity to its link in the component pages
+    about_links = {}
+    for page_index, chunk in enumerate(chunks):
+        start_index = page_index * split_size
+        for index, about in enumerate(chunk, start_index):
+            about_links[id(about)] = '{}#component_{}'.format(component_pages[page_index], index)
+
+    def component_link(about):
+        return about_links.get(id(about), '')
+
+    common_context = dict(
+        component_pages=component_pages,
+        component_link=component_link,
+        index_page=SPLIT_INDEX_PAGE,
+        licenses_page=SPLIT_LICENSES_PAGE,
+    )
+
+    def render_and_save(template_loc, page_abouts, page_name, **page_context):
+        with io.open(add_unc(template_loc), encoding='utf-8') as tplf:
+            template = tplf.read()
+        context = dict(common_context, **page_context)
+        rendering_error, rendered = render(
+            template, page_abouts, license_mappings, variables, **context)
+        if rendering_error:
+            errors.append(rendering_error)
+            return
+        page_location = os.path.join(output_dir, page_name)
+        with io.open(page_location, 'w', encoding='utf-8') as of:
             of.write(rendered)
+        generated.append(page_location)
+
+    render_and_save(SPLIT_INDEX_TEMPLATE_FILE, abouts, SPLIT_INDEX_PAGE)
+
+    for page_index, chunk in enumerate(chunks):
+        render_and_save(
+            SPLIT_COMPONENTS_TEMPLATE_FILE,
+            chunk,
+            component_pages[page_index],
+            start_index=page_index * split_size,
+            page_number=page_index + 1,
+            page_count=page_count,
+            previous_page=component_pages[page_index - 1] if page_index else None,
+            next_page=component_pages[page_index + 1] if page_index + 1 < page_count else None,
+        )
+
+    render_and_save(SPLIT_LICENSES_TEMPLATE_FILE, abouts, SPLIT_LICENSES_PAGE)
 
-    return errors, rendered
+    return errors, generated
@@ -14,6 +14,8 @@
 #  limitations under the License.
 # ============================================================================
 
+from functools import lru_cache
+
 from jinja2 import Environment
 from jinja2.filters import environmentfilter
 from jinja2.filters import make_attrgetter
@@ -25,17 +27,67 @@ Extra JINJA2 custom filters and other template utilities.
 """
 
 
-def get_template(template_text):
+@lru_cache(maxsize=1)
+def get_environment():
     """
-    Return a template built from a text string.
-    Register custom templates as needed.
+    Return the shared template Environment used to render all the attribution
+    templates with our custom filters registered.
+    Autoescaping is disabled such that the output is the same as with a plain
+    jinja2.Template.
     """
-    env = Environment(autoescape=True)
+    env = Environment(autoescape=False)
     # register our custom filters
     env.filters.update(dict(
         unique_together=unique_together,
-        multi_sort=multi_sort))
-    return env.from_string(template_text)
+        multi_sort=multi_sort,
+        group_by_license=group_by_license))
+    return env
+
+
+@lru_cache(maxsize=32)
+def get_template(template_text):
+    """
+    Return a template compiled from a text string using the shared Environment.
+    Compiled templates are cached such that rendering the same template text
+    several times compiles it only once.
+    """
+    return get_environment().from_string(template_text)
+
+
+@lru_cache(maxsize=256)
+def get_attribute_getters(environment, attributes, case_sensitive=False):
+    """
+    Return a tuple of attribute getter functions, one for each name in an
+    `attributes` tuple of attribute names. Ignore the case of strings unless
+    `case_sensitive` is True.
+    """
+    do_ignore_case = ignore_case if not case_sensitive else None
+    return tuple(
+        make_attrgetter(environment, attribute, postprocess=do_ignore_case)
+        for attribute in attributes)
+
+
+def make_hashable(value):
+    """
+    Return a hashable equivalent of a `value`: lists and tuples are converted
+    to tuples, sets to frozensets and mappings to frozensets of items,
+    recursively. Other unhashable values are converted using their repr.
+    The type of each value is part of its hashable equivalent such that equal
+    values of different types such as 1, 1.0 and True are kept apart.
+    """
+    value_type = type(value)
+    if isinstance(value, (list, tuple)):
+        return value_type, tuple(make_hashable(v) for v in value)
+    if isinstance(value, dict):
+        return value_type, frozenset(
+            (make_hashable(k), make_hashable(v)) for k, v in value.items())
+    if isinstance(value, (set, frozenset)):
+        return value_type, frozenset(make_hashable(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return value_type, repr(value)
+    return value_type, value
 
 
 @environmentfilter
@@ -58,12 +110,8 @@ def multi_sort(environment, value, reverse=False, case_sensitive=False,
             'such as in: '
             "for item in iterable|multi_sort(attributes=['date', 'name'])")
 
-    # build a list of attribute getters, one for each attribute
-    do_ignore_case = ignore_case if not case_sensitive else None
-    attribute_getters = []
-    for attribute in attributes:
-        ag = make_attrgetter(environment, attribute, postprocess=do_ignore_case)
-        attribute_getters.append(ag)
+    attribute_getters = get_attribute_getters(
+        environment, tuple(attributes), case_sensitive)
 
     # build a key function that has runs all attribute getters
     def key(v):
@@ -92,17 +140,13 @@ def unique_together(environment, value, case_sensitive=False, attributes=None):
             'such as in: '
             "{% for item in iterable|unique_together(attributes=['date', 'name']) %} ")
 
-    # build a list of attribute getters, one for each attribute
-    do_ignore_case = ignore_case if not case_sensitive else None
-    attribute_getters = []
-    for attribute in attributes:
-        ag = make_attrgetter(environment, attribute, postprocess=do_ignore_case)
-        attribute_getters.append(ag)
+    attribute_getters = get_attribute_getters(
+        environment, tuple(attributes), case_sensitive)
 
     # build a unique_key function that has runs all attribute getters
     # and returns a hashable tuple
     def unique_key(v):
-        return tuple(repr(a(v)) for a in attribute_getters)
+        return tuple(make_hashable(a(v)) for a in attribute_getters)
 
     unique = []
     seen = set()
@@ -112,3 +156,37 @@ def unique_together(environment, value, case_sensitive=False, attributes=None):
             seen.add(key)
             unique.append(item)
     return unique
+
+
+@environmentfilter
+def group_by_license(environment, value, attribute='license_key.value'):
+    """
+    Return a list of (license key, list of items) tuples grouping the items of
+    an iterable by license key, sorted by license key ignoring case. The license
+    keys of each item are found in an "attribute" name and are a list of keys or
+    a single key. Items without a license key are not included. The items order
+    is preserved in each group.
+
+    .. sourcecode:: jinja
+
+        {% for license_key, about_objects in abouts|group_by_license %}
+            ...
+        {% endfor %}
+    """
+    license_keys_getter, = get_attribute_getters(
+        environment, (attribute,), case_sensitive=True)
+
+    groups = {}
+    for item in value:
+        license_keys = license_keys_getter(item)
+        if not license_keys:
+            continue
+        if isinstance(license_keys, str):
+            license_keys = [license_keys]
+        for license_key in license_keys:
+            group = groups.setdefault(license_key, [])
+            # an item may list the same key more than once
+            if not group or group[-1] is not item:
+                group.append(item)
+
+    return sorted(groups.items(), key=lambda kv: (kv[0].lower(), kv[0]))
@@ -29,16 +29,28 @@ from attributecode.util import unique
 from attributecode import __about_spec_version__
 from attributecode import __version__
 from attributecode import severities
+from attributecode.archive import is_archive
+from attributecode.archive import open_archive
 from attributecode.attrib import check_template
 from attributecode.attrib import DEFAULT_TEMPLATE_FILE
-from attributecode.attrib import generate_and_save as generate_attribution_doc
+from attributecode.attrib import generate_and_save_all as generate_attribution_docs
+from attributecode.attrib import generate_split_and_save as generate_split_attribution
 from attributecode.gen import generate as generate_about_files, load_inventory
 from attributecode.model import collect_inventory, get_copy_list
+from attributecode.model import FieldNamesTracker
+from attributecode.model import archive_redist_src
 from attributecode.model import copy_redist_src
+from attributecode.model import dedup_redist_src
+from attributecode.model import sync_redist_src
 from attributecode.model import write_output
+from attributecode.query import compile_filter
+from attributecode.util import COMPRESSIONS
+from attributecode.util import COPY_THREADS
 from attributecode.util import extract_zip
 from attributecode.util import filter_errors
-from attributecode.util import get_temp_dir
+from attributecode.util import get_archive_format
+from attributecode.util import get_extract_cache_dir
+from attributecode.util import LINK_MODES
 
 __copyright__ = """
     Copyright (c) nexB Inc and others. All rights reserved.
@@ -124,13 +136,31 @@ def validate_extensions(ctx, param, value, extensions=tuple(('.csv', '.json',)))
             'Invalid {param} file extension: must be one of: {msg}'.format(**locals()))
     return value
 
+
+def validate_filter(ctx, param, value):
+    """
+    Return a predicate function compiled from a filter expression or None.
+    """
+    if not value:
+        return
+    try:
+        return compile_filter(value)
+    except ValueError as e:
+        raise click.UsageError('Invalid filter: {}'.format(e))
+
+
+FILTER_HELP = (
+    'Only use the components matching a filter EXPRESSION such as '
+    '"redistribute=yes and license in (gpl-*, lgpl-*)". See the reference '
+    'documentation for the filter syntax.')
+
 ######################################################################
 # inventory subcommand
 ######################################################################
 
 
 @about.command(cls=AboutCommand,
-    short_help='Collect the inventory of .ABOUT files to a CSV or JSON file.')
+    short_help='Collect the inventory of .ABOUT files to a CSV, JSON, JSON lines or SQLite file.')
 
 @click.argument('location',
     required=True,
@@ -147,9 +177,14 @@ def validate_extensions(ctx, param, value, extensions=tuple(('.csv', '.json',)))
     is_flag=False,
     default='csv',
     show_default=True,
-    type=click.Choice(['json', 'csv']),
+    type=click.Choice(['json', 'csv', 'jsonl', 'sqlite']),
     help='Set OUTPUT inventory file format.')
 
+@click.option('--filter', 'predicate',
+    metavar='EXPRESSION',
+    callback=validate_filter,
+    help=FILTER_HELP)
+
 @click.option('-q', '--quiet',
     is_flag=True,
     help='Do not print error or warning messages.')
@@ -159,23 +194,26 @@ def validate_extensions(ctx, param, value, extensions=tuple(('.csv', '.json',)))
     help='Show all error and warning messages.')
 
 @click.help_option('-h', '--help')
-def inventory(location, output, format, quiet, verbose):  # NOQA
+def inventory(location, output, format, predicate, quiet, verbose):  # NOQA
     """
-Collect the inventory of ABOUT file data as CSV or JSON.
+Collect the inventory of ABOUT file data as CSV, JSON, JSON lines or SQLite.
 
-LOCATION: Path to an ABOUT file or a directory with ABOUT files.
+LOCATION: Path to an ABOUT file, a directory or a zip or tar archive with ABOUT
+files.
 
-OUTPUT: Path to the JSON or CSV inventory file to create.
+OUTPUT: Path to the JSON, JSON lines, CSV or SQLite inventory file to create.
     """
     if not quiet:
         print_version()
         click.echo('Collecting inventory from ABOUT files...')
 
-    if location.lower().endswith('.zip'):
-        # accept zipped ABOUT files as input
-        location = extract_zip(location)
-    errors, abouts = collect_inventory(location)
-    write_errors = write_output(abouts=abouts, location=output, format=format)
+    if is_archive(location):
+        # read the ABOUT files from the archive without extracting it
+        location = open_archive(location)
+    tracker = FieldNamesTracker()
+    errors, abouts = collect_inventory(location, tracker=tracker, predicate=predicate)
+    write_errors = write_output(
+        abouts=abouts, location=output, format=format, tracker=tracker, errors=errors)
     errors.extend(write_errors)
     errors = unique(errors)
     errors_count = report_errors(errors, quiet, verbose, log_file_loc=output + '-error.log')
@@ -190,7 +228,7 @@ OUTPUT: Path to the JSON or CSV inventory file to create.
 
 
 @about.command(cls=AboutCommand,
-    short_help='Generate .ABOUT files from an inventory as CSV or JSON.')
+    short_help='Generate .ABOUT files from an inventory as CSV, JSON, JSON lines or SQLite.')
 
 @click.argument('location',
     required=True,
@@ -232,9 +270,9 @@ OUTPUT: Path to the JSON or CSV inventory file to create.
 @click.help_option('-h', '--help')
 def gen(location, output, android, fetch_license, reference, quiet, verbose):
     """
-Given a CSV/JSON inventory, generate ABOUT files in the output location.
+Given a CSV/JSON/JSON lines/SQLite inventory, generate ABOUT files in the output location.
 
-LOCATION: Path to a JSON or CSV inventory file.
+LOCATION: Path to a JSON, JSON lines, CSV or SQLite inventory file.
 
 OUTPUT: Path to a directory where ABOUT files are generated.
     """
@@ -243,8 +281,9 @@ OUTPUT: Path to a directory where ABOUT files are generated.
         click.echo('Generating .ABOUT files...')
 
     # FIXME: This should be checked in the `click`
-    if not location.endswith(('.csv', '.json',)):
-        raise click.UsageError('ERROR: Invalid input file extension: must be one .csv or .json.')
+    if not location.endswith(('.csv', '.json', '.jsonl', '.sqlite',)):
+        raise click.UsageError(
+            'ERROR: Invalid input file extension: must be one .csv, .json, .jsonl or .sqlite.')
 
     errors, abouts = generate_about_files(
         location=location,
@@ -282,8 +321,25 @@ def validate_template(ctx, param, value):
     return value
 
 
+def validate_template_outputs(ctx, param, value):
+    """
+    Return a list of (template location, output location) tuples if all the
+    templates are valid or raise a UsageError otherwise.
+    """
+    if not value:
+        return []
+
+    template_outputs = []
+    for template, output in value:
+        if not os.path.isfile(template):
+            raise click.UsageError(
+                'Invalid template file: {template} does not exist.'.format(**locals()))
+        template_outputs.append((validate_template(ctx, param, template), output))
+    return template_outputs
+
+
 @about.command(cls=AboutCommand,
-    short_help='Generate an attribution document from .ABOUT files.')
+    short_help='Generate an attribution document from .ABOUT files or an inventory.')
 
 @click.argument('location',
     required=True,
@@ -294,7 +350,7 @@ def validate_template(ctx, param, value):
 @click.argument('output',
     required=True,
     metavar='OUTPUT',
-    type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True))
+    type=click.Path(exists=False, dir_okay=True, writable=True, resolve_path=True))
 
 @click.option('--template',
     metavar='FILE',
@@ -303,12 +359,40 @@ def validate_template(ctx, param, value):
     help='Path to an optional custom attribution template to generate the '
          'attribution document. If not provided the default built-in template is used.')
 
+@click.option('--template-output',
+    multiple=True,
+    nargs=2,
+    callback=validate_template_outputs,
+    metavar='FILE OUTPUT',
+    type=click.Path(exists=False, dir_okay=False, resolve_path=True),
+    help='Generate an additional attribution document at OUTPUT using the FILE '
+         'custom attribution template. Can be used multiple times to generate '
+         'several documents from a single collection of the .ABOUT files.')
+
 @click.option('--vartext',
     multiple=True,
     callback=validate_key_values,
     metavar='<key>=<value>',
     help='Add variable text as key=value for use in a custom attribution template.')
 
+@click.option('--split-size',
+    metavar='INTEGER',
+    type=click.IntRange(min=1),
+    help='Generate a split attribution in the OUTPUT directory with an index '
+         'page, a licenses page and component pages each with at most INTEGER '
+         'components. Cannot be combined with custom templates.')
+
+@click.option('--reference',
+    metavar='DIR',
+    type=click.Path(exists=True, file_okay=False, readable=True, resolve_path=True),
+    help='Path to a directory with the license and notice text files of an '
+         'inventory LOCATION. Default to the directory of the inventory.')
+
+@click.option('--filter', 'predicate',
+    metavar='EXPRESSION',
+    callback=validate_filter,
+    help=FILTER_HELP)
+
 @click.option('-q', '--quiet',
     is_flag=True,
     help='Do not print error or warning messages.')
@@ -318,32 +402,81 @@ def validate_template(ctx, param, value):
     help='Show all error and warning messages.')
 
 @click.help_option('-h', '--help')
-def attrib(location, output, template, vartext, quiet, verbose):
+def attrib(location, output, template, template_output, vartext, split_size, reference,
+           predicate, quiet, verbose):
     """
-Generate an attribution document at OUTPUT using .ABOUT files at LOCATION.
+Generate an attribution document at OUTPUT using .ABOUT files or an inventory
+at LOCATION.
 
-LOCATION: Path to a file, directory or .zip archive containing .ABOUT files.
+LOCATION: Path to a file, directory or zip or tar archive containing .ABOUT files
+or to a CSV, JSON, JSON lines or SQLite inventory file.
 
-OUTPUT: Path where to write the attribution document.
+OUTPUT: Path where to write the attribution document or a directory when
+using --split-size.
     """
+    if split_size:
+        custom_template = os.path.realpath(template) != os.path.realpath(DEFAULT_TEMPLATE_FILE)
+        if custom_template or template_output:
+            raise click.UsageError(
+                'The --split-size option cannot be combined with the '
+                '--template or --template-output options.')
+        if os.path.isfile(output):
+            raise click.UsageError(
+                'OUTPUT must be a directory when using the --split-size option.')
+    elif os.path.isdir(output):
+        raise click.UsageError('OUTPUT must be a file, not a directory.')
+
+    from_inventory = location.endswith(('.csv', '.json', '.jsonl', '.sqlite',))
+    if reference and not from_inventory:
+        raise click.UsageError(
+            'The --reference option can only be used with an inventory LOCATION.')
+
     if not quiet:
         print_version()
         click.echo('Generating attribution...')
 
-    # accept zipped ABOUT files as input
-    if location.lower().endswith('.zip'):
-        location = extract_zip(location)
+    if is_archive(location):
+        # read the ABOUT files from the archive without extracting it
+        location = open_archive(location)
 
-    errors, abouts = collect_inventory(location)
+    if from_inventory:
+        # build the About objects in memory: license and notice files are
+        # relative to the reference or inventory directory
+        errors, abouts = load_inventory(
+            location=location,
+            base_dir=os.path.dirname(location),
+            reference_dir=reference,
+            check_paths=False,
+            predicate=predicate,
+        )
+    else:
+        errors, abouts = collect_inventory(location, predicate=predicate)
 
     if not abouts:
         msg = 'No ABOUT file is found. Attribution generation halted.'
         click.echo(msg)
         sys.exit(1)
-    attrib_errors, rendered = generate_attribution_doc(
+
+    if split_size:
+        attrib_errors, generated_locations = generate_split_attribution(
+            abouts=abouts,
+            output_dir=output,
+            split_size=split_size,
+            variables=vartext,
+        )
+        errors.extend(attrib_errors)
+        errors = unique(errors)
+        errors_count = report_errors(errors, quiet, verbose, log_file_loc=output + '-error.log')
+        if not quiet:
+            pages_count = len(generated_locations)
+            msg = '{pages_count} attribution pages generated in: {output}'.format(**locals())
+            click.echo(msg)
+        sys.exit(errors_count)
+
+    template_and_output_locations = [(template, output)] + template_output
+    attrib_errors, rendered_texts = generate_attribution_docs(
         abouts=abouts,
-        output_location=output,
-        template_loc=template,
+        template_and_output_locations=template_and_output_locations,
         variables=vartext,
     )
     errors.extend(attrib_errors)
@@ -351,12 +484,13 @@ OUTPUT: Path where to write the attribution document.
     errors_count = report_errors(errors, quiet, verbose, log_file_loc=output + '-error.log')
 
     if not quiet:
-        if rendered:
-            msg = 'Attribution generated in: {output}'.format(**locals())
-            click.echo(msg)
-        else:
-            msg = 'Attribution generation failed.'
-            click.echo(msg)
+        for (_template, output_location), rendered in zip(template_and_output_locations, rendered_texts):
+            if rendered:
+                msg = 'Attribution generated in: {output_location}'.format(**locals())
+                click.echo(msg)
+            else:
+                msg = 'Attribution generation failed for: {output_location}'.format(**locals())
+                click.echo(msg)
     sys.exit(errors_count)
 
 ######################################################################
@@ -380,8 +514,9 @@ OUTPUT: Path where to write the attribution document.
 @click.option('--from-inventory',
     metavar='FILE',
     type=click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True),
-    help='Path to an inventory CSV/JSON file as the base list for files/directories '
-         'that need to be copied which have the \'redistribute\' flagged.')
+    help='Path to an inventory CSV/JSON/JSON lines/SQLite file as the base list for '
+         'files/directories that need to be copied which have the '
+         '\'redistribute\' flagged.')
 
 @click.option('--with-structures',
     is_flag=True,
@@ -389,7 +524,57 @@ OUTPUT: Path where to write the attribution document.
 
 @click.option('--zip',
     is_flag=True,
-    help='Zip the copied sources to the output location.')
+    help='Stream the sources to a zip, tar.gz or tar.xz archive at the output location.')
+
+@click.option('--compression',
+    type=click.Choice(COMPRESSIONS),
+    default='auto',
+    show_default=True,
+    help='Compression of the zip archive members with --zip. "auto" stores the '
+         'files that are already compressed and deflates the other files.')
+
+@click.option('--incremental',
+    is_flag=True,
+    help='Only copy the files that changed since the previous incremental copy to '
+         'the output directory and remove the files that are no longer selected. '
+         'The state of the copy is saved in an OUTPUT-manifest.json file.')
+
+@click.option('--checksum',
+    is_flag=True,
+    help='With --incremental, compare files with their size and SHA1 checksum instead '
+         'of their size and modification time.')
+
+@click.option('--dedup',
+    is_flag=True,
+    help='Store the files with the same content once: as hard links in the output '
+         'directory or in tar archives, or listed in a dedup-manifest.json member of '
+         'zip archives.')
+
+@click.option('--link-mode',
+    type=click.Choice(LINK_MODES),
+    default='copy',
+    show_default=True,
+    help='Create the files as copies, as hard links or as reflinks (copy-on-write '
+         'clones). Hard links share their content with the sources. Hard links and '
+         'reflinks fall back to copies when the file system does not support them.')
+
+@click.option('--threads',
+    metavar='INTEGER',
+    type=click.IntRange(min=1),
+    default=COPY_THREADS,
+    show_default=True,
+    help='Number of threads used to copy files in parallel.')
+
+@click.option('--extract-cache',
+    is_flag=True,
+    help='Keep a zip LOCATION extracted in the aboutcode-toolkit/extract-cache '
+         'directory of the user cache directory such that the same zip file is '
+         'extracted only once across runs. Delete this directory to clear the cache.')
+
+@click.option('--filter', 'predicate',
+    metavar='EXPRESSION',
+    callback=validate_filter,
+    help=FILTER_HELP)
 
 @click.option('-q', '--quiet',
     is_flag=True,
@@ -400,7 +585,9 @@ OUTPUT: Path where to write the attribution document.
     help='Show all error and warning messages.')
 
 @click.help_option('-h', '--help')
-def collect_redist_src(location, output, from_inventory, with_structures, zip, quiet, verbose):
+def collect_redist_src(location, output, from_inventory, with_structures, zip, compression,
+                       incremental, checksum, dedup, link_mode, threads, extract_cache,
+                       predicate, quiet, verbose):
     """
 Collect sources that have 'redistribute' flagged as 'True' in .ABOUT files or inventory
 to the output location.
@@ -408,12 +595,21 @@ to the output location.
 LOCATION: Path to a directory containing sources that need to be copied
 (and containing ABOUT files if `inventory` is not provided)
 
-OUTPUT: Path to a directory or a zip file where sources will be copied to.
+OUTPUT: Path to a directory or a zip, tar.gz or tar.xz file where sources will be
+copied to.
     """
     if zip:
-        if not output.endswith('.zip'):
-            click.echo('The output needs to be a zip file.')
+        if not get_archive_format(output):
+            click.echo('The output needs to be a zip, tar.gz or tar.xz file.')
             sys.exit()
+        if incremental:
+            raise click.UsageError('--incremental cannot be used with --zip.')
+
+    if checksum and not incremental:
+        raise click.UsageError('--checksum can only be used with --incremental.')
+
+    if dedup and incremental:
+        raise click.UsageError('--dedup cannot be used with --incremental.')
 
     if not quiet:
         print_version()
@@ -421,28 +617,40 @@ OUTPUT: Path to a directory or a zip file where sources will be copied to.
 
     if location.lower().endswith('.zip'):
         # accept zipped ABOUT files as input
-        location = extract_zip(location)
+        cache_dir = get_extract_cache_dir() if extract_cache else None
+        location = extract_zip(location, cache_dir=cache_dir, threads=threads)
 
     if from_inventory:
-        errors, abouts = load_inventory(from_inventory, location)
+        errors, abouts = load_inventory(from_inventory, location, predicate=predicate)
     else:
-        errors, abouts = collect_inventory(location)
+        errors, abouts = collect_inventory(location, predicate=predicate)
 
+    copy_list, copy_list_errors = get_copy_list(abouts, location)
     if zip:
-        # Copy to a temp location and the zip to the output location
-        output_location = get_temp_dir()
+        copy_errors, counts = archive_redist_src(
+            copy_list, location, output, with_structures, compression=compression,
+            dedup=dedup, threads=threads)
+    elif dedup:
+        copy_errors, counts = dedup_redist_src(
+            copy_list, location, output, with_structures,
+            link_mode=link_mode, threads=threads)
+    elif incremental:
+        manifest_location = output.rstrip('\\/') + '-manifest.json'
+        copy_errors, counts = sync_redist_src(
+            copy_list, location, output, with_structures, manifest_location,
+            checksum=checksum, link_mode=link_mode, threads=threads)
+        if not quiet:
+            msg = ('Copied {copied} files, skipped {unchanged} unchanged files '
+                   'and removed {removed} files.'.format(**counts))
+            click.echo(msg)
     else:
-        output_location = output
-
-    copy_list, copy_list_errors = get_copy_list(abouts, location)
-    copy_errors = copy_redist_src(copy_list, location, output_location, with_structures)
+        copy_errors = copy_redist_src(
+            copy_list, location, output, with_structures,
+            link_mode=link_mode, threads=threads)
 
-    if zip:
-        import shutil
-        # Stripped the .zip extension as the `shutil.make_archive` will
-        # append the .zip extension
-        output_no_extension = output.rsplit('.', 1)[0]
-        shutil.make_archive(output_no_extension, 'zip', output_location)
+    if dedup and not quiet:
+        msg = ('Deduplicated {duplicates} files and saved {saved} bytes.'.format(**counts))
+        click.echo(msg)
 
     errors.extend(copy_list_errors)
     errors.extend(copy_errors)
@@ -478,10 +686,14 @@ def check(location, verbose):
     """
 Check .ABOUT file(s) at LOCATION for validity and print error messages.
 
-LOCATION: Path to an ABOUT file or a directory with ABOUT files.
+LOCATION: Path to an ABOUT file, a directory or a zip or tar archive with ABOUT
+files.
     """
     print_version()
     click.echo('Checking ABOUT files...')
+    if is_archive(location):
+        # read the ABOUT files from the archive without extracting it
+        location = open_archive(location)
     errors, _abouts = collect_inventory(location)
     errors = unique(errors)
     severe_errors_count = report_errors(errors, quiet=False, verbose=verbose)
@@ -501,17 +713,17 @@ def print_config_help(ctx, param, value):
 
 
 @about.command(cls=AboutCommand,
-    short_help='Transform a CSV/JSON by applying renamings, filters and checks.')
+    short_help='Transform a CSV/JSON/JSON lines by applying renamings, filters and checks.')
 
 @click.argument('location',
     required=True,
-    callback=partial(validate_extensions, extensions=('.csv', '.json',)),
+    callback=partial(validate_extensions, extensions=('.csv', '.json', '.jsonl',)),
     metavar='LOCATION',
     type=click.Path(exists=True, dir_okay=False, readable=True, resolve_path=True))
 
 @click.argument('output',
     required=True,
-    callback=partial(validate_extensions, extensions=('.csv', '.json',)),
+    callback=partial(validate_extensions, extensions=('.csv', '.json', '.jsonl',)),
     metavar='OUTPUT',
     type=click.Path(exists=False, dir_okay=False, writable=True, resolve_path=True))
 
@@ -526,6 +738,20 @@ def print_config_help(ctx, param, value):
     callback=print_config_help,
     help='Show configuration file format help and exit.')
 
+@click.option('--max-errors',
+    metavar='INTEGER',
+    type=click.IntRange(min=1),
+    help='Stop after this number of rows missing required values. '
+         'Default is to check all the rows.')
+
+@click.option('-p', '--processes',
+    metavar='INTEGER',
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help='Number of processes used to transform a CSV file in parallel chunks. '
+         'Only used when transforming a CSV to a CSV.')
+
 @click.option('-q', '--quiet',
     is_flag=True,
     help='Do not print error or warning messages.')
@@ -535,33 +761,29 @@ def print_config_help(ctx, param, value):
     help='Show all error and warning messages.')
 
 @click.help_option('-h', '--help')
-def transform(location, output, configuration, quiet, verbose):  # NOQA
+def transform(location, output, configuration, max_errors, processes, quiet, verbose):  # NOQA
     """
-Transform the CSV/JSON file at LOCATION by applying renamings, filters and checks
-and then write a new CSV/JSON to OUTPUT (Format for input and output need to be
-the same).
+Transform the CSV/JSON/JSON lines file at LOCATION by applying renamings, filters
+and checks and then write a new CSV/JSON/JSON lines to OUTPUT. The formats of
+LOCATION and OUTPUT are based on their extensions and can be different.
 
-LOCATION: Path to a CSV/JSON file.
+LOCATION: Path to a CSV/JSON/JSON lines file.
 
-OUTPUT: Path to CSV/JSON inventory file to create.
+OUTPUT: Path to CSV/JSON/JSON lines inventory file to create.
     """
-    from attributecode.transform import transform_csv_to_csv
-    from attributecode.transform import transform_json_to_json
+    from attributecode.transform import transform_file
     from attributecode.transform import Transformer
 
     if not configuration:
         transformer = Transformer.default()
     else:
-        transformer = Transformer.from_file(configuration)
+        try:
+            transformer = Transformer.from_file(configuration)
+        except ValueError as e:
+            raise click.UsageError('Invalid configuration: {}'.format(e))
 
-    if location.endswith('.csv') and output.endswith('.csv'):
-        errors = transform_csv_to_csv(location, output, transformer)
-    elif location.endswith('.json') and output.endswith('.json'):
-        errors = transform_json_to_json(location, output, transformer)
-    else:
-        msg = 'Extension for the input and output need to be the same.'
-        click.echo(msg)
-        sys.exit()
+    errors = transform_file(
+        location, output, transformer, max_errors=max_errors, processes=processes)
 
     if not quiet:
         print_version()
@@ -114,7 +114,7 @@ def check_about_resource_filename(arp):
 
 
 # TODO: this should be either the CSV or the ABOUT files but not both???
-def load_inventory(location, base_dir, reference_dir=None):
+def load_inventory(location, base_dir, reference_dir=None, check_paths=True, predicate=None):
     """
     Load the inventory file at `location` for ABOUT and LICENSE files stored in
     the `base_dir`. Return a list of errors and a list of About objects
@@ -122,6 +122,12 @@ def load_inventory(location, base_dir, reference_dir=None):
 
     Optionally use `reference_dir` as the directory location of extra reference
     license and notice files to reuse.
+
+    If `check_paths` is False, the about_resource paths are not checked as
+    needed to write ABOUT files, such as to build About objects in memory.
+
+    If a `predicate` function is provided, it is called with each inventory
+    row and only the rows for which it returns True are loaded.
     """
     errors = []
     abouts = []
@@ -134,24 +140,36 @@ def load_inventory(location, base_dir, reference_dir=None):
             errors.extend(dup_cols_err)
             return errors, abouts
         inventory = util.load_csv(location)
+    elif location.endswith('.jsonl'):
+        inventory = list(util.read_json_lines(location))
+    elif location.endswith('.sqlite'):
+        # select the components with the license keys required by the
+        # predicate with an indexed query
+        inventory = util.load_sqlite(
+            location, license_key=getattr(predicate, 'license_keys', None))
     else:
         inventory = util.load_json(location)
 
+    if predicate is not None:
+        inventory = [component for component in inventory if predicate(component)]
+
     try:
         arp_list = []
         errors = []
         for component in inventory:
             arp = component['about_resource']
+            newline_in_file_err = check_newline_in_file_field(component)
+            for err in newline_in_file_err:
+                errors.append(err)
+
+            if not check_paths:
+                continue
             dup_err = check_duplicated_about_resource(arp, arp_list)
             if dup_err:
                 errors.append(dup_err)
             else:
                 arp_list.append(arp)
 
-            newline_in_file_err = check_newline_in_file_field(component)
-            for err in newline_in_file_err:
-                errors.append(err)
-
             invalid_about_filename = check_about_resource_filename(arp)
             if invalid_about_filename:
                 errors.append(invalid_about_filename)
@@ -210,6 +228,9 @@ def load_inventory(location, base_dir, reference_dir=None):
             if e.message == 'Field about_resource is required':
                 ld_errors.remove(e)
         """
+        if not check_paths:
+            ld_errors = [e for e in ld_errors
+                         if not e.message.startswith('Field about_resource: Path')]
         for e in ld_errors:
             if not e in errors:
                 errors.extend(ld_errors)
@@ -28,7 +28,11 @@ import io
 import json
 import os
 import posixpath
+import re
+import sqlite3
 import traceback
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from itertools import zip_longest
 from urllib.parse import urljoin
 from urllib.parse import urlparse
@@ -45,13 +49,13 @@ from attributecode import ERROR
 from attributecode import INFO
 from attributecode import WARNING
 from attributecode import api
+from attributecode import archive
 from attributecode import Error
 from attributecode import saneyaml
 from attributecode import util
 from attributecode.util import add_unc
 from attributecode.util import boolean_fields
 from attributecode.util import copy_license_notice_files
-from attributecode.util import copy_file
 from attributecode.util import csv
 from attributecode.util import file_fields
 from attributecode.util import filter_errors
@@ -523,7 +527,7 @@ class PathField(ListField):
                 location = util.to_posix(location)
                 location = add_unc(location)
 
-                if not os.path.exists(location):
+                if not archive.exists(location):
                     # We don't want to show the UNC_PREFIX in the error message
                     location = util.to_posix(location.strip(UNC_PREFIX))
                     msg = (u'Field %(name)s: Path %(location)s not found'
@@ -582,10 +586,7 @@ class FileTextField(PathField):
                 continue
             try:
                 # TODO: we have lots the location by replacing it with a text
-                location = add_unc(location)
-                with io.open(location, encoding='utf-8') as txt:
-                    text = txt.read()
-                self.value[path] = text
+                self.value[path] = archive.read_text(location)
             except Exception as e:
                 # only keep the first 100 char of the exception
                 emsg = repr(e)[:100]
@@ -802,11 +803,13 @@ class About(object):
             field.name = name
             setattr(self, name, field)
 
-    def __init__(self, location=None, about_file_path=None, strict=False):
+    def __init__(self, location=None, about_file_path=None, strict=False, data=None):
         """
         Create an instance.
         If strict is True, raise an Exception on errors. Otherwise the errors
         attribute contains the errors.
+        If `data` is provided, this is the already parsed data of the ABOUT file
+        at `location`.
         """
         self.set_standard_fields()
         self.custom_fields = {}
@@ -822,7 +825,7 @@ class About(object):
         self.base_dir = None
         if self.location:
             self.base_dir = os.path.dirname(location)
-            self.errors.extend(self.load(location))
+            self.errors.extend(self.load(location, data))
             if strict and self.errors and filter_errors(self.errors):
                 msg = '\n'.join(map(str, self.errors))
                 raise Exception(msg)
@@ -959,9 +962,10 @@ class About(object):
         errors.extend(validation_errors)
         return errors
 
-    def load(self, location):
+    def load(self, location, data=None):
         """
-        Read, parse and process the ABOUT file at `location`.
+        Read, parse and process the ABOUT file at `location`, or use the `data`
+        already parsed from this file if provided.
         Return a list of errors and update self with errors.
         """
         self.location = location
@@ -969,17 +973,8 @@ class About(object):
         base_dir = posixpath.dirname(loc)
         errors = []
         try:
-            loc = add_unc(loc)
-            with io.open(loc, encoding='utf-8') as txt:
-                input_text = txt.read()
-            # The 'Yes' and 'No' will be converted to 'True' and 'False' in the yaml.load()
-            # Therefore, we need to wrap the original value in quote to prevent
-            # the conversion
-            pre_input = wrap_boolean_value(input_text)
-            # saneyaml.load() will have parsing error if the input has
-            # tab value. Therefore, we should check if the input contains
-            # any tab and then convert it to spaces.
-            input = replace_tab_with_spaces(pre_input)
+            if data is None:
+                data = read_about_data(loc)
             # FIXME: this should be done in the commands, not here
             """
             The running_inventory defines if the current process is 'inventory' or not.
@@ -991,7 +986,6 @@ class About(object):
             and then join with the 'about_resource'
             """
             running_inventory = True
-            data = saneyaml.load(input, allow_duplicate_keys=False)
             errs = self.load_dict(data, base_dir, running_inventory)
             errors.extend(errs)
         except Exception as e:
@@ -1159,7 +1153,7 @@ class About(object):
             for lic_dict in lic_dict_list:
                 data.setdefault('licenses', []).append(lic_dict)
 
-        return saneyaml.dump(data)
+        return dumps_about(data)
 
     def dump(self, location, lic_dict=None):
         """
@@ -1271,26 +1265,222 @@ class About(object):
         return license_key_name_context_url
 
 
-def collect_inventory(location):
+# the standard field names in the standard order
+STANDARD_FIELD_NAMES = tuple(About().fields)
+
+
+def read_about_data(location):
+    """
+    Read and parse the ABOUT file at `location` and return its data mapping
+    of field name to raw value without validation.
+    """
+    input_text = archive.read_text(location)
+    # The 'Yes' and 'No' will be converted to 'True' and 'False' in the yaml.load()
+    # Therefore, we need to wrap the original value in quote to prevent
+    # the conversion
+    pre_input = wrap_boolean_value(input_text)
+    # saneyaml.load() will have parsing error if the input has
+    # tab value. Therefore, we should check if the input contains
+    # any tab and then convert it to spaces.
+    input = replace_tab_with_spaces(pre_input)
+    return saneyaml.load(input, allow_duplicate_keys=False)
+
+
+# The ABOUT emitter below writes the same text as saneyaml.dump() for the
+# simple keys and values found in ABOUT files. Any other key or value is dumped
+# with saneyaml.
+
+# maximum length of a line of plain or quoted text before saneyaml may fold it
+ABOUT_LINE_WIDTH = saneyaml.WIDTH
+
+# field names that are dumped as plain keys
+is_plain_about_key = re.compile(r'[a-z_][a-z0-9_]*\Z').match
+
+# characters that are dumped as-is without escaping, excluding line breaks
+about_text_chars = (
+    u'\x20-\x7e\xa0-\u2027\u202a-\ud7ff\ue000-\ufefe\uff00-\ufffd'
+    u'\U00010000-\U0010fffe'
+)
+is_simple_about_text = re.compile(u'[{}]*\\Z'.format(about_text_chars)).match
+is_simple_about_multiline_text = re.compile(u'[\n{}]*\\Z'.format(about_text_chars)).match
+
+# indicator characters that cannot start a plain value
+about_plain_indicators = '#,[]{}&*!|>\'"%@`'
+
+
+def dumps_about(data):
+    """
+    Return a formatted ABOUT string from a `data` mapping of field name to
+    value. The text is the same as the text of saneyaml.dump(data).
+    """
+    if not data:
+        return saneyaml.dump(data)
+
+    dumped = []
+    for key, value in data.items():
+        if key == 'licenses':
+            text = dump_about_licenses(value)
+        else:
+            text = dump_about_field(key, value)
+        if text is None:
+            text = saneyaml.dump({key: value})
+        dumped.append(text)
+    return ''.join(dumped)
+
+
+def dump_about_field(key, value, prefix=''):
+    """
+    Return a formatted ABOUT line(s) for a `key` field name and a `value`
+    where the key is preceded by a `prefix` string. Return None if the key or
+    value cannot be dumped directly.
+    """
+    if not isinstance(key, str) or not is_plain_about_key(key) or key == 'null':
+        return
+    line = prefix + key + ':'
+    dumped = dump_about_scalar(value, len(line), len(prefix) + 2)
+    if dumped is not None:
+        return line + dumped
+
+
+def dump_about_licenses(licenses):
+    """
+    Return a formatted ABOUT `licenses` field for a list of license mappings.
+    Return None if the licenses cannot be dumped directly.
+    """
+    if not isinstance(licenses, list) or not licenses:
+        return
+    dumped = ['licenses:\n']
+    for license_mapping in licenses:
+        if not isinstance(license_mapping, dict) or not license_mapping:
+            return
+        prefix = '  - '
+        for key, value in license_mapping.items():
+            text = dump_about_field(key, value, prefix)
+            if text is None:
+                return
+            dumped.append(text)
+            prefix = '    '
+    return ''.join(dumped)
+
+
+def dump_about_scalar(value, column, indent):
+    """
+    Return a formatted ABOUT scalar `value` preceded by a space and followed by
+    a line break, written at `column` in a mapping at `indent`. Return None if
+    the value cannot be dumped directly.
+
+    The quoting style is the style selected by saneyaml.
+    """
+    style = None
+    if isinstance(value, bool):
+        value = 'yes' if value else 'no'
+    elif not isinstance(value, str):
+        return
+
+    if value.isdigit() and value.lstrip('0') != value:
+        # things such as 012 need to be quoted
+        style = "'"
+    if saneyaml.is_iso_date(value):
+        style = "'"
+    # things such as version numbers could be loaded as float
+    if value != '.' and len(value.split('.')) == 2 and all(c in '0123456789.' for c in value):
+        style = "'"
+    elif value == 'null':
+        style = "'"
+    elif '\n' in value:
+        style = '|'
+
+    if style == '|':
+        return dump_about_literal(value, indent)
+
+    if not is_simple_about_text(value):
+        return
+    # spaces in a long value are folded on several lines
+    if ' ' in value and column + len(value) + 3 > ABOUT_LINE_WIDTH:
+        return
+
+    if style == "'":
+        return " '" + value.replace("'", "''") + "'\n"
+
+    if is_plain_about_value(value):
+        return ' ' + value + '\n'
+
+
+def is_plain_about_value(value):
+    """
+    Return True if a single line `value` is dumped as a plain, unquoted value.
+    """
+    if not value or value[0] == ' ' or value[-1] == ' ':
+        return False
+    if value.startswith(('---', '...')):
+        return False
+    first = value[0]
+    if first in about_plain_indicators:
+        return False
+    if first in '-?:' and (len(value) == 1 or value[1] == ' '):
+        return False
+    return not (value[-1] == ':' or ': ' in value or ' #' in value)
+
+
+def dump_about_literal(value, indent):
+    """
+    Return a multi-line `value` formatted as a literal block indented with
+    `indent` spaces. Return None if the value cannot be dumped directly.
+    """
+    if not is_simple_about_multiline_text(value):
+        return
+    # trailing spaces on a line need quoting
+    if value.endswith(' ') or ' \n' in value:
+        return
+    padding = ' ' * indent
+    lines = [' |\n']
+    for line in value.split('\n'):
+        if line:
+            lines.append(padding + line + '\n')
+        else:
+            lines.append('\n')
+    if not value.endswith('\n'):
+        return ''.join(lines)
+    # the trailing line break is written once
+    return ''.join(lines[:-1])
+
+
+def collect_inventory(location, tracker=None, predicate=None):
     """
     Collect ABOUT files at location and return a list of errors and a list of
-    About objects.
+    About objects. If a `tracker` FieldNamesTracker is provided, the field names
+    of each About are added to this tracker as they are collected.
+
+    If a `predicate` function is provided, it is called with the raw data of
+    each ABOUT file and only the ABOUT files for which it returns True are
+    loaded, validated and collected.
     """
     errors = []
     input_location = util.get_absolute(location)
-    about_locations = list(util.get_about_locations(input_location))
+    about_locations = archive.get_about_locations(input_location)
 
     name_errors = util.check_file_names(about_locations)
     errors.extend(name_errors)
     abouts = []
     for about_loc in about_locations:
         about_file_path = util.get_relative_path(input_location, about_loc)
-        about = About(about_loc, about_file_path)
+        data = None
+        if predicate is not None:
+            try:
+                data = read_about_data(about_loc)
+            except Exception:
+                # the error is reported when loading the About
+                data = None
+            if isinstance(data, dict) and not predicate(data):
+                continue
+        about = About(about_loc, about_file_path, data=data)
         # Insert about_file_path reference to the error
         for severity, message in about.errors:
             msg = (about_file_path + ": " + message)
             errors.append(Error(severity, msg))
         abouts.append(about)
+        if tracker is not None:
+            tracker.add(about)
     return unique(errors), abouts
 
 
@@ -1299,61 +1489,278 @@ def get_field_names(abouts):
     Given a list of About objects, return a list of any field names that exist
     in any object, including custom fields.
     """
-    fields = []
-    # fields.append(About.ABOUT_FILE_PATH_ATTR)
+    tracker = FieldNamesTracker()
+    for about in abouts:
+        tracker.add(about)
+    return tracker.get_field_names()
 
-    standard_fields = About().fields.keys()
-    standards = []
-    for a in abouts:
-        for name, field in a.fields.items():
-            if field.required:
-                if name not in standards:
-                    standards.append(name)
-            else:
-                if field.present:
-                    if name not in standards:
-                        standards.append(name)
-    # resort standard fields in standard order
-    # which is a tad complex as this is a predefined order
-    sorted_std = []
-    for fn in standard_fields:
-        if fn in standards:
-            sorted_std.append(fn)
-    fields.extend(sorted_std)
-
-    customs = []
-    for a in abouts:
-        for name, field in a.custom_fields.items():
-            if field.has_content:
-                if name not in customs:
-                    customs.append(name)
-    # always sort custom fields list by name
-    customs.sort()
-    fields.extend(customs)
-
-    return fields
-
-
-def copy_redist_src(copy_list, location, output, with_structure):
-    """
-    Given a list of files/directories and copy to the destination
+
+class FieldNamesTracker(object):
+    """
+    Track the union of the field names present in About objects as they are
+    added such that the field names of an inventory are known without another
+    pass over its About objects.
+    """
+
+    def __init__(self):
+        # ordered sets of field names
+        self.standards = {}
+        self.customs = {}
+
+    def add(self, about):
+        """
+        Add the field names of an `about` About object: the required and
+        present standard fields and the custom fields with content.
+        """
+        standards = self.standards
+        for name, field in about.fields.items():
+            if name not in standards and (field.required or field.present):
+                standards[name] = None
+        customs = self.customs
+        for name, field in about.custom_fields.items():
+            if name not in customs and field.has_content:
+                customs[name] = None
+
+    def get_field_names(self):
+        """
+        Return a list of the tracked field names: standard fields in the
+        standard order followed by custom fields sorted by name.
+        """
+        standards = self.standards
+        fields = [name for name in STANDARD_FIELD_NAMES if name in standards]
+        # always sort custom fields list by name
+        fields.extend(sorted(self.customs))
+        return fields
+
+
+# version of the JSON manifest of an incremental copy of redistributable sources
+REDIST_MANIFEST_VERSION = 1
+
+
+def copy_redist_src(copy_list, location, output, with_structure, link_mode='copy',
+                    threads=util.COPY_THREADS):
+    """
+    Given a list of files/directories and copy to the destination.
+    The files are created as copies, hard links or clones depending on
+    `link_mode` and are copied in parallel with `threads` threads.
+    """
+    errors, copies = get_redist_copies(copy_list, location, output, with_structure)
+    errors.extend(util.copy_files(copies, link_mode=link_mode, threads=threads))
+    return errors
+
+
+def sync_redist_src(copy_list, location, output, with_structure, manifest_location,
+                    checksum=False, link_mode='copy', threads=util.COPY_THREADS):
+    """
+    Given a list of files/directories, incrementally copy to the `output`
+    directory only the files that changed since the previous copy recorded in
+    the `manifest_location` JSON manifest and remove the files of the previous
+    copy that are no longer selected. A file is unchanged if its size and
+    modification time are the same as in the manifest, or its size and SHA1
+    if `checksum` is True. Return a tuple of (errors, counts) where counts is a
+    mapping of the number of copied, unchanged and removed files.
+    """
+    errors, copies = get_redist_copies(
+        copy_list, location, output, with_structure, warn_existing=False)
+    previous_manifest = load_redist_manifest(manifest_location)
+    output = add_unc(output)
+
+    def get_state(paths):
+        from_path, _to_path = paths
+        try:
+            stat = os.stat(from_path)
+            state = dict(size=stat.st_size, mtime=stat.st_mtime_ns)
+            if checksum:
+                state['sha1'] = util.get_file_sha1(from_path)
+            return state
+        except OSError:
+            # Reported when the file is copied
+            return {}
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        states = list(executor.map(get_state, copies))
+
+    compared = ('size', 'sha1') if checksum else ('size', 'mtime')
+    manifest = {}
+    changed = []
+    unchanged_count = 0
+    for (from_path, to_path), state in zip(copies, states):
+        key = util.to_posix(os.path.relpath(to_path, output))
+        previous = previous_manifest.get(key) or {}
+        if (state
+                and all(state.get(name) == previous.get(name) for name in compared)
+                and os.path.lexists(to_path)):
+            unchanged_count += 1
+        else:
+            changed.append((from_path, to_path))
+        manifest[key] = state
+
+    removed_count = 0
+    for key in sorted(set(previous_manifest).difference(manifest)):
+        stale_location = os.path.join(output, util.to_native(key))
+        if not os.path.lexists(stale_location):
+            continue
+        try:
+            os.remove(stale_location)
+            removed_count += 1
+            remove_empty_parent_dirs(stale_location, output)
+        except OSError:
+            msg = 'Cannot remove file at %(stale_location)r.' % locals()
+            errors.append(Error(CRITICAL, msg))
+
+    errors.extend(util.copy_files(changed, link_mode=link_mode, threads=threads))
+    save_redist_manifest(manifest_location, manifest)
+    counts = dict(
+        copied=len(changed),
+        unchanged=unchanged_count,
+        removed=removed_count,
+    )
+    return errors, counts
+
+
+def get_redist_copies(copy_list, location, output, with_structure, warn_existing=True):
+    """
+    Return a tuple of (errors, copies) where copies is a list of (source,
+    target) file paths to copy a list of files/directories to the `output`
+    directory.
     """
     errors = []
+    copies = []
     for from_path in copy_list:
-        norm_from_path = norm(from_path)
-        relative_from_path = norm_from_path.partition(util.norm(location))[2]
-        # Need to strip the '/' to use the join
-        if relative_from_path.startswith('/'):
-            relative_from_path = relative_from_path.partition('/')[2]
-        # Get the directory name of the output path
+        output_dir = output
         if with_structure:
-            output_dir = os.path.dirname(os.path.join(output, util.norm(relative_from_path)))
+            relative_dir = get_redist_relative_dir(from_path, location)
+            if relative_dir:
+                output_dir = os.path.join(output, relative_dir)
+        copy_errors, file_copies = util.get_file_copies(
+            from_path, output_dir, warn_existing=warn_existing)
+        errors.extend(copy_errors)
+        copies.extend(file_copies)
+    return errors, copies
+
+
+def load_redist_manifest(location):
+    """
+    Return a mapping of posix relative path to file state loaded from the JSON
+    manifest of a previous incremental copy at `location`, or an empty mapping
+    if there is no valid manifest.
+    """
+    if not os.path.exists(location):
+        return {}
+    try:
+        with io.open(location, encoding='utf-8') as inp:
+            manifest = json.load(inp)
+        return dict(manifest['files'])
+    except (ValueError, KeyError, TypeError):
+        return {}
+
+
+def save_redist_manifest(location, files):
+    """
+    Save a `files` mapping of posix relative path to file state as the JSON
+    manifest of an incremental copy at `location`.
+    """
+    manifest = dict(version=REDIST_MANIFEST_VERSION, files=files)
+    temp_location = location + '.tmp'
+    with io.open(temp_location, 'w', encoding='utf-8') as out:
+        json.dump(manifest, out, indent=2, sort_keys=True)
+    os.replace(temp_location, location)
+
+
+def remove_empty_parent_dirs(location, base_dir):
+    """
+    Remove the empty parent directories of `location` up to and excluding the
+    `base_dir` directory.
+    """
+    base_dir = os.path.abspath(base_dir)
+    parent = os.path.dirname(os.path.abspath(location))
+    while parent != base_dir and parent.startswith(base_dir) and not os.listdir(parent):
+        os.rmdir(parent)
+        parent = os.path.dirname(parent)
+
+
+def dedup_redist_src(copy_list, location, output, with_structure, link_mode='copy',
+                     threads=util.COPY_THREADS):
+    """
+    Given a list of files/directories, copy to the `output` directory the first
+    file of each content and create the other files with the same content as
+    hard links to this first copy. Return a tuple of (errors, counts) where
+    counts is a mapping of the number of duplicated files created as hard links
+    and of saved bytes.
+    """
+    errors, copies = get_redist_copies(copy_list, location, output, with_structure)
+    duplicates = util.get_duplicates([from_path for from_path, _ in copies], threads=threads)
+
+    targets = {}
+    unique_copies = []
+    links = []
+    for from_path, to_path in copies:
+        original = duplicates.get(from_path)
+        if original and original in targets:
+            links.append((targets[original], to_path))
         else:
-            output_dir = output
-        err = copy_file(from_path, output_dir)
-        if err:
-            errors.extend(err)
-    return errors
+            targets.setdefault(from_path, to_path)
+            unique_copies.append((from_path, to_path))
+
+    errors.extend(util.copy_files(unique_copies, link_mode=link_mode, threads=threads))
+    errors.extend(util.copy_files(links, link_mode='hardlink', threads=threads))
+
+    # only count the hard links actually created: a file is copied instead when
+    # the file system does not support hard links
+    linked = 0
+    saved = 0
+    for target, to_path in links:
+        try:
+            if os.path.samefile(target, to_path):
+                linked += 1
+                saved += os.path.getsize(to_path)
+        except OSError:
+            # the copy failed and was reported as an error
+            pass
+    counts = dict(duplicates=linked, saved=saved)
+    return errors, counts
+
+
+def archive_redist_src(copy_list, location, output, with_structure, compression='auto',
+                       dedup=False, threads=util.COPY_THREADS):
+    """
+    Given a list of files/directories, stream them from their location to a new
+    zip, tar.gz or tar.xz archive at `output`. `compression` is used for zip
+    archive members. If `dedup` is True, the files with the same content are
+    stored once. Return a tuple of (errors, counts) where counts is a mapping
+    of the number of duplicated files and of saved bytes.
+    """
+    members = []
+    for from_path in copy_list:
+        member_dir = ''
+        if with_structure:
+            member_dir = get_redist_relative_dir(from_path, location)
+        members.extend(util.get_archive_members(from_path, member_dir))
+
+    duplicates = None
+    if dedup:
+        files = [from_path for from_path, name in members if not name.endswith('/')]
+        duplicates = util.get_duplicates(files, threads=threads)
+
+    errors, deduplicated = util.write_archive(
+        output, members, compression=compression, duplicates=duplicates)
+
+    sources = dict((name, from_path) for from_path, name in members)
+    saved = sum(os.path.getsize(sources[name]) for name in deduplicated)
+    counts = dict(duplicates=len(deduplicated), saved=saved)
+    return errors, counts
+
+
+def get_redist_relative_dir(from_path, location):
+    """
+    Return the posix path of the parent directory of `from_path` relative to
+    `location` or an empty string.
+    """
+    relative_from_path = norm(from_path).partition(util.norm(location))[2]
+    # Need to strip the '/' to use the join
+    if relative_from_path.startswith('/'):
+        relative_from_path = relative_from_path.partition('/')[2]
+    return posixpath.dirname(relative_from_path)
 
 
 def get_copy_list(abouts, location):
@@ -1368,11 +1775,13 @@ def get_copy_list(abouts, location):
     it will prompt warning as the directory that need to be copied is already exist.
     Technically, this is correct, but it leads to confusion. Therefore, we want to
     create a summarized list to avoid this kind of confusion.
+
+    The paths are collected in a trie of path segments such that covered paths
+    are dropped in a single pass and the list is sorted by path.
     """
     errors = []
-    copy_list = []
-    dir_list = []
-    file_list = []
+    selected = util.PathTrie()
+    base = norm(location)
     for about in abouts:
         if about.redistribute.value:
             file_exist = True
@@ -1385,56 +1794,21 @@ def get_copy_list(abouts, location):
             if file_exist:
                 for k in about.about_resource.value:
                     from_path = about.about_resource.value.get(k)
-                    if on_windows:
-                        norm_from_path = norm(from_path)
+                    norm_from_path = norm(from_path)
+                    if norm_from_path == base:
+                        segments = ()
+                    elif norm_from_path.startswith(base + '/'):
+                        segments = tuple(norm_from_path[len(base) + 1:].split('/'))
                     else:
-                        norm_from_path = os.path.normpath(from_path)
-                    # Get the relative path
-                    relative_from_path = norm_from_path.partition(util.norm(location))[2]
-                    if os.path.isdir(from_path):
-                        if not dir_list:
-                            dir_list.append(relative_from_path)
-                        else:
-                            handled = False
-                            for dir in dir_list:
-                                # The dir is a parent of the relative_from_path
-                                if dir in relative_from_path:
-                                    handled = True
-                                    continue
-                                # The relative_from_path is the parent of the dir
-                                # We need to update the dir_list
-                                if relative_from_path in dir:
-                                    dir_list.remove(dir)
-                                    dir_list.append(relative_from_path)
-                                    handled = True
-                                    continue
-                            if not handled:
-                                dir_list.append(relative_from_path)
-                    else:
-                        # Check if the file is from "root"
-                        # If the file is at root level, it'll add to the copy_list
-                        if not os.path.dirname(relative_from_path) == '/':
-                            file_list.append(relative_from_path)
-                        else:
-                            copy_list.append(from_path)
-
-    for dir in dir_list:
-        for f in file_list:
-            # The file is already in one of copied directories
-            if dir in f:
-                file_list.remove(f)
-                continue
-        if dir.startswith('/'):
-            dir = dir.partition('/')[2]
-        absolute_path = os.path.join(location, dir)
-        if on_windows:
-            absolute_path = add_unc(absolute_path)
-        copy_list.append(absolute_path)
+                        msg = (u'Field about_resource: Path %(from_path)s is not '
+                               u'in %(location)s and cannot be copied.' % locals())
+                        errors.append(Error(CRITICAL, msg))
+                        continue
+                    selected.add(segments)
 
-    for f in file_list:
-        if f.startswith('/'):
-            f = f.partition('/')[2]
-        absolute_path = os.path.join(location, f)
+    copy_list = []
+    for segments in selected.get_selected():
+        absolute_path = os.path.join(location, *segments)
         if on_windows:
             absolute_path = add_unc(absolute_path)
         copy_list.append(absolute_path)
@@ -1483,15 +1857,31 @@ def about_object_to_list_of_dictionary(abouts):
     return serialized
 
 
-def write_output(abouts, location, format):  # NOQA
+def write_output(abouts, location, format, tracker=None, errors=()):  # NOQA
     """
-    Write a CSV/JSON file at location given a list of About objects.
-    Return a list of Error objects.
+    Write a CSV/JSON/JSON lines/SQLite file at location given a list of About
+    objects. Use the field names of a `tracker` FieldNamesTracker as CSV or
+    SQLite columns if provided. The `errors` list of Error objects is saved in
+    a SQLite inventory. Return a list of Error objects.
     """
-    about_dicts = about_object_to_list_of_dictionary(abouts)
     location = add_unc(location)
+    if format == 'jsonl':
+        return save_as_jsonl(location, abouts)
+
+    if format == 'sqlite':
+        if tracker is not None:
+            field_names = tracker.get_field_names()
+        else:
+            field_names = get_field_names(abouts)
+        return save_as_sqlite(location, abouts, field_names, errors)
+
+    about_dicts = about_object_to_list_of_dictionary(abouts)
     if format == 'csv':
-        errors = save_as_csv(location, about_dicts, get_field_names(abouts))
+        if tracker is not None:
+            field_names = tracker.get_field_names()
+        else:
+            field_names = get_field_names(abouts)
+        errors = save_as_csv(location, about_dicts, field_names)
     else:
         errors = save_as_json(location, about_dicts)
     return errors
@@ -1504,6 +1894,20 @@ def save_as_json(location, about_dicts):
     return []
 
 
+def save_as_jsonl(location, abouts):
+    """
+    Write a JSON lines file at `location` given a list of About objects with
+    one JSON object per line. Each About is serialized and written one at a
+    time.
+    """
+    with io.open(location, mode='w', encoding='utf-8') as output_file:
+        for about in abouts:
+            for about_dict in about_object_to_list_of_dictionary([about]):
+                data, = util.format_about_dict_for_json_output([about_dict])
+                output_file.write(json.dumps(data) + '\n')
+    return []
+
+
 def save_as_csv(location, about_dicts, field_names):
     errors = []
     with io.open(location, mode='w', encoding='utf-8', newline='') as output_file:
@@ -1520,6 +1924,66 @@ def save_as_csv(location, about_dicts, field_names):
     return errors
 
 
+def save_as_sqlite(location, abouts, field_names, errors=()):
+    """
+    Write a SQLite inventory database at `location` given a list of About
+    objects with one column for each of the `field_names` and an `errors` list
+    of Error objects. Return a list of Error objects.
+
+    The database has these tables:
+     - components: one row for each About with the same values as a CSV
+       inventory row,
+     - licenses: one row for each license key with its name and URL,
+     - component_licenses: the license keys of each component rowid,
+     - errors: the severity and message of each error.
+    Components are indexed by name and about_resource and the licenses of
+    components are indexed by license key.
+    """
+    field_names = field_names or [About.ABOUT_RESOURCE_ATTR, 'name']
+    columns = ', '.join(util.quote_sqlite_name(name) for name in field_names)
+    placeholders = ', '.join('?' for _ in field_names)
+    insert_component = 'INSERT INTO components ({columns}) VALUES ({placeholders})'.format(**locals())
+
+    # write to a temporary file that replaces the output only once complete
+    temp_location = util.create_temp_output(location, prefix='.about-inventory-')
+    try:
+        connection = sqlite3.connect(temp_location)
+        try:
+            with connection:
+                connection.executescript(util.get_sqlite_inventory_schema(field_names))
+                for about in abouts:
+                    about_dicts = about_object_to_list_of_dictionary([about])
+                    if not about_dicts:
+                        continue
+                    row, = util.format_about_dict_for_csv_output(about_dicts)
+                    values = [row.get(name) for name in field_names]
+                    rowid = connection.execute(insert_component, values).lastrowid
+
+                    license_keys = about.license_key.value or []
+                    if not license_keys and about.license_expression.value:
+                        _special_char, license_keys = parse_license_expression(
+                            about.license_expression.value)
+                    licenses = zip_longest(
+                        license_keys, about.license_name.value or [], about.license_url.value or [])
+                    connection.executemany(
+                        'INSERT OR IGNORE INTO licenses (key, name, url) VALUES (?, ?, ?)',
+                        [lic for lic in licenses if lic[0]])
+                    connection.executemany(
+                        'INSERT INTO component_licenses (component_rowid, license_key) VALUES (?, ?)',
+                        [(rowid, key) for key in license_keys])
+
+                connection.executemany(
+                    'INSERT INTO errors (severity, message) VALUES (?, ?)',
+                    [(severity, message) for severity, message in errors])
+        finally:
+            connection.close()
+        util.replace_output(temp_location, location)
+    except BaseException:
+        os.remove(temp_location)
+        raise
+    return []
+
+
 def pre_process_and_fetch_license_dict(abouts, api_url, api_key):
     """
     Modify a list of About data dictionaries by adding license information
@@ -1568,16 +2032,47 @@ def pre_process_and_fetch_license_dict(abouts, api_url, api_key):
     return key_text_dict, errors
 
 
-def parse_license_expression(lic_expression):
-    licensing = Licensing()
-    lic_list = []
-    special_char = detect_special_char(lic_expression)
+# A long-lived Licensing shared to parse all the license expressions
+licensing = Licensing()
+
+
+def preload_license_keys(license_keys):
+    """
+    Replace the shared Licensing used to parse license expressions by a
+    Licensing that knows the `license_keys` list of license keys and clear the
+    cache of parsed expressions.
+    """
+    global licensing
+    licensing = Licensing(license_keys)
+    parse_license_expression_cached.cache_clear()
+
+
+# Inventories usually have only a few distinct license expressions used across
+# a very large number of components: cache the parsed expressions
+@lru_cache(maxsize=4096)
+def parse_license_expression_cached(lic_expression):
+    """
+    Return a tuple of (tuple of special characters, tuple of license keys) for
+    a `lic_expression` license expression string. Results are cached.
+    """
+    lic_list = ()
+    special_char = tuple(detect_special_char(lic_expression))
     if not special_char:
         # Parse the license expression and save it into a list
-        lic_list = licensing.license_keys(lic_expression)
+        lic_list = tuple(licensing.license_keys(lic_expression))
     return special_char, lic_list
 
 
+def parse_license_expression(lic_expression):
+    """
+    Return a tuple of (list of special characters, list of license keys) for
+    a `lic_expression` license expression string. The returned lists are new
+    lists that can be modified by the caller.
+    """
+    special_char, lic_list = parse_license_expression_cached(lic_expression)
+    return list(special_char), list(lic_list)
+
+
 def detect_special_char(expression):
     not_support_char = [
         '!', '@', '#', '$', '%', '^', '&', '*', '=', '{', '}',
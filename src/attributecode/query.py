@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+# ============================================================================
+#  Copyright (c) nexB Inc. http://www.nexb.com/ - All rights reserved.
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#      http://www.apache.org/licenses/LICENSE-2.0
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ============================================================================
+
+"""
+Filter expressions to select the components of an inventory.
+
+A filter expression is made of comparisons of a field name with values
+combined with `and`, `or`, `not` and parentheses, such as:
+
+    redistribute=yes and license in (gpl-*, lgpl-*)
+    owner="nexB Inc." or not (name!=zlib)
+
+- `field=value` is true if any value of the field matches `value`,
+- `field!=value` is true if no value of the field matches `value`,
+- `field in (value1, value2)` is true if any value of the field matches any of
+  the values.
+
+Values can be quoted with single or double quotes and can contain `*` and `?`
+wildcards. Matching is case-insensitive. Boolean fields match yes or no. The
+special `license` field matches the license keys of the license_expression and
+license_key fields.
+
+An expression is compiled once in a predicate function that is called with the
+raw data of an ABOUT file or an inventory row such that excluded components can
+be skipped before they are fully loaded. The `license_keys` attribute of this
+function is the set of license keys that a matching component must have one of
+or None if the expression does not require a license key. It is used to select
+the components of a SQLite inventory with an indexed query.
+"""
+
+import fnmatch
+import re
+
+from attributecode.model import BooleanField
+from attributecode.model import parse_license_expression_cached
+from attributecode.util import boolean_fields
+from attributecode.util import ungroup_licenses
+
+
+# name of the special field matching any license key
+LICENSE_FIELD = 'license'
+
+KEYWORDS = ('and', 'or', 'not', 'in')
+
+tokenize = re.compile(r'''
+    \s*(?:
+        (?P<quoted>"[^"]*"|'[^']*')
+        |(?P<operator>!=|=|\(|\)|,)
+        |(?P<word>[^\s=!(),'"]+)
+    )
+''', re.VERBOSE).match
+
+
+def compile_filter(expression):
+    """
+    Return a predicate function that returns True for the raw data mapping of
+    a component matching a filter `expression` string.
+    Raise a ValueError if the expression is not valid.
+    """
+    tokens = get_tokens(expression)
+    if not tokens:
+        raise ValueError('empty filter expression')
+    parser = FilterParser(tokens)
+    matcher = parser.parse_or()
+    if parser.position != len(tokens):
+        raise ValueError(
+            'unexpected {!r} in filter expression'.format(tokens[parser.position][1]))
+
+    def predicate(data):
+        return matcher(get_filter_values(data))
+
+    predicate.license_keys = get_license_keys(matcher)
+    return predicate
+
+
+def get_license_keys(matcher):
+    """
+    Return the set of license keys required by a `matcher` function or None.
+    """
+    return getattr(matcher, 'license_keys', None)
+
+
+def get_tokens(expression):
+    """
+    Return a list of (kind, text) tokens for a filter `expression` where kind
+    is one of: value, operator or keyword.
+    """
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = tokenize(expression, position)
+        if not match:
+            raise ValueError(
+                'invalid filter expression at: {!r}'.format(expression[position:]))
+        position = match.end()
+        quoted, operator, word = match.group('quoted', 'operator', 'word')
+        if quoted:
+            tokens.append(('value', quoted[1:-1]))
+        elif operator:
+            tokens.append(('operator', operator))
+        elif word.lower() in KEYWORDS:
+            tokens.append(('keyword', word.lower()))
+        else:
+            tokens.append(('value', word))
+    return tokens
+
+
+class FilterParser(object):
+    """
+    Recursive descent parser of a list of filter expression tokens that builds
+    matcher functions called with a mapping of field name to a list of values.
+    """
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def next(self, kind, text=None):
+        """
+        Return the text of the next token of `kind` kind and optional `text`.
+        Raise a ValueError if the next token is different.
+        """
+        token_kind, token_text = self.peek()
+        if token_kind != kind or (text and token_text != text):
+            expected = text or kind
+            found = token_text or 'end of expression'
+            raise ValueError(
+                'expected {expected!r} and found {found!r} in filter expression'.format(**locals()))
+        self.position += 1
+        return token_text
+
+    def parse_or(self):
+        matchers = [self.parse_and()]
+        while self.peek() == ('keyword', 'or'):
+            self.position += 1
+            matchers.append(self.parse_and())
+        if len(matchers) == 1:
+            return matchers[0]
+
+        def matcher_or(values):
+            return any(matcher(values) for matcher in matchers)
+
+        # a license key is required only if it is required by every operand
+        license_keys = [get_license_keys(matcher) for matcher in matchers]
+        if None not in license_keys:
+            matcher_or.license_keys = set().union(*license_keys)
+        return matcher_or
+
+    def parse_and(self):
+        matchers = [self.parse_not()]
+        while self.peek() == ('keyword', 'and'):
+            self.position += 1
+            matchers.append(self.parse_not())
+        if len(matchers) == 1:
+            return matchers[0]
+
+        def matcher_and(values):
+            return all(matcher(values) for matcher in matchers)
+
+        # use the smallest set of license keys required by any operand
+        license_keys = [get_license_keys(matcher) for matcher in matchers]
+        license_keys = [keys for keys in license_keys if keys is not None]
+        if license_keys:
+            matcher_and.license_keys = min(license_keys, key=len)
+        return matcher_and
+
+    def parse_not(self):
+        if self.peek() == ('keyword', 'not'):
+            self.position += 1
+            matcher = self.parse_not()
+            return lambda values: not matcher(values)
+        return self.parse_primary()
+
+    def parse_primary(self):
+        if self.peek() == ('operator', '('):
+            self.position += 1
+            matcher = self.parse_or()
+            self.next('operator', ')')
+            return matcher
+
+        name = self.next('value').lower()
+        kind, text = self.peek()
+        if (kind, text) == ('keyword', 'in'):
+            self.position += 1
+            self.next('operator', '(')
+            patterns = [self.next('value')]
+            while self.peek() == ('operator', ','):
+                self.position += 1
+                patterns.append(self.next('value'))
+            self.next('operator', ')')
+            return get_field_matcher(name, patterns)
+
+        operator = self.next('operator')
+        if operator not in ('=', '!='):
+            raise ValueError(
+                'expected "=", "!=" or "in" after {name!r} in filter expression'.format(**locals()))
+        matcher = get_field_matcher(name, [self.next('value')])
+        if operator == '!=':
+            return lambda values: not matcher(values)
+        return matcher
+
+
+def get_field_matcher(name, patterns):
+    """
+    Return a matcher function returning True if any value of the `name` field
+    matches any of the `patterns` wildcard patterns.
+    """
+    if name in boolean_fields:
+        patterns = [normalize_boolean(pattern) for pattern in patterns]
+    regex = '|'.join(fnmatch.translate(pattern.lower()) for pattern in patterns)
+    match = re.compile(regex).match
+
+    def matcher(values):
+        return any(match(value) for value in values.get(name, ()))
+
+    if name == LICENSE_FIELD and not any(set(pattern) & set('*?[') for pattern in patterns):
+        matcher.license_keys = set(pattern.lower() for pattern in patterns)
+    return matcher
+
+
+def normalize_boolean(value):
+    """
+    Return yes or no for a boolean flag `value` or the value unchanged.
+    """
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    flag = value.strip().lower()
+    if flag in BooleanField.true_flags:
+        return 'yes'
+    if flag in BooleanField.false_flags:
+        return 'no'
+    return value
+
+
+def get_filter_values(data):
+    """
+    Return a mapping of lowercase field name to a list of lowercase string
+    values given a `data` mapping of raw field values from an ABOUT file or an
+    inventory row. The license field contains the license keys of the
+    license_expression and license_key fields.
+    """
+    values = {}
+    for name, value in data.items():
+        name = name.lower()
+        if name == 'licenses' and isinstance(value, list):
+            license_keys, license_names, license_files, license_urls = ungroup_licenses(
+                lic for lic in value if isinstance(lic, dict))
+            for ungrouped_name, ungrouped in (
+                    ('license_key', license_keys),
+                    ('license_name', license_names),
+                    ('license_file', license_files),
+                    ('license_url', license_urls)):
+                values.setdefault(ungrouped_name, []).extend(
+                    str(item).lower() for item in ungrouped)
+            continue
+        values[name] = get_strings(name, value)
+
+    license_keys = list(values.get('license_key', ()))
+    for expression in values.get('license_expression', ()):
+        special_characters, keys = parse_license_expression_cached(expression)
+        if not special_characters:
+            license_keys.extend(keys)
+    values[LICENSE_FIELD] = license_keys
+    return values
+
+
+def get_strings(name, value):
+    """
+    Return a list of lowercase strings for the raw `value` of the `name` field.
+    """
+    if value is None or value == '':
+        return []
+    if isinstance(value, (list, tuple)):
+        items = value
+    elif isinstance(value, dict):
+        items = list(value)
+    else:
+        items = [value]
+
+    strings = []
+    for item in items:
+        if name in boolean_fields:
+            item = normalize_boolean(item)
+        item = str(item).lower()
+        strings.append(item)
+        # multiple values are on several lines in CSV inventories
+        if '\n' in item:
+            strings.extend(line.strip() for line in item.splitlines() if line.strip())
+    return strings
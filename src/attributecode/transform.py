@@ -15,73 +15,410 @@
 
 import io
 import json
+import os
+import re
+import shutil
+import tempfile
 from collections import Counter
-from itertools import zip_longest
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import groupby
+from itertools import islice
+from operator import itemgetter
 
 import attr
 
 from attributecode import CRITICAL
 from attributecode import Error
 from attributecode import saneyaml
+from attributecode.util import create_temp_output
 from attributecode.util import csv
+from attributecode.util import get_scancode_entries_key
+from attributecode.util import read_json_entries
+from attributecode.util import read_json_lines
+from attributecode.util import replace_output
 from attributecode.util import replace_tab_with_spaces
 
 
-def transform_csv_to_csv(location, output, transformer):
+# number of sample row numbers reported for each required field with missing
+# values: other rows are only counted
+MAX_SAMPLE_ROWS = 10
+
+# number of rows transformed together as a batch when streaming a transform
+BATCH_SIZE = 1000
+
+# approximate size in bytes of the CSV chunks transformed in parallel
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# supported transform file formats keyed by file extension
+FILE_FORMATS = {
+    '.csv': 'csv',
+    '.json': 'json',
+    '.jsonl': 'jsonl',
+}
+
+
+def get_file_format(location):
+    """
+    Return the format of a file at `location` based on its extension: one of
+    "csv", "json" or "jsonl". Raise a ValueError for an unsupported extension.
+    """
+    _base, extension = os.path.splitext(location)
+    file_format = FILE_FORMATS.get(extension.lower())
+    if not file_format:
+        extensions = ' '.join(FILE_FORMATS)
+        raise ValueError(
+            'Unsupported file extension: must be one of: {extensions}'.format(**locals()))
+    return file_format
+
+
+def transform_file(location, output, transformer, max_errors=None,
+                   processes=1, chunk_size=CHUNK_SIZE):
+    """
+    Read a CSV, JSON or JSON lines file at `location` and write a new CSV, JSON
+    or JSON lines file at `output`. The formats are based on the file
+    extensions and can be different. Apply transformations using the
+    `transformer` Transformer.
+    Return a list of Error objects.
+    """
+    return transform_records(
+        location, get_file_format(location),
+        output, get_file_format(output),
+        transformer, max_errors=max_errors,
+        processes=processes, chunk_size=chunk_size)
+
+
+def transform_csv_to_csv(location, output, transformer, max_errors=None,
+                         processes=1, chunk_size=CHUNK_SIZE):
     """
     Read a CSV file at `location` and write a new CSV file at `output`. Apply
     transformations using the `transformer` Transformer.
     Return a list of Error objects.
     """
+    return transform_records(
+        location, 'csv', output, 'csv', transformer, max_errors=max_errors,
+        processes=processes, chunk_size=chunk_size)
+
+
+def transform_json_to_json(location, output, transformer, max_errors=None):
+    """
+    Read a JSON file at `location` and write a new JSON file at `output`. Apply
+    transformations using the `transformer` Transformer.
+    Return a list of Error objects.
+    """
+    return transform_records(
+        location, 'json', output, 'json', transformer, max_errors=max_errors)
+
+
+def transform_records(location, input_format, output, output_format, transformer,
+                      max_errors=None, processes=1, chunk_size=CHUNK_SIZE):
+    """
+    Read the records of an `input_format` file at `location`, apply
+    transformations using the `transformer` Transformer and write them to an
+    `output_format` file at `output`.
+    Return a list of Error objects.
+
+    Records are read, transformed, checked and written one at a time such that
+    memory usage does not grow with the size of the input. If `max_errors` is
+    provided, stop after this number of rows with errors. If `processes` is
+    more than one and both formats are CSV, the input is split in chunks of
+    about `chunk_size` bytes that are transformed in parallel.
+    """
     if not transformer:
         raise ValueError('Cannot transform without Transformer')
 
-    rows = read_csv_rows(location)
+    if input_format == 'csv':
+        rows = read_csv_rows(location)
 
-    errors = []
-    data = iter(rows)
-    names = next(rows)
-    field_names = strip_trailing_fields_csv(names)
-    dupes = check_duplicate_fields(field_names)
+        errors = []
+        names = next(rows, [])
+        field_names = strip_trailing_fields_csv(names)
+        dupes = check_duplicate_fields(field_names)
 
-    if dupes:
-        msg = u'Duplicated field name: %(name)s'
-        for name in dupes:
-            errors.append(Error(CRITICAL, msg % locals()))
-        return field_names, [], errors
+        if dupes:
+            msg = u'Duplicated field name: %(name)s'
+            for name in dupes:
+                errors.append(Error(CRITICAL, msg % locals()))
+            return errors
 
-    # Convert to dicts
-    new_data = [dict(zip_longest(field_names, item)) for item in data]
+        if output_format == 'csv' and processes > 1:
+            rows.close()
+            return parallel_transform_csv(
+                location, field_names, output, transformer,
+                max_errors=max_errors, processes=processes, chunk_size=chunk_size)
 
-    field_names, updated_data, errors = transform_data(new_data, transformer)
+        field_names = tuple(field_names)
+        records = ((field_names, row) for row in rows)
 
-    if errors:
-        return errors
     else:
-        write_csv(output, updated_data, field_names)
-        return []
+        # the field names of JSON items are only known when reading each item
+        field_names = None
+        if input_format == 'json':
+            # only keep the "files" entries of a scancode-toolkit scan
+            items = read_json_entries(location, get_scancode_entries_key)
+        else:
+            items = read_json_lines(location)
+        items = ({key.strip(): value for key, value in item.items()} for item in items)
+        records = ((tuple(item), tuple(item.values())) for item in items)
+
+    return stream_transform(
+        records, output, output_format, transformer,
+        field_names=field_names, max_errors=max_errors)
+
+
+def stream_transform(records, output, output_format, transformer, field_names=None,
+                     max_errors=None):
+    """
+    Transform each record from a `records` iterable of (field names, values)
+    tuples using the `transformer` Transformer and write the transformed rows
+    to an `output_format` file at `output`. `field_names` are the source field
+    names of all the records if known upfront such as for a CSV.
+    Return a list of Error objects.
 
+    The rows are written to a temporary file that replaces the `output` file
+    only if there are no errors. Errors are reported by required field. If
+    `max_errors` is provided, stop after this number of rows with errors.
+    """
+    output_field_names = None
+    if field_names is not None:
+        output_field_names = transformer.get_column_plan(field_names).output_field_names
 
-def transform_json_to_json(location, output, transformer):
+    temp_output = create_temp_output(output, prefix='.about-transform-')
+    try:
+        with io.open(temp_output, 'w', encoding='utf-8', newline='\n') as outfile:
+            writer = get_row_writer(output_format, outfile, output_field_names)
+            _rows_count, report = write_transformed_rows(
+                records, transformer, writer, max_errors)
+            if not report:
+                writer.close()
+    except BaseException:
+        os.remove(temp_output)
+        raise
+
+    if report:
+        os.remove(temp_output)
+        return report.get_errors(max_errors)
+
+    replace_output(temp_output, output)
+    return []
+
+
+def write_transformed_rows(records, transformer, writer, max_errors=None):
     """
-    Read a JSON file at `location` and write a new JSON file at `output`. Apply
-    transformations using the `transformer` Transformer.
-    Return a list of Error objects.
+    Transform each record from a `records` iterable of (field names, values)
+    tuples using the `transformer` Transformer and write them with a row
+    `writer`. Stop writing at the first row with errors and stop reading after
+    `max_errors` rows with errors if provided.
+    Return a tuple of (count of rows read, RequiredFieldsReport).
+    """
+    report = RequiredFieldsReport()
+    rn = 0
+    for batch in get_batches(records, BATCH_SIZE):
+        # consecutive records with the same field names share a column plan
+        for field_names, group in groupby(batch, key=itemgetter(0)):
+            plan = transformer.get_column_plan(field_names)
+            output_field_names = plan.output_field_names
+            for values in plan.transform_batch([values for _, values in group]):
+                missings = plan.get_missing_required_fields(values)
+                if missings:
+                    report.add(rn, missings)
+                    if max_errors and report.rows_count >= max_errors:
+                        return rn + 1, report
+                # once there is an error, the output is discarded
+                elif not report:
+                    writer.write_row(output_field_names, values)
+                rn += 1
+    return rn, report
+
+
+class RequiredFieldsReport(object):
+    """
+    Aggregate the rows missing values for required fields by field name with a
+    count of rows and the first `max_samples` row numbers for each field such
+    that the size of the report does not grow with the number of rows.
     """
-    if not transformer:
-        raise ValueError('Cannot transform without Transformer')
 
-    items = read_json(location)
-    data = normalize_dict_data(items)
-    new_data = strip_trailing_fields_json(data)
+    def __init__(self, max_samples=MAX_SAMPLE_ROWS):
+        self.max_samples = max_samples
+        # count of rows with at least one missing required value
+        self.rows_count = 0
+        # map of field name to a [count of rows, [sample row numbers]] list
+        self.fields = {}
 
-    _field_names, updated_data, errors = transform_data(new_data, transformer)
+    def __bool__(self):
+        return bool(self.rows_count)
 
-    if errors:
+    def add(self, rn, missings):
+        """
+        Add the `rn` row number missing values for a `missings` list of
+        required field names.
+        """
+        self.rows_count += 1
+        for name in missings:
+            counts = self.fields.get(name)
+            if counts is None:
+                counts = self.fields[name] = [0, []]
+            counts[0] += 1
+            if len(counts[1]) < self.max_samples:
+                counts[1].append(rn)
+
+    def merge(self, other, first_rn=0):
+        """
+        Merge an `other` RequiredFieldsReport for rows that follow the rows of
+        this report and where row numbers start at `first_rn`.
+        """
+        self.rows_count += other.rows_count
+        for name, (count, samples) in other.fields.items():
+            counts = self.fields.get(name)
+            if counts is None:
+                counts = self.fields[name] = [0, []]
+            counts[0] += count
+            room = self.max_samples - len(counts[1])
+            counts[1].extend(first_rn + rn for rn in samples[:room])
+
+    def get_errors(self, max_errors=None):
+        """
+        Return a list of Error objects, one for each required field with
+        missing values, and one if the transformation stopped after
+        `max_errors` rows with errors.
+        """
+        errors = []
+        for name, (count, samples) in self.fields.items():
+            rows = ', '.join(str(rn) for rn in samples)
+            if count > len(samples):
+                rows += ', ...'
+            msg = 'Field {name} is missing required values in {count} rows: {rows}'
+            errors.append(Error(CRITICAL, msg.format(**locals())))
+        if max_errors and self.rows_count >= max_errors:
+            msg = 'Transformation stopped after {max_errors} rows with errors.'
+            errors.append(Error(CRITICAL, msg.format(**locals())))
         return errors
-    else:
-        write_json(output, updated_data)
+
+
+def parallel_transform_csv(location, field_names, output, transformer,
+                           max_errors=None, processes=2, chunk_size=CHUNK_SIZE):
+    """
+    Transform the rows of a CSV file at `location` with `field_names` field
+    names using the `transformer` Transformer and write the transformed rows to
+    a CSV file at `output`.
+    Return a list of Error objects.
+
+    The CSV is split in chunks of about `chunk_size` bytes at record boundaries
+    and the chunks are transformed in parallel using `processes` processes.
+    Each chunk is written to its own temporary file and the chunks are
+    assembled in their original order in the `output` file only if there are no
+    errors. Errors use row numbers in the whole file. If `max_errors` is
+    provided, stop after this number of rows with errors.
+    """
+    plan = transformer.get_column_plan(field_names)
+    configuration = transformer.get_configuration()
+    offsets = get_csv_chunk_offsets(location, chunk_size)
+
+    output_dir = os.path.dirname(os.path.abspath(output))
+    temp_dir = tempfile.mkdtemp(prefix='.about-transform-', dir=output_dir)
+    try:
+        chunks = []
+        for chunk_number, (start, end) in enumerate(offsets):
+            chunk_output = os.path.join(temp_dir, 'chunk-{}.csv'.format(chunk_number))
+            chunks.append((location, start, end, field_names, configuration,
+                           chunk_output, max_errors))
+
+        report = RequiredFieldsReport()
+        # the row number of the first row of the current chunk
+        first_rn = 0
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            # submit a few chunks ahead and collect the results in the order
+            # of the chunks
+            remaining = iter(chunks)
+            pending = deque(executor.submit(transform_csv_chunk, chunk)
+                            for chunk in islice(remaining, processes * 2))
+            while pending:
+                rows_count, chunk_report = pending.popleft().result()
+                report.merge(chunk_report, first_rn)
+                first_rn += rows_count
+                if max_errors and report.rows_count >= max_errors:
+                    for future in pending:
+                        future.cancel()
+                    break
+                for chunk in islice(remaining, 1):
+                    pending.append(executor.submit(transform_csv_chunk, chunk))
+
+        if report:
+            return report.get_errors(max_errors)
+
+        temp_output = os.path.join(temp_dir, 'output.csv')
+        with io.open(temp_output, 'w', encoding='utf-8', newline='\n') as csvfile:
+            CsvRowWriter(csvfile, plan.output_field_names).close()
+        with open(temp_output, 'ab') as outfile:
+            for chunk in chunks:
+                chunk_output = chunk[5]
+                with open(chunk_output, 'rb') as chunkfile:
+                    shutil.copyfileobj(chunkfile, outfile)
+        replace_output(temp_output, output)
         return []
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def transform_csv_chunk(chunk):
+    """
+    Transform the rows of a CSV file chunk and write them to a CSV file. This
+    runs in a worker process. `chunk` is a tuple of (CSV file location, start
+    offset, end offset, field names, Transformer configuration, chunk output
+    location, maximum number of rows with errors).
+    Return a tuple of (count of rows, RequiredFieldsReport with row numbers in
+    this chunk).
+    """
+    location, start, end, field_names, configuration, chunk_output, max_errors = chunk
+    transformer = Transformer(**configuration)
+    plan = transformer.get_column_plan(field_names)
+
+    with open(location, 'rb') as inp:
+        inp.seek(start)
+        content = inp.read(end - start)
+    rows = csv.reader(io.StringIO(content.decode('utf-8', errors='replace'), newline=''))
+    field_names = tuple(field_names)
+    records = ((field_names, row) for row in rows)
+
+    with io.open(chunk_output, 'w', encoding='utf-8', newline='\n') as csvfile:
+        writer = CsvRowWriter(csvfile, plan.output_field_names, write_header=False)
+        results = write_transformed_rows(records, transformer, writer, max_errors)
+        writer.close()
+        return results
+
+
+def get_csv_chunk_offsets(location, chunk_size=CHUNK_SIZE):
+    """
+    Return a list of (start, end) byte offsets of the chunks of a CSV file at
+    `location`, excluding the header row. Each chunk is of about `chunk_size`
+    bytes and ends at a record boundary: a line ending that is not inside a
+    quoted value.
+    """
+    offsets = []
+    offset = 0
+    start = None
+    in_quotes = False
+    with open(location, 'rb') as inp:
+        for line in inp:
+            offset += len(line)
+            # each double quote toggles the quoted state, including an escaped
+            # quote which is doubled
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if in_quotes:
+                continue
+            if start is None:
+                # the end of the header row
+                start = offset
+            elif offset - start >= chunk_size:
+                offsets.append((start, offset))
+                start = offset
+
+    if start is not None and offset > start:
+        offsets.append((start, offset))
+    return offsets
 
 
 def strip_trailing_fields_csv(names):
@@ -136,22 +473,23 @@ def transform_data(data, transformer):
     if not transformer:
         return data
 
-    renamed_field_data = transformer.apply_renamings(data)
-
-    field_names = renamed_field_data[0].keys()
-
-    if transformer.field_filters:
-        renamed_field_data = list(transformer.filter_fields(renamed_field_data))
-        field_names = [c for c in field_names if c in transformer.field_filters]
-
-    if transformer.exclude_fields:
-        renamed_field_data = list(transformer.filter_excluded(renamed_field_data))
-        field_names = [c for c in field_names if c not in transformer.exclude_fields]
-
-    errors = transformer.check_required_fields(renamed_field_data)
-    if errors:
-        return field_names, data, errors
-    return field_names, renamed_field_data, errors
+    field_names = []
+    transformed_data = []
+    report = RequiredFieldsReport()
+    for rn, item in enumerate(data):
+        # rows usually all have the same keys: their plan is cached
+        plan = transformer.get_column_plan(tuple(item))
+        values, = plan.transform_batch([tuple(item.values())])
+        if not rn:
+            field_names = plan.output_field_names
+        missings = plan.get_missing_required_fields(values)
+        if missings:
+            report.add(rn, missings)
+        transformed_data.append(dict(zip(plan.output_field_names, values)))
+
+    if report:
+        return field_names, data, report.get_errors()
+    return field_names, transformed_data, []
 
 
 tranformer_config_help = '''
@@ -212,6 +550,33 @@ and "temp" fields:
     exclude_fields:
         - type
         - temp
+
+* value_transforms:
+An optional map of field name to a list of transforms applied in sequence to
+the values of this field. Value transforms are applied after the renamings,
+filters and exclusions and before checking the required fields. The available
+transforms are:
+    - lowercase: convert the value to lowercase.
+    - uppercase: convert the value to uppercase.
+    - strip: remove leading and trailing spaces.
+    - replace: replace each match of a regular expression "pattern" with a
+      "replacement" text.
+    - default: set a default value if the value is empty.
+    - split: split the value on a separator and join the stripped, non-empty
+      parts with a new line, as used for multiple values.
+
+For instance with this configuration the "license_expression" values are
+lowercased with "gpl-2.0+" replaced by "gpl-2.0-plus" and set to "unknown" when
+empty, and the "notes" values are split on semicolons:
+    value_transforms:
+        license_expression:
+            - lowercase
+            - replace:
+                pattern: 'gpl-2\\.0\\+'
+                replacement: gpl-2.0-plus
+            - default: unknown
+        notes:
+            - split: ';'
 '''
 
 
@@ -223,6 +588,7 @@ class Transformer(object):
     required_fields = attr.attrib(default=attr.Factory(list))
     field_filters = attr.attrib(default=attr.Factory(list))
     exclude_fields = attr.attrib(default=attr.Factory(list))
+    value_transforms = attr.attrib(default=attr.Factory(dict))
 
     # a list of all the standard fields from AboutCode toolkit
     standard_fields = attr.attrib(default=attr.Factory(list), init=False)
@@ -236,6 +602,10 @@ class Transformer(object):
         about = About()
         self.essential_fields = list(about.required_fields)
         self.standard_fields = [f.name for f in about.all_fields()]
+        # map of field name to a list of compiled value transform functions
+        self.value_functions = compile_value_transforms(self.value_transforms)
+        # cache of ColumnPlan keyed by a tuple of source field names
+        self._column_plans = {}
 
     @classmethod
     def default(cls):
@@ -247,13 +617,14 @@ class Transformer(object):
             required_fields=[],
             field_filters=[],
             exclude_fields=[],
+            value_transforms={},
         )
 
     @classmethod
     def from_file(cls, location):
         """
         Load and return a Transformer instance from a YAML configuration file at
-        `location`.
+        `location`. Raise a ValueError if the configuration is not valid.
         """
         with io.open(location, encoding='utf-8') as conf:
             data = saneyaml.load(replace_tab_with_spaces(conf.read()))
@@ -262,49 +633,88 @@ class Transformer(object):
             required_fields=data.get('required_fields', []),
             field_filters=data.get('field_filters', []),
             exclude_fields=data.get('exclude_fields', []),
+            value_transforms=data.get('value_transforms', {}),
+        )
+
+    def get_configuration(self):
+        """
+        Return a mapping of the configuration of this Transformer that can be
+        used to create the same Transformer, such as in another process.
+        """
+        return dict(
+            field_renamings=self.field_renamings,
+            required_fields=self.required_fields,
+            field_filters=self.field_filters,
+            exclude_fields=self.exclude_fields,
+            value_transforms=self.value_transforms,
         )
 
+    def get_required_field_names(self):
+        """
+        Return a list of unique required field names, including the essential
+        fields.
+        """
+        required = []
+        for name in self.essential_fields + self.required_fields:
+            if name not in required:
+                required.append(name)
+        return required
+
     def check_required_fields(self, data):
         """
         Return a list of Error for a `data` list of ordered dict where a
-        dict is missing a value for a required field name.
+        dict is missing a value for a required field name, with one Error for
+        each required field.
         """
-        errors = []
-        required = set(self.essential_fields + self.required_fields)
+        required = self.get_required_field_names()
         if not required:
             return []
 
+        report = RequiredFieldsReport()
         for rn, item in enumerate(data):
             missings = [rk for rk in required if not item.get(rk)]
-            if not missings:
-                continue
+            if missings:
+                report.add(rn, missings)
+        return report.get_errors()
 
-            missings = ', '.join(missings)
-            msg = 'Row {rn} is missing required values for fields: {missings}'
-            errors.append(Error(CRITICAL, msg.format(**locals())))
-        return errors
+    def get_inverted_renamings(self):
+        """
+        Return a mapping of {source field name: [renamed field names]} from
+        the field renamings of this Transformer.
+        """
+        inverted = {}
+        for renamed_key, key in self.field_renamings.items():
+            inverted.setdefault(key, []).append(renamed_key)
+        return inverted
+
+    def get_column_plan(self, field_names):
+        """
+        Return a ColumnPlan to transform rows of values for the `field_names`
+        sequence of source field names. Plans are compiled once and cached for
+        each distinct sequence of field names.
+        """
+        field_names = tuple(field_names)
+        plan = self._column_plans.get(field_names)
+        if plan is None:
+            plan = ColumnPlan.from_transformer(self, field_names)
+            self._column_plans[field_names] = plan
+        return plan
 
     def apply_renamings(self, data):
         """
         Return a tranformed list of `field_names` where fields are renamed
         based on this Transformer configuration.
         """
-        renamings = self.field_renamings
-        if not renamings:
+        if not self.field_renamings:
             return data
-        renamings = {n: rn for n, rn in renamings.items()}
 
+        inverted = self.get_inverted_renamings()
         renamed_list = []
         for row in data:
             renamed = {}
-            for key in row:
-                matched = False
-                for renamed_key in renamings:
-                    if key == renamings[renamed_key]:
-                        renamed[renamed_key] = row[key]
-                        matched = True
-                if not matched:
-                    renamed[key] = row[key]
+            for key, value in row.items():
+                for renamed_key in inverted.get(key, (key,)):
+                    renamed[renamed_key] = value
             renamed_list.append(renamed)
         return renamed_list
 
@@ -341,6 +751,216 @@ class Transformer(object):
             yield {k: v for k, v in entry.items() if k not in exclude_fields}
 
 
+@attr.attributes
+class ColumnPlan(object):
+    """
+    A column plan is a Transformer configuration compiled for a given sequence
+    of source field names. It maps each output field to the index of its source
+    value such that a row of values is transformed in a single pass.
+    """
+    # list of source field names
+    field_names = attr.attrib(default=attr.Factory(list))
+    # list of transformed output field names
+    output_field_names = attr.attrib(default=attr.Factory(list))
+    # list of the index of the source value for each output field
+    source_indexes = attr.attrib(default=attr.Factory(list))
+    # list of (required field name, output index or None if not in the output)
+    required_indexes = attr.attrib(default=attr.Factory(list))
+    # list of (output index, list of value transform functions)
+    value_functions = attr.attrib(default=attr.Factory(list))
+
+    # called by attr after the __init__()
+    def __attrs_post_init__(self, *args, **kwargs):
+        self._get_values = get_values_getter(self.source_indexes)
+
+    @classmethod
+    def from_transformer(cls, transformer, field_names):
+        """
+        Return a ColumnPlan compiled from a `transformer` Transformer for a
+        `field_names` sequence of source field names.
+        """
+        inverted = transformer.get_inverted_renamings()
+
+        # a renamed field that already exists keeps its first position and its
+        # last value, the same as when renaming the keys of a dict
+        indexes_by_name = {}
+        for index, name in enumerate(field_names):
+            for output_name in inverted.get(name, (name,)):
+                indexes_by_name[output_name] = index
+
+        output_field_names = list(indexes_by_name)
+        if transformer.field_filters:
+            field_filters = set(transformer.field_filters)
+            output_field_names = [c for c in output_field_names if c in field_filters]
+        if transformer.exclude_fields:
+            exclude_fields = set(transformer.exclude_fields)
+            output_field_names = [c for c in output_field_names if c not in exclude_fields]
+
+        output_indexes = {name: index for index, name in enumerate(output_field_names)}
+        return cls(
+            field_names=list(field_names),
+            output_field_names=output_field_names,
+            source_indexes=[indexes_by_name[name] for name in output_field_names],
+            required_indexes=[(name, output_indexes.get(name))
+                              for name in transformer.get_required_field_names()],
+            value_functions=[(output_indexes[name], functions)
+                             for name, functions in transformer.value_functions.items()
+                             if name in output_indexes],
+        )
+
+    def transform_values(self, values):
+        """
+        Return a tuple of output values from a `values` sequence of source
+        values. Missing trailing source values are treated as None.
+        """
+        missing = len(self.field_names) - len(values)
+        if missing > 0:
+            values = list(values) + [None] * missing
+        return self._get_values(values)
+
+    def transform_batch(self, rows):
+        """
+        Return a list of tuples of output values from a `rows` list of
+        sequences of source values. Value transforms are applied column by
+        column over the whole batch.
+        """
+        batch = [self.transform_values(row) for row in rows]
+        if not self.value_functions or not batch:
+            return batch
+
+        columns = list(zip(*batch))
+        for index, functions in self.value_functions:
+            column = columns[index]
+            for function in functions:
+                column = map(function, column)
+            columns[index] = tuple(column)
+        return list(zip(*columns))
+
+    def get_missing_required_fields(self, values):
+        """
+        Return a list of required field names without a value in a `values`
+        tuple of output values.
+        """
+        return [name for name, index in self.required_indexes
+                if index is None or not values[index]]
+
+
+def get_values_getter(indexes):
+    """
+    Return a function that returns a tuple of the values at `indexes` from a
+    sequence of values.
+    """
+    if not indexes:
+        return lambda values: ()
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda values: (values[index],)
+    return itemgetter(*indexes)
+
+
+def get_batches(iterable, size):
+    """
+    Yield lists of at most `size` items from an `iterable`.
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def to_lowercase(value):
+    if isinstance(value, str):
+        return value.lower()
+    return value
+
+
+def to_uppercase(value):
+    if isinstance(value, str):
+        return value.upper()
+    return value
+
+
+def strip_value(value):
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def replace_value(value, pattern, replacement):
+    if isinstance(value, str):
+        return pattern.sub(replacement, value)
+    return value
+
+
+def set_default_value(value, default):
+    if not value:
+        return default
+    return value
+
+
+def split_value(value, separator):
+    if isinstance(value, str):
+        parts = (part.strip() for part in value.split(separator))
+        return '\n'.join(part for part in parts if part)
+    return value
+
+
+def compile_value_transform(transform):
+    """
+    Return a function for a `transform` value transform configuration: either a
+    transform name string or a mapping of a single transform name to its
+    argument. Raise a ValueError if the `transform` is not valid.
+    """
+    argument = None
+    if isinstance(transform, dict):
+        if len(transform) != 1:
+            raise ValueError(
+                'Invalid value transform: {transform}'.format(**locals()))
+        (name, argument), = transform.items()
+    else:
+        name = transform
+
+    if name in ('lowercase', 'uppercase', 'strip') and argument is None:
+        return dict(lowercase=to_lowercase, uppercase=to_uppercase, strip=strip_value)[name]
+
+    if name == 'default' and argument is not None:
+        return partial(set_default_value, default=argument)
+
+    if name == 'split' and argument:
+        return partial(split_value, separator=argument)
+
+    if name == 'replace' and isinstance(argument, dict) and argument.get('pattern'):
+        pattern = argument['pattern']
+        try:
+            pattern = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(
+                'Invalid replace pattern: {pattern}: {e}'.format(**locals()))
+        return partial(
+            replace_value, pattern=pattern, replacement=argument.get('replacement') or '')
+
+    raise ValueError('Invalid value transform: {transform}'.format(**locals()))
+
+
+def compile_value_transforms(value_transforms):
+    """
+    Return a mapping of {field name: [functions]} compiled from a
+    `value_transforms` mapping of {field name: [transforms]} configuration.
+    Raise a ValueError if a transform is not valid.
+    """
+    if not isinstance(value_transforms, dict):
+        raise ValueError('value_transforms must be a mapping of field name to a list of transforms.')
+
+    compiled = {}
+    for field_name, transforms in value_transforms.items():
+        if not isinstance(transforms, list):
+            transforms = [transforms]
+        compiled[field_name] = [compile_value_transform(t) for t in transforms]
+    return compiled
+
+
 def check_duplicate_fields(field_names):
     """
     Check that there are no duplicate in the `field_names` list of field name
@@ -368,6 +988,139 @@ def read_json(location):
         return json.load(jsonfile)
 
 
+def get_row_writer(output_format, outfile, field_names=None):
+    """
+    Return a row writer for an `output_format` writing to an `outfile` text
+    file object. `field_names` are the field names of all the rows if known
+    upfront.
+    """
+    if output_format == 'csv':
+        return CsvRowWriter(outfile, field_names)
+    elif output_format == 'json':
+        return JsonRowWriter(outfile)
+    elif output_format == 'jsonl':
+        return JsonLinesRowWriter(outfile)
+    raise ValueError('Unsupported output format: {}'.format(output_format))
+
+
+class CsvRowWriter(object):
+    """
+    Write rows of values to a CSV file object. If the `field_names` of all the
+    rows are not known upfront, rows are written to a temporary file and the
+    header with all the field names seen is written first on close().
+    """
+
+    def __init__(self, outfile, field_names=None, write_header=True):
+        self.outfile = outfile
+        # values from JSON items may need to be converted to text
+        self.convert_values = field_names is None
+        if field_names is None:
+            self.body = tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='\n')
+            self.writer = csv.writer(self.body)
+            self.field_names = []
+        else:
+            self.body = None
+            self.writer = csv.writer(outfile)
+            self.field_names = list(field_names)
+            if write_header:
+                self.writer.writerow(self.field_names)
+        self.indexes = {name: index for index, name in enumerate(self.field_names)}
+        # map of id(field names) to (field names, positions of the values or
+        # None if the field names are the same as the header)
+        self.positions = {}
+
+    def get_positions(self, field_names):
+        """
+        Return a list of header positions for a `field_names` list or None if
+        these are the same as the header.
+        """
+        cached = self.positions.get(id(field_names))
+        if cached and cached[0] is field_names:
+            return cached[1]
+
+        positions = []
+        for name in field_names:
+            if name not in self.indexes:
+                self.indexes[name] = len(self.field_names)
+                self.field_names.append(name)
+            positions.append(self.indexes[name])
+
+        if positions == list(range(len(self.field_names))):
+            positions = None
+        self.positions[id(field_names)] = (field_names, positions)
+        return positions
+
+    def write_row(self, field_names, values):
+        positions = self.get_positions(field_names)
+        if self.convert_values:
+            values = [get_csv_value(value) for value in values]
+        if positions is not None:
+            row = [None] * len(self.field_names)
+            for position, value in zip(positions, values):
+                row[position] = value
+            values = row
+        self.writer.writerow(values)
+
+    def close(self):
+        if self.body is None:
+            return
+        csv.writer(self.outfile).writerow(self.field_names)
+        self.body.seek(0)
+        shutil.copyfileobj(self.body, self.outfile)
+        self.body.close()
+        self.body = None
+
+
+def get_csv_value(value):
+    """
+    Return a `value` from a JSON item converted for a CSV: a list of strings is
+    joined with new lines and other lists and mappings are serialized as JSON.
+    """
+    if isinstance(value, list):
+        if all(isinstance(v, str) for v in value):
+            return '\n'.join(value)
+        return json.dumps(value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return value
+
+
+class JsonRowWriter(object):
+    """
+    Write rows of values to a JSON file object as a list of JSON objects one
+    row at a time. The output is the same as with json.dump(rows, indent=3).
+    """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+        self.rows_count = 0
+
+    def write_row(self, field_names, values):
+        item = json.dumps(dict(zip(field_names, values)), indent=3)
+        separator = ',\n' if self.rows_count else '[\n'
+        self.outfile.write(separator + '   ' + item.replace('\n', '\n   '))
+        self.rows_count += 1
+
+    def close(self):
+        self.outfile.write('\n]' if self.rows_count else '[]')
+
+
+class JsonLinesRowWriter(object):
+    """
+    Write rows of values to a JSON lines file object with one JSON object per
+    line.
+    """
+
+    def __init__(self, outfile):
+        self.outfile = outfile
+
+    def write_row(self, field_names, values):
+        self.outfile.write(json.dumps(dict(zip(field_names, values))) + '\n')
+
+    def close(self):
+        pass
+
+
 def write_csv(location, data, field_names):  # NOQA
     """
     Write a CSV file at `location` the `data` list of ordered dicts using the
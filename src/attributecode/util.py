@@ -13,17 +13,25 @@
 #  limitations under the License.
 # ============================================================================
 
+import atexit
 import codecs
+from concurrent.futures import ThreadPoolExecutor
+import io
 import csv
+import errno
+import hashlib
 import json
 import ntpath
 import os
 import posixpath
 import re
 import shutil
+import sqlite3
 import string
 import sys
-from distutils.dir_util import copy_tree
+import time
+import uuid
+from functools import lru_cache
 from itertools import zip_longest
 
 from attributecode import CRITICAL
@@ -222,6 +230,52 @@ def get_relative_path(base_loc, full_loc):
     return relative
 
 
+class PathTrie(object):
+    """
+    A trie of path segments. A path marked as selected covers all the paths
+    below it such that the selected paths are a minimal set of non-overlapping
+    paths regardless of the order they are added.
+    """
+
+    def __init__(self):
+        self.children = {}
+        self.selected = False
+
+    def add(self, segments):
+        """
+        Select the path of `segments` sequence of path segments. Return False if
+        this path is already covered by a selected path or True otherwise.
+        """
+        node = self
+        for segment in segments:
+            if node.selected:
+                return False
+            node = node.children.setdefault(segment, PathTrie())
+        if node.selected:
+            return False
+        node.selected = True
+        # any path selected below is now covered by this path
+        node.children = {}
+        return True
+
+    def get_selected(self):
+        """
+        Return a list of tuples of path segments for the selected paths, sorted
+        by path.
+        """
+        selected = []
+        stack = [((), self)]
+        while stack:
+            segments, node = stack.pop()
+            if node.selected:
+                selected.append(segments)
+                continue
+            # push in reverse order to pop the children sorted by name
+            for segment in sorted(node.children, reverse=True):
+                stack.append((segments + (segment,), node.children[segment]))
+        return selected
+
+
 def to_native(path):
     """
     Return a path using the current OS path separator given a path that may
@@ -269,26 +323,283 @@ def load_csv(location):
     return results
 
 
+def load_sqlite(location, license_key=None):
+    """
+    Read the components of a SQLite inventory database at `location` and
+    return a list of dictionaries, one for each component, with the same
+    values as a CSV inventory. If `license_key` license key or list of license
+    keys is provided, return only the components with one of these license
+    keys using the license keys index.
+    """
+    query = 'SELECT components.* FROM components'
+    params = ()
+    if license_key:
+        if isinstance(license_key, str):
+            params = (license_key,)
+        else:
+            params = tuple(sorted(license_key))
+        placeholders = ', '.join('?' for _ in params)
+        query += (
+            ' WHERE components.rowid IN '
+            '(SELECT component_rowid FROM component_licenses '
+            'WHERE license_key IN ({placeholders}))'.format(**locals()))
+    query += ' ORDER BY components.rowid'
+
+    connection = sqlite3.connect(location)
+    try:
+        cursor = connection.execute(query, params)
+        field_names = [description[0] for description in cursor.description]
+        return [
+            {name: value or '' for name, value in zip(field_names, values)}
+            for values in cursor
+        ]
+    finally:
+        connection.close()
+
+
+def quote_sqlite_name(name):
+    """
+    Return a `name` quoted as an SQLite identifier.
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+def get_sqlite_inventory_schema(field_names):
+    """
+    Return the SQL script that creates the tables and indexes of a SQLite
+    inventory database with a `field_names` list of component columns.
+    """
+    columns = ',\n    '.join(
+        '{} TEXT'.format(quote_sqlite_name(name)) for name in field_names)
+    indexes = '\n'.join(
+        'CREATE INDEX components_{name} ON components ({quoted});'.format(
+            name=name, quoted=quote_sqlite_name(name))
+        for name in ('name', 'about_resource') if name in field_names)
+    return """
+CREATE TABLE components (
+    {columns}
+);
+{indexes}
+CREATE TABLE licenses (
+    key TEXT PRIMARY KEY,
+    name TEXT,
+    url TEXT
+);
+CREATE TABLE component_licenses (
+    component_rowid INTEGER NOT NULL,
+    license_key TEXT NOT NULL COLLATE NOCASE REFERENCES licenses (key)
+);
+CREATE INDEX component_licenses_license_key ON component_licenses (license_key);
+CREATE INDEX component_licenses_component_rowid ON component_licenses (component_rowid);
+CREATE TABLE errors (
+    severity INTEGER,
+    message TEXT
+);
+""".format(**locals())
+
+
 def load_json(location):
     """
     Read JSON file at `location` and return a list of ordered dicts, one for
     each entry.
     """
-    with open(location) as json_file:
-        results = json.load(json_file)
+    return list(read_json_entries(location, get_inventory_entries_key))
 
-    # FIXME: this is too clever and complex... IMHO we should not try to guess the format.
-    # instead a command line option should be provided explictly to say what is the format
-    if isinstance(results, list):
-        results = sorted(results)
-    else:
-        if u'aboutcode_manager_notice' in results:
-            results = results['components']
-        elif u'scancode_notice' in results:
-            results = results['files']
+
+# FIXME: this is too clever and complex... IMHO we should not try to guess the format.
+# instead a command line option should be provided explictly to say what is the format
+def get_inventory_entries_key(data):
+    """
+    Return the name of the list of entries of a `data` JSON object from an
+    AboutCode Manager or a scancode-toolkit export or None.
+    """
+    if u'aboutcode_manager_notice' in data:
+        return 'components'
+    elif u'scancode_notice' in data:
+        return 'files'
+
+
+def get_scancode_entries_key(data):
+    """
+    Return the name of the list of entries of a `data` JSON object from a
+    scancode-toolkit scan or None.
+    """
+    try:
+        if data['headers'][0]['tool_name'] == 'scancode-toolkit':
+            return 'files'
+    except (KeyError, IndexError, TypeError):
+        pass
+
+
+# size of the text chunks read at once from a JSON file
+JSON_CHUNK_SIZE = 64 * 1024
+
+
+def read_json_entries(location, get_entries_key=get_inventory_entries_key,
+                      chunk_size=JSON_CHUNK_SIZE):
+    """
+    Yield entries incrementally from a JSON file at `location` using only a
+    small buffer such that JSON files of any size can be processed:
+
+    - if the JSON is a list, yield each item of the list,
+    - if the JSON is an object, call `get_entries_key` with the object members
+      read so far: when a member is a list and its name is the returned key,
+      yield each item of this list as soon as it is read. Otherwise, call
+      `get_entries_key` once the whole object is read and yield each item of
+      the list with the returned key name if any or the object itself.
+
+    Only the entries list is streamed: other members, such as scan headers,
+    are loaded. The file is read by text chunks of `chunk_size` characters.
+    """
+    with io.open(location, encoding='utf-8') as jsonfile:
+        reader = JsonStreamReader(jsonfile, chunk_size=chunk_size)
+
+        first = reader.peek()
+        if first == '[':
+            reader.skip()
+            for item in reader.iter_array():
+                yield item
+            return
+
+        if first != '{':
+            yield reader.read_value()
+            return
+
+        reader.skip()
+        data = {}
+        if reader.peek() != '}':
+            while True:
+                key = reader.read_value()
+                reader.expect(':')
+                if reader.peek() == '[' and key == get_entries_key(data):
+                    reader.skip()
+                    for item in reader.iter_array():
+                        yield item
+                    # the other members are not needed
+                    return
+                data[key] = reader.read_value()
+                if reader.expect(',}') == '}':
+                    break
+
+        entries_key = get_entries_key(data)
+        if not entries_key:
+            yield data
+            return
+        entries = data.get(entries_key)
+        if isinstance(entries, list):
+            for item in entries:
+                yield item
         else:
-            results = [results]
-    return results
+            yield entries
+
+
+class JsonStreamReader(object):
+    """
+    Read JSON values incrementally from a text file object using the standard
+    library JSON decoder on a buffer refilled as needed.
+    """
+    non_space = re.compile(r'\S')
+    number_tail = re.compile(r'[0-9.eE+\-]*\Z')
+
+    def __init__(self, jsonfile, chunk_size=JSON_CHUNK_SIZE):
+        self.jsonfile = jsonfile
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Read more text in the buffer dropping the consumed text. Return False
+        at the end of the file.
+        """
+        if self.eof:
+            return False
+        chunk = self.jsonfile.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Return the next non-space character without consuming it or an empty
+        string at the end of the file.
+        """
+        while True:
+            match = self.non_space.search(self.buffer, self.pos)
+            if match:
+                self.pos = match.start()
+                return self.buffer[self.pos]
+            self.pos = len(self.buffer)
+            if not self.fill():
+                return ''
+
+    def skip(self):
+        """
+        Consume the next character.
+        """
+        self.pos += 1
+
+    def expect(self, characters):
+        """
+        Consume and return the next non-space character if it is one of
+        `characters`. Raise a ValueError otherwise.
+        """
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(
+                'Invalid JSON: expected one of {characters!r} and got: '
+                '{character!r}'.format(**locals()))
+        self.skip()
+        return character
+
+    def read_value(self):
+        """
+        Consume and return the next JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                if self.fill():
+                    continue
+                raise
+            # a number at the end of the buffer may continue in the next chunk
+            # such as "100." or "1.5e" decoded as 100 and 1.5
+            if self.number_tail.match(self.buffer, end) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """
+        Yield each item of a JSON array whose opening bracket has been
+        consumed.
+        """
+        if self.peek() == ']':
+            self.skip()
+            return
+        while True:
+            yield self.read_value()
+            if self.expect(',]') == ']':
+                return
+
+
+def read_json_lines(location):
+    """
+    Yield items from a JSON lines file at `location` with one JSON item per
+    line, reading one line at a time.
+    """
+    with io.open(location, encoding='utf-8', errors='replace') as jsonfile:
+        for line in jsonfile:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
 
 
 # FIXME: rename to is_online: BUT do we really need this at all????
@@ -308,47 +619,194 @@ def have_network_connection():
         return True
 
 
-def extract_zip(location):
+# number of bytes copied at once when extracting an archive member
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+
+# temporary directories removed when the process exits
+temp_dirs_to_remove = []
+
+
+def extract_zip(location, cache_dir=None, threads=None):
     """
-    Extract a zip file at location in a temp directory and return the temporary
-    directory where the archive was extracted.
+    Extract a zip file at location and return the directory where the archive
+    was extracted. Members are streamed to disk in chunks of bounded size with
+    `threads` threads.
+
+    Without a `cache_dir`, the archive is extracted in a new temporary
+    directory removed when the process exits. Otherwise, the extracted trees
+    are cached in the `cache_dir` directory by the SHA1 of the archive such
+    that an archive with the same content is extracted only once. A cached tree
+    with missing or truncated files is extracted again. An extraction is done
+    in a temporary directory that is renamed to its cache directory once
+    complete and removed when the process exits otherwise.
     """
-    import zipfile
     import tempfile
+    import zipfile
 
     if not zipfile.is_zipfile(location):
         raise Exception('Incorrect zip file %(location)r' % locals())
 
     archive_base_name = os.path.basename(location).replace('.zip', '')
-    base_dir = tempfile.mkdtemp(prefix='aboutcode-toolkit-extract-')
-    target_dir = os.path.join(base_dir, archive_base_name)
+    if not cache_dir:
+        temp_dir = tempfile.mkdtemp(prefix='aboutcode-toolkit-extract-')
+        remove_at_exit(temp_dir)
+        target_dir = os.path.join(add_unc(temp_dir), archive_base_name)
+        extract_zip_members(location, target_dir, threads or COPY_THREADS)
+        return target_dir
+
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    cached_dir = add_unc(os.path.join(cache_dir, get_file_sha1(location)))
+    target_dir = os.path.join(cached_dir, archive_base_name)
+    if os.path.isdir(target_dir):
+        if is_extracted(location, target_dir):
+            return target_dir
+        shutil.rmtree(target_dir, ignore_errors=True)
+
+    temp_dir = tempfile.mkdtemp(prefix='.extract-', dir=cache_dir)
+    remove_at_exit(temp_dir)
+    temp_target_dir = os.path.join(temp_dir, archive_base_name)
+    extract_zip_members(location, temp_target_dir, threads or COPY_THREADS)
+    os.makedirs(cached_dir, exist_ok=True)
+    try:
+        os.rename(temp_target_dir, target_dir)
+    except OSError:
+        # another process extracted the same archive concurrently
+        if not os.path.isdir(target_dir):
+            raise
+    return target_dir
+
+
+def extract_zip_members(location, target_dir, threads=None):
+    """
+    Extract the members of the zip file at `location` in the `target_dir`
+    directory, streaming the files to disk in parallel with `threads` threads.
+    The members with an absolute path or a path outside of `target_dir` are
+    skipped.
+    """
+    import zipfile
+
     target_dir = add_unc(target_dir)
-    os.makedirs(target_dir)
+    with zipfile.ZipFile(location) as zipf:
+        files = []
+        os.makedirs(target_dir)
+        for info in zipf.infolist():
+            path = normalize_member_name(info.filename)
+            if not path:
+                continue
+            target = os.path.join(target_dir, *path.split('/'))
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                files.append((info, target))
 
-    if target_dir.endswith((ntpath.sep, posixpath.sep)):
-        target_dir = target_dir[:-1]
+        def extract(member):
+            info, target = member
+            # zipfile serializes the reads of the archive file between threads
+            # and the members are decompressed in parallel
+            with zipf.open(info) as inp, open(target, 'wb') as out:
+                shutil.copyfileobj(inp, out, EXTRACT_CHUNK_SIZE)
+            modified = time.mktime(info.date_time + (0, 0, -1))
+            os.utime(target, (modified, modified))
+
+        with ThreadPoolExecutor(max_workers=threads or COPY_THREADS) as executor:
+            # consume the results to raise any exception
+            list(executor.map(extract, files))
+
+
+def is_extracted(location, target_dir):
+    """
+    Return True if all the files of the zip file at `location` exist in the
+    `target_dir` directory with their original size.
+    """
+    import zipfile
 
     with zipfile.ZipFile(location) as zipf:
         for info in zipf.infolist():
-            name = info.filename
-            content = zipf.read(name)
-            target = os.path.join(target_dir, name)
-            is_dir = target.endswith((ntpath.sep, posixpath.sep))
-            if is_dir:
-                target = target[:-1]
-            parent = os.path.dirname(target)
-            if on_windows:
-                target = target.replace(posixpath.sep, ntpath.sep)
-                parent = parent.replace(posixpath.sep, ntpath.sep)
-            if not os.path.exists(parent):
-                os.makedirs(add_unc(parent))
-            if not content and is_dir:
-                if not os.path.exists(target):
-                    os.makedirs(add_unc(target))
-            if not os.path.exists(target):
-                with open(target, 'wb') as f:
-                    f.write(content)
-    return target_dir
+            path = normalize_member_name(info.filename)
+            if not path or info.is_dir():
+                continue
+            target = os.path.join(target_dir, *path.split('/'))
+            try:
+                if os.path.getsize(target) != info.file_size:
+                    return False
+            except OSError:
+                return False
+    return True
+
+
+def normalize_member_name(name):
+    """
+    Return a normalized relative posix path for an archive member `name` or an
+    empty string if this path is outside of the archive.
+    """
+    path = posixpath.normpath(to_posix(name).strip('/'))
+    if path in (posixpath.curdir, posixpath.pardir) or path.startswith('../'):
+        return ''
+    return path
+
+
+@lru_cache(maxsize=None)
+def get_extract_cache_dir():
+    """
+    Return the directory where extracted archives are cached across runs. This
+    is the aboutcode-toolkit/extract-cache directory of the cache directory of
+    the current user that only this user can access or, if it cannot be created
+    as such, a new temporary directory removed when the process exits.
+    """
+    if on_windows:
+        cache_home = os.environ.get('LOCALAPPDATA')
+    else:
+        cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+    cache_dir = os.path.join(cache_home, 'aboutcode-toolkit', 'extract-cache')
+    if create_private_dir(cache_dir):
+        return cache_dir
+
+    import tempfile
+    cache_dir = tempfile.mkdtemp(prefix='aboutcode-toolkit-extract-')
+    remove_at_exit(cache_dir)
+    return cache_dir
+
+
+def create_private_dir(location):
+    """
+    Create the `location` directory if it does not exist such that only the
+    current user can access it. Return True if this is a directory owned by the
+    current user that other users cannot access.
+    """
+    import stat
+    try:
+        os.makedirs(location, mode=0o700, exist_ok=True)
+        if on_windows:
+            return os.path.isdir(location)
+        status = os.lstat(location)
+        if not stat.S_ISDIR(status.st_mode) or status.st_uid != os.getuid():
+            return False
+        if stat.S_IMODE(status.st_mode) != 0o700:
+            os.chmod(location, 0o700)
+    except OSError:
+        return False
+    return True
+
+
+def remove_at_exit(location):
+    """
+    Remove the `location` directory tree, if it still exists, when the process
+    exits.
+    """
+    if not temp_dirs_to_remove:
+        atexit.register(remove_temp_dirs)
+    temp_dirs_to_remove.append(location)
+
+
+def remove_temp_dirs():
+    """
+    Remove the temporary directories registered with remove_at_exit.
+    """
+    while temp_dirs_to_remove:
+        shutil.rmtree(temp_dirs_to_remove.pop(), ignore_errors=True)
 
 
 def add_unc(location):
@@ -414,12 +872,62 @@ def copy_license_notice_files(fields, base_dir, reference_dir, afp):
     return errors
 
 
-def copy_file(from_path, to_path):
-    error = ''
+# ways to create the files of a copy: copy the content, create a hard link to the
+# source file or clone the source file content on copy-on-write file systems.
+# Hard links and clones fall back to a copy when they cannot be created.
+LINK_MODES = ('copy', 'hardlink', 'reflink')
+
+# number of threads used to copy files in parallel
+COPY_THREADS = 8
+
+# maximum number of bytes copied at once by the kernel
+KERNEL_COPY_SIZE = 1024 * 1024 * 1024
+
+# errors of a kernel copy function that is not supported for a pair of files
+KERNEL_COPY_UNSUPPORTED = set([
+    errno.EBADF,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.ENOTSUP,
+    errno.EOPNOTSUPP,
+    errno.EXDEV,
+])
+
+# number of bytes read at once to compute a file checksum
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Linux ioctl request to clone the content of a file on btrfs, XFS and others
+FICLONE = 0x40049409
+
+
+def copy_file(from_path, to_path, link_mode='copy'):
+    """
+    Copy the `from_path` file or directory in the `to_path` directory. Return
+    an Error if the target already exists or cannot be copied or an empty
+    string.
+    """
     # Return if the from_path is empty or None.
     if not from_path:
         return
 
+    errors, copies = get_file_copies(from_path, to_path)
+    errors.extend(copy_files(copies, link_mode=link_mode, threads=1))
+    if not errors:
+        return ''
+    return max(errors, key=lambda e: e.severity)
+
+
+def get_file_copies(from_path, to_path, warn_existing=True):
+    """
+    Return a tuple of (errors, copies) to copy the `from_path` file or directory
+    in the `to_path` directory where copies is a list of (source, target) file
+    paths. The target directories are created. Errors are critical errors or
+    warnings for targets that already exist and are replaced if `warn_existing`
+    is True.
+    """
+    errors = []
+    copies = []
     if on_windows:
         if not from_path.startswith(UNC_PREFIXES):
             from_path = add_unc(from_path)
@@ -431,33 +939,361 @@ def copy_file(from_path, to_path):
     to_path = to_path.strip()
     # Errors will be captured when doing the validation
     if not os.path.exists(from_path):
-        return ''
+        return errors, copies
 
-    if not posixpath.exists(to_path):
-        os.makedirs(to_path)
     try:
+        if not posixpath.exists(to_path):
+            os.makedirs(to_path)
         if os.path.isdir(from_path):
             # Copy the whole directory structure
             if from_path.endswith('/'):
                 from_path = from_path.rpartition('/')[0]
             folder_name = os.path.basename(from_path)
             to_path = os.path.join(to_path, folder_name)
-            if os.path.exists(to_path):
+            if warn_existing and os.path.exists(to_path):
                 msg = to_path + ' is already existed and is replaced by ' + from_path
-                error = Error(WARNING, msg)
-            copy_tree(from_path, to_path)
+                errors.append(Error(WARNING, msg))
+            for root, dirs, files in os.walk(from_path, followlinks=True):
+                dirs.sort()
+                to_dir = os.path.join(to_path, os.path.relpath(root, from_path))
+                os.makedirs(to_dir, exist_ok=True)
+                for file_name in sorted(files):
+                    copies.append(
+                        (os.path.join(root, file_name), os.path.join(to_dir, file_name)))
         else:
             file_name = os.path.basename(from_path)
             to_file_path = os.path.join(to_path, file_name)
-            if os.path.exists(to_file_path):
+            if warn_existing and os.path.exists(to_file_path):
                 msg = to_file_path + ' is already existed and is replaced by ' + from_path
-                error = Error(WARNING, msg)
-            shutil.copy2(from_path, to_path)
-        return error
-    except Exception as e:
+                errors.append(Error(WARNING, msg))
+            copies.append((from_path, to_file_path))
+    except Exception:
         msg = 'Cannot copy file at %(from_path)r.' % locals()
-        error = Error(CRITICAL, msg)
-        return error
+        errors.append(Error(CRITICAL, msg))
+    return errors, copies
+
+
+def copy_files(copies, link_mode='copy', threads=COPY_THREADS):
+    """
+    Copy a `copies` list of (source, target) file paths using `threads` threads
+    and return a list of errors. `link_mode` is one of LINK_MODES.
+    """
+    def copy(paths):
+        from_path, to_path = paths
+        try:
+            copy_file_data(from_path, to_path, link_mode)
+        except Exception:
+            msg = 'Cannot copy file at %(from_path)r.' % locals()
+            return Error(CRITICAL, msg)
+
+    if threads > 1 and len(copies) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(copy, copies))
+    else:
+        results = [copy(paths) for paths in copies]
+    return [error for error in results if error]
+
+
+def copy_file_data(from_path, to_path, link_mode='copy'):
+    """
+    Create the `to_path` file with the content of the `from_path` file as a
+    hard link, a clone or a copy depending on `link_mode`. An existing
+    `to_path` file is replaced.
+    """
+    # Remove the target first such that a copy never writes through a hard
+    # link created by a previous run in the source file
+    if os.path.lexists(to_path):
+        os.remove(to_path)
+
+    if link_mode == 'hardlink':
+        try:
+            os.link(from_path, to_path)
+            return
+        except OSError:
+            # not supported by the file system or across file systems
+            pass
+
+    try:
+        with open(from_path, 'rb') as source, open(to_path, 'wb') as target:
+            if not (link_mode == 'reflink' and clone_file_content(source, target)):
+                copy_file_content(source, target)
+        shutil.copystat(from_path, to_path)
+    except Exception:
+        # do not leave a partial copy behind
+        if os.path.lexists(to_path):
+            os.remove(to_path)
+        raise
+
+
+def get_file_sha1(location):
+    """
+    Return the SHA1 hex digest of the content of the file at `location`.
+    """
+    sha1 = hashlib.sha1()
+    with open(location, 'rb') as inp:
+        for block in iter(lambda: inp.read(HASH_BLOCK_SIZE), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def clone_file_content(source, target):
+    """
+    Clone the content of the `source` file object in the `target` file object
+    on a copy-on-write file system. Return True if the content was cloned.
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        return True
+    except OSError:
+        return False
+
+
+def copy_file_content(source, target):
+    """
+    Copy the content of the `source` file object to the `target` file object
+    in the kernel with os.copy_file_range or os.sendfile when available and
+    supported for these files, otherwise with a buffered copy.
+    """
+    source_fd = source.fileno()
+    target_fd = target.fileno()
+    offset = 0
+    for kernel_copy in get_kernel_copies():
+        try:
+            while True:
+                copied = kernel_copy(source_fd, target_fd, offset, KERNEL_COPY_SIZE)
+                if not copied:
+                    return
+                offset += copied
+        except OSError as e:
+            if e.errno not in KERNEL_COPY_UNSUPPORTED:
+                raise
+
+    source.seek(offset)
+    target.seek(offset)
+    shutil.copyfileobj(source, target)
+
+
+def get_kernel_copies():
+    """
+    Return a list of functions copying up to `count` bytes at `offset` from a
+    source to a target file descriptor in the kernel, in preference order.
+    """
+    kernel_copies = []
+    if hasattr(os, 'copy_file_range'):
+        def copy_with_copy_file_range(source_fd, target_fd, offset, count):
+            return os.copy_file_range(source_fd, target_fd, count, offset, offset)
+        kernel_copies.append(copy_with_copy_file_range)
+
+    if hasattr(os, 'sendfile'):
+        def copy_with_sendfile(source_fd, target_fd, offset, count):
+            os.lseek(target_fd, offset, os.SEEK_SET)
+            return os.sendfile(target_fd, source_fd, offset, count)
+        kernel_copies.append(copy_with_sendfile)
+    return kernel_copies
+
+
+# archive formats by output file extension
+ARCHIVE_FORMATS = {
+    '.zip': 'zip',
+    '.tar.gz': 'w:gz',
+    '.tgz': 'w:gz',
+    '.tar.xz': 'w:xz',
+}
+
+# ways to compress zip archive members: "auto" stores the files that are
+# already compressed and deflates the other files.
+COMPRESSIONS = ('auto', 'deflate', 'store')
+
+# name of the zip archive member mapping the names of the deduplicated members
+# to the name of the member with the same content
+DEDUP_MANIFEST_NAME = 'dedup-manifest.json'
+
+DEDUP_MANIFEST_VERSION = 1
+
+# extensions of already compressed files that are stored in zip archives as-is
+# with the "auto" compression
+COMPRESSED_EXTENSIONS = (
+    '.7z', '.apk', '.bz2', '.deb', '.ear', '.egg', '.gem', '.gif', '.gz',
+    '.jar', '.jpeg', '.jpg', '.lz', '.lzma', '.mp3', '.mp4', '.nupkg', '.png',
+    '.rar', '.rpm', '.tbz2', '.tgz', '.txz', '.war', '.webp', '.whl', '.xz',
+    '.zip', '.zst',
+)
+
+
+def get_archive_format(location):
+    """
+    Return the archive format of an output archive `location` based on its
+    extension or None if this is not a supported archive.
+    """
+    lower_location = location.lower()
+    for extension, archive_format in ARCHIVE_FORMATS.items():
+        if lower_location.endswith(extension):
+            return archive_format
+
+
+def get_archive_members(from_path, to_dir):
+    """
+    Return a list of (source, member name) for the `from_path` file or for the
+    `from_path` directory and all its directories and files, where member names
+    are posix paths under the `to_dir` posix path. Directory member names end
+    with a slash.
+    """
+    from_path = from_path.strip()
+    if on_windows and not from_path.startswith(UNC_PREFIXES):
+        from_path = add_unc(from_path)
+    if not os.path.exists(from_path):
+        return []
+
+    from_path = from_path.rstrip(ntpath.sep + posixpath.sep)
+    to_dir = posixpath.join(to_dir, os.path.basename(from_path))
+    if not os.path.isdir(from_path):
+        return [(from_path, to_dir)]
+
+    members = []
+    for root, dirs, files in os.walk(from_path, followlinks=True):
+        dirs.sort()
+        member_dir = to_dir
+        relative = os.path.relpath(root, from_path)
+        if relative != os.curdir:
+            member_dir = posixpath.join(to_dir, to_posix(relative))
+        members.append((root, member_dir + '/'))
+        for file_name in sorted(files):
+            members.append((os.path.join(root, file_name), posixpath.join(member_dir, file_name)))
+    return members
+
+
+def write_archive(location, members, compression='auto', duplicates=None):
+    """
+    Write the `members` list of (source, member name) to a new archive at
+    `location` streaming each source file from disk. The archive format is
+    based on the `location` extension. `compression` is one of COMPRESSIONS
+    and is used for zip archives members.
+
+    `duplicates` is an optional mapping of {source: original source} for the
+    sources with the same content as an original source. These are added as
+    hard links to the original member in tar archives and are listed in a
+    DEDUP_MANIFEST_NAME JSON member of zip archives instead of being stored.
+
+    Return a tuple of (errors, deduplicated) where deduplicated is a mapping of
+    {member name: original member name} for the members that are not stored.
+    """
+    import tarfile
+    import zipfile
+
+    errors = []
+    seen = set()
+    duplicates = duplicates or {}
+    # {source: member name} for the sources stored in the archive
+    stored = {}
+    deduplicated = {}
+    archive_format = get_archive_format(location)
+    if archive_format == 'zip':
+        archive = zipfile.ZipFile(location, 'w', allowZip64=True)
+    else:
+        # follow the symlinks as the members and the zip archives do
+        archive = tarfile.open(location, archive_format, dereference=True)
+
+    with archive:
+        for from_path, name in members:
+            if name in seen:
+                msg = ('Duplicated archive member %(name)r from %(from_path)r '
+                       'is not added.' % locals())
+                errors.append(Error(WARNING, msg))
+                continue
+            seen.add(name)
+            original_name = stored.get(duplicates.get(from_path))
+            try:
+                if original_name and archive_format == 'zip':
+                    deduplicated[name] = original_name
+                elif original_name:
+                    info = archive.gettarinfo(from_path, arcname=name)
+                    info.type = tarfile.LNKTYPE
+                    info.linkname = original_name
+                    info.size = 0
+                    archive.addfile(info)
+                    deduplicated[name] = original_name
+                elif archive_format != 'zip':
+                    archive.add(from_path, arcname=name.rstrip('/'), recursive=False)
+                    stored.setdefault(from_path, name)
+                elif name.endswith('/'):
+                    archive.write(from_path, arcname=name)
+                else:
+                    archive.write(
+                        from_path, arcname=name,
+                        compress_type=get_zip_compression(name, compression))
+                    stored.setdefault(from_path, name)
+            except Exception:
+                msg = 'Cannot copy file at %(from_path)r.' % locals()
+                errors.append(Error(CRITICAL, msg))
+
+        if deduplicated and archive_format == 'zip':
+            manifest = dict(version=DEDUP_MANIFEST_VERSION, duplicates=deduplicated)
+            archive.writestr(
+                DEDUP_MANIFEST_NAME,
+                json.dumps(manifest, indent=2, sort_keys=True),
+                compress_type=zipfile.ZIP_DEFLATED)
+    return errors, deduplicated
+
+
+def get_duplicates(locations, threads=COPY_THREADS):
+    """
+    Return a mapping of {location: original location} for the files of the
+    `locations` list that have the same content as a previous file of the list.
+    Only the files that have the same size as another file are hashed, in
+    parallel with `threads` threads. Empty files are not duplicates.
+    """
+    # ordered unique locations
+    locations = list(dict.fromkeys(locations))
+    locations_by_size = {}
+    for location in locations:
+        try:
+            size = os.path.getsize(location)
+        except OSError:
+            continue
+        if size:
+            locations_by_size.setdefault(size, []).append(location)
+
+    candidates = set()
+    for same_size_locations in locations_by_size.values():
+        if len(same_size_locations) > 1:
+            candidates.update(same_size_locations)
+    # keep the original order such that the first file is the original
+    candidates = [location for location in locations if location in candidates]
+
+    def get_sha1(location):
+        try:
+            return get_file_sha1(location)
+        except OSError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        sha1s = list(executor.map(get_sha1, candidates))
+
+    duplicates = {}
+    originals = {}
+    for location, sha1 in zip(candidates, sha1s):
+        if not sha1:
+            continue
+        original = originals.setdefault(sha1, location)
+        if original != location:
+            duplicates[location] = original
+    return duplicates
+
+
+def get_zip_compression(name, compression='auto'):
+    """
+    Return the zipfile compression type for a zip member `name`.
+    """
+    import zipfile
+
+    if compression == 'store':
+        return zipfile.ZIP_STORED
+    if compression == 'auto' and name.lower().endswith(COMPRESSED_EXTENSIONS):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
 
 
 # FIXME: we should use a license object instead
@@ -570,6 +1406,34 @@ def filter_errors(errors, minimum_severity=WARNING):
     return unique([e for e in errors if e.severity >= minimum_severity])
 
 
+def create_temp_output(location, prefix):
+    """
+    Create a new empty temporary file in the directory of an output file
+    `location` with the same extension and return its location. Unlike with
+    tempfile.mkstemp, the file has the permissions of any new file given the
+    umask.
+    """
+    output_dir = os.path.dirname(os.path.abspath(location))
+    _base, suffix = os.path.splitext(location)
+    while True:
+        temp_location = os.path.join(output_dir, prefix + uuid.uuid4().hex + suffix)
+        try:
+            with io.open(temp_location, 'xb'):
+                return temp_location
+        except FileExistsError:
+            continue
+
+
+def replace_output(temp_location, location):
+    """
+    Replace an output file at `location` with the `temp_location` file. Keep
+    the permissions of an existing `location` file.
+    """
+    if os.path.exists(location):
+        shutil.copymode(location, temp_location)
+    os.replace(temp_location, location)
+
+
 def create_dir(location):
     """
     Create directory or directory tree at location, ensuring it is readable
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+# ============================================================================
+#  Copyright (c) nexB Inc. http://www.nexb.com/ - All rights reserved.
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#      http://www.apache.org/licenses/LICENSE-2.0
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ============================================================================
+
+import gzip
+import io
+import os
+import posixpath
+import tarfile
+import unittest
+import zipfile
+
+import mock
+
+from testing_utils import get_test_loc
+from testing_utils import get_temp_dir
+
+from attributecode import archive
+from attributecode import model
+
+
+ABOUT = '''about_resource: zlib.c
+name: zlib
+license_expression: zlib
+license_file: zlib.LICENSE
+'''
+
+
+def create_archive(location):
+    """
+    Create a zip or tar archive at `location` with a project directory
+    containing an ABOUT file, its resource and its license file.
+    """
+    members = [
+        ('project/zlib/zlib.ABOUT', ABOUT.replace('\n', '\r\n')),
+        ('project/zlib/zlib.c', 'int main;'),
+        ('project/zlib/zlib.LICENSE', 'zlib license text\n'),
+        ('project/README', 'readme'),
+    ]
+    if location.endswith('.zip'):
+        with zipfile.ZipFile(location, 'w') as zipf:
+            for name, content in members:
+                zipf.writestr(name, content)
+    else:
+        base = get_temp_dir()
+        for name, content in members:
+            path = os.path.join(base, name)
+            if not os.path.exists(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'w', newline='') as of:
+                of.write(content)
+        with tarfile.open(location, 'w:gz') as tar:
+            tar.add(os.path.join(base, 'project'), arcname='project')
+    return location
+
+
+class ArchiveTest(unittest.TestCase):
+
+    def tearDown(self):
+        archive.close_archives()
+
+    def test_is_archive(self):
+        assert archive.is_archive('/some/project.ZIP')
+        assert archive.is_archive('project.tar.xz')
+        assert not archive.is_archive('project.csv')
+
+    def test_open_archive_as_a_virtual_directory(self):
+        location = create_archive(os.path.join(get_temp_dir(), 'project.zip'))
+        root = archive.open_archive(location)
+
+        assert archive.exists(root)
+        assert archive.exists(posixpath.join(root, 'project'))
+        assert archive.exists(posixpath.join(root, 'project/zlib/zlib.c'))
+        assert not archive.exists(posixpath.join(root, 'project/zlib/missing.c'))
+        assert 'readme' == archive.read_text(posixpath.join(root, 'project/README'))
+
+        expected = [posixpath.join(root, 'project/zlib/zlib.ABOUT')]
+        assert expected == archive.get_about_locations(root)
+        expected = [posixpath.join(root, 'project/zlib/zlib.ABOUT')]
+        assert expected == archive.get_about_locations(posixpath.join(root, 'project/zlib'))
+
+    def test_open_archive_with_invalid_archive(self):
+        location = get_test_loc('test_model/single_file/django_snippets_2413.ABOUT')
+        try:
+            archive.open_archive(location)
+            self.fail('Exception not raised')
+        except Exception as e:
+            assert 'Incorrect archive file' in str(e)
+
+    def test_collect_inventory_from_zip_and_tar_archives(self):
+        base = get_temp_dir()
+        for name in ('project.zip', 'project.tar.gz'):
+            location = create_archive(os.path.join(base, name))
+            root = archive.open_archive(location)
+
+            errors, abouts = model.collect_inventory(root)
+            assert [] == [e for e in errors if 'not found' in e.message]
+            assert 1 == len(abouts)
+            about = abouts[0]
+            assert 'project/zlib/zlib.ABOUT' == about.about_file_path
+            assert 'zlib' == about.name.value
+            assert {'zlib.LICENSE': 'zlib license text\n'} == dict(about.license_file.value)
+
+        # nothing was extracted next to the archives
+        assert sorted(['project.zip', 'project.tar.gz']) == sorted(os.listdir(base))
+
+    def test_collect_inventory_from_tar_gz_does_not_decompress_again_for_each_member(self):
+        # the members are not stored in the sorted order of their paths
+        location = os.path.join(get_temp_dir(), 'project.tar.gz')
+        with tarfile.open(location, 'w:gz') as tar:
+            for name in ('zlib', 'openssl', 'bzip2'):
+                about = ABOUT.replace('zlib', name)
+                for member, content in [
+                    (name + '/' + name + '.LICENSE', name + ' license text\n'),
+                    (name + '/' + name + '.c', 'int main;'),
+                    (name + '/' + name + '.ABOUT', about),
+                ]:
+                    content = content.encode('utf-8')
+                    info = tarfile.TarInfo(member)
+                    info.size = len(content)
+                    tar.addfile(info, io.BytesIO(content))
+
+        rewind = gzip._GzipReader._rewind
+        with mock.patch.object(gzip._GzipReader, '_rewind', autospec=True, side_effect=rewind) as rewinds:
+            root = archive.open_archive(location)
+            _errors, abouts = model.collect_inventory(root)
+        assert 0 == rewinds.call_count
+        assert ['bzip2', 'openssl', 'zlib'] == [a.name.value for a in abouts]
+        expected = [{name + '.LICENSE': name + ' license text\n'} for name in ('bzip2', 'openssl', 'zlib')]
+        assert expected == [dict(a.license_file.value) for a in abouts]
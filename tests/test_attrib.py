@@ -16,12 +16,15 @@
 
 import io
 import os
+import shutil
 import unittest
 
+from testing_utils import get_temp_dir
 from testing_utils import get_test_loc
 from testing_utils import get_temp_file
 
 from attributecode import attrib
+from attributecode import attrib_util
 from attributecode import model
 
 
@@ -122,6 +125,161 @@ class GenerateTest(unittest.TestCase):
 
         assert f1 == f2
 
+    def test_generate_and_save_all_renders_each_template(self):
+        test_file = get_test_loc('test_attrib/gen_simple/attrib.ABOUT')
+        errors, abouts = model.collect_inventory(test_file)
+        assert not errors
+
+        test_template = get_test_loc('test_attrib/gen_simple/test.template')
+        output_file1 = get_temp_file()
+        output_file2 = get_temp_file()
+        errors, rendered_texts = attrib.generate_and_save_all(
+            abouts,
+            template_and_output_locations=[
+                (test_template, output_file1),
+                (attrib.DEFAULT_TEMPLATE_FILE, output_file2),
+            ])
+        assert not errors
+        assert len(rendered_texts) == 2
+
+        expected = (
+            'Apache HTTP Server: 2.4.3\n'
+            'resource: httpd-2.4.3.tar.gz\n')
+        with open(output_file1) as of:
+            assert expected == of.read()
+        with open(output_file2) as of:
+            assert 'Apache HTTP Server' in of.read()
+
+    def test_generate_deduplicates_license_texts_by_content(self):
+        test_dir = get_test_loc('test_attrib/gen_dedup_license_text')
+        errors, abouts = model.collect_inventory(test_dir)
+        assert not errors
+
+        template = (
+            '{% for text_hash in license_text_hash_and_context %}'
+            '{{ license_text_hash_and_license_file_keys[text_hash] | join(",") }}: '
+            '{{ license_text_hash_and_abouts[text_hash] | map(attribute="name.value") | sort | join(",") }}\n'
+            '{% endfor %}')
+
+        error, result = attrib.generate(abouts, template)
+        assert not error
+        expected = (
+            'LICENSE-APACHE.txt,apache-2.0: a,b\n'
+            'mit: c\n')
+        assert expected == result
+
+    def test_generate_with_default_template_links_common_licenses_without_file(self):
+        # d has the common apache-2.0 license key without a license file
+        test_dir = os.path.join(get_temp_dir(), 'project')
+        shutil.copytree(get_test_loc('test_attrib/gen_dedup_license_text'), test_dir)
+        with open(os.path.join(test_dir, 'd.ABOUT'), 'w') as out:
+            out.write('about_resource: a.c\nname: d\nlicense_expression: apache-2.0\n'
+                      'licenses:\n  - key: apache-2.0\n')
+        _errors, abouts = model.collect_inventory(test_dir)
+        abouts = sorted([a for a in abouts if a.name.value in ('a', 'd')], key=lambda a: a.name.value != 'd')
+
+        error, result = attrib.generate_from_file(abouts)
+        assert not error
+        component = result.split('id="component_0"')[1].split('</div>')[0]
+        assert 'href="#license-text-' in component
+        anchors = [line for line in result.splitlines() if 'id="license-text-' in line]
+        assert 1 == len(anchors)
+        link = component.split('href="#license-text-')[1].split('"')[0]
+        assert 'id="license-text-{link}"'.format(**locals()) in anchors[0]
+
+    def test_get_license_text_hash_ignores_spaces_and_line_endings(self):
+        text = 'Licensed under the Apache License\nVersion 2.0\n'
+        same = '\r\n  Licensed under the Apache License  \r\nVersion 2.0\r\n\r\n'
+        other = 'Licensed under the MIT License\n'
+        assert attrib.get_license_text_hash(text) == attrib.get_license_text_hash(same)
+        assert attrib.get_license_text_hash(text) != attrib.get_license_text_hash(other)
+
+    def test_generate_split_and_save_writes_bounded_pages(self):
+        test_dir = get_test_loc('test_attrib/gen_dedup_license_text')
+        errors, abouts = model.collect_inventory(test_dir)
+        assert not errors
+
+        output_dir = get_temp_dir()
+        errors, generated = attrib.generate_split_and_save(
+            abouts, output_dir, split_size=2)
+        assert not errors
+        expected = [
+            'index.html',
+            'components-1.html',
+            'components-2.html',
+            'licenses.html',
+        ]
+        assert expected == [os.path.basename(g) for g in generated]
+
+        with io.open(os.path.join(output_dir, 'components-1.html'), encoding='utf-8') as cf:
+            first_page = cf.read()
+        assert 'id="component_0"' in first_page
+        assert 'id="component_1"' in first_page
+        assert 'id="component_2"' not in first_page
+        assert 'href="components-2.html"' in first_page
+
+        with io.open(os.path.join(output_dir, 'licenses.html'), encoding='utf-8') as lf:
+            licenses_page = lf.read()
+        # the same Apache text is listed once for both components
+        assert 1 == licenses_page.count('Licensed under the Apache License')
+        assert 'href="components-1.html#component_0"' in licenses_page
+        assert 'href="components-2.html#component_2"' in licenses_page
+
+        with io.open(os.path.join(output_dir, 'index.html'), encoding='utf-8') as idf:
+            assert 'href="components-2.html#component_2"' in idf.read()
+
+    def test_generate_uses_shared_environment_without_global_filters(self):
+        import jinja2
+        assert 'multi_sort' not in jinja2.filters.FILTERS
+        template = '{% for a in abouts|multi_sort(attributes=["name"]) %}{{ a.name }}{% endfor %}'
+        assert attrib.check_template(template) is None
+        assert 'multi_sort' not in jinja2.filters.FILTERS
+        assert attrib_util.get_template(template) is attrib_util.get_template(template)
+
+    def test_unique_together_with_unhashable_values(self):
+        template = attrib_util.get_template(
+            '{% for a in items|unique_together(attributes=["name", "licenses"]) %}'
+            '{{ a.name }}:{{ a.licenses|join(",") }};'
+            '{% endfor %}')
+        items = [
+            dict(name='a', licenses=['mit', 'gpl']),
+            dict(name='A', licenses=['mit', 'gpl']),
+            dict(name='a', licenses=['mit']),
+            dict(name='b', licenses={"path": ["x"]}),
+            dict(name='b', licenses={"path": ["x"]}),
+        ]
+        assert 'a:mit,gpl;a:mit;b:path;' == template.render(items=items)
+
+    def test_unique_together_keeps_equal_values_of_different_types(self):
+        template = attrib_util.get_template(
+            '{% for a in items|unique_together(attributes=["version"]) %}'
+            '{{ a.version }};'
+            '{% endfor %}')
+        items = [
+            dict(version=1),
+            dict(version=1.0),
+            dict(version=True),
+            dict(version=1),
+            dict(version=[1]),
+            dict(version=(1,)),
+        ]
+        assert '1;1.0;True;[1];(1,);' == template.render(items=items)
+
+    def test_group_by_license_filter(self):
+        test_dir = get_test_loc('test_attrib/gen_dedup_license_text')
+        errors, abouts = model.collect_inventory(test_dir)
+        assert not errors
+        template = (
+            '{% for license_key, about_objects in abouts|group_by_license %}'
+            '{{ license_key }}: {{ about_objects | map(attribute="name.value") | sort | join(",") }}\n'
+            '{% endfor %}')
+        error, result = attrib.generate(abouts, template)
+        assert not error
+        expected = (
+            'apache-2.0: a,b\n'
+            'mit: c\n')
+        assert expected == result
+
 
 def remove_timestamp(html_text):
     """
@@ -15,6 +15,7 @@
 # ============================================================================
 
 import io
+import os
 import unittest
 
 from attributecode import CRITICAL
@@ -391,6 +392,25 @@ def test_about_inventory_command_can_run_minimally_without_error():
     run_about_command_test_click(['inventory', test_dir, result])
 
 
+def test_about_inventory_command_can_filter_components():
+    test_dir = get_test_loc('test_cmd/repository-mini')
+    result = get_temp_file('inventory.csv')
+    run_about_command_test_click(
+        ['inventory', '--filter', 'license=mit and name!=xtrans', test_dir, result])
+    with open(result) as res:
+        inventory = res.read()
+    assert 'appdirs' in inventory
+    assert 'xtrans' not in inventory
+
+
+def test_about_inventory_command_fails_with_an_invalid_filter():
+    test_dir = get_test_loc('test_cmd/repository-mini')
+    result = get_temp_file('inventory.csv')
+    result = run_about_command_test_click(
+        ['inventory', '--filter', 'name=', test_dir, result], expected_rc=2)
+    assert b'Invalid filter' in result.output_bytes
+
+
 def test_about_gen_command_can_run_minimally_without_error():
     test_inv = get_test_loc('test_cmd/geninventory.csv')
     gen_dir = get_temp_dir()
@@ -403,6 +423,46 @@ def test_about_attrib_command_can_run_minimally_without_error():
     run_about_command_test_click(['attrib', test_dir, result])
 
 
+def test_about_attrib_command_can_generate_multiple_outputs():
+    test_dir = get_test_loc('test_cmd/repository-mini')
+    template = get_test_loc('test_attrib/gen_simple/test.template')
+    result = get_temp_file()
+    result2 = get_temp_file()
+    run_about_command_test_click(
+        ['attrib', '--template-output', template, result2, test_dir, result])
+    with open(result2) as res:
+        assert 'appdirs' in res.read()
+
+
+def test_about_attrib_command_can_generate_split_attribution():
+    test_dir = get_test_loc('test_cmd/repository-mini')
+    result = get_temp_dir()
+    run_about_command_test_click(['attrib', '--split-size', '1', test_dir, result])
+    assert os.path.exists(os.path.join(result, 'index.html'))
+    assert os.path.exists(os.path.join(result, 'components-1.html'))
+    assert os.path.exists(os.path.join(result, 'licenses.html'))
+
+
+def test_about_attrib_command_can_generate_from_an_inventory():
+    test_inv = get_test_loc('test_gen/lic_issue_450/custom_and_valid_lic_key_with_file.csv')
+    reference = get_test_loc('test_gen/lic_issue_450')
+    result = get_temp_file()
+    run_about_command_test_click(['attrib', '--reference', reference, test_inv, result])
+    with open(result) as res:
+        attribution = res.read()
+    assert 'test.h' in attribution
+    assert 'This is a custom license.' in attribution
+
+
+def test_about_attrib_command_fails_with_reference_without_inventory():
+    test_dir = get_test_loc('test_cmd/repository-mini')
+    reference = get_test_loc('test_gen/lic_issue_450')
+    result = get_temp_file()
+    result = run_about_command_test_click(
+        ['attrib', '--reference', reference, test_dir, result], expected_rc=2)
+    assert b'The --reference option can only be used' in result.output_bytes
+
+
 def test_about_transform_command_can_run_minimally_without_error():
     test_file = get_test_loc('test_cmd/transform.csv')
     result = get_temp_file('file_name.csv')
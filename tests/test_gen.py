@@ -14,9 +14,13 @@
 #  limitations under the License.
 # ============================================================================
 
+import os
 import unittest
 
+import mock
+
 from testing_utils import get_temp_dir
+from testing_utils import get_temp_file
 from testing_utils import get_test_loc
 
 from attributecode import ERROR
@@ -24,6 +28,9 @@ from attributecode import INFO
 from attributecode import CRITICAL
 from attributecode import Error
 from attributecode import gen
+from attributecode import model
+from attributecode import util
+from attributecode.query import compile_filter
 from unittest.case import skip
 
 
@@ -103,6 +110,69 @@ custom1: |
         result = [a.dumps() for a in abouts]
         assert expected == result[0]
 
+    def test_load_inventory_from_json_lines(self):
+        location = get_test_loc('test_util/json/multi.jsonl')
+        base_dir = get_temp_dir()
+        errors, abouts = gen.load_inventory(location, base_dir)
+        assert not [e for e in errors if e.severity > INFO]
+        assert ['this', 'that'] == [a.name.value for a in abouts]
+        assert ['this.c', 'that.c'] == [list(a.about_resource.value)[0] for a in abouts]
+
+    def test_load_inventory_from_sqlite(self):
+        location = get_test_loc('test_util/json/multi.jsonl')
+        base_dir = get_temp_dir()
+        _errors, abouts = gen.load_inventory(location, base_dir)
+        inventory = get_temp_file('inventory.sqlite')
+        model.write_output(abouts, inventory, format='sqlite')
+
+        errors, abouts = gen.load_inventory(inventory, base_dir)
+        assert not [e for e in errors if e.severity > INFO]
+        assert ['this', 'that'] == [a.name.value for a in abouts]
+        assert ['this.c', 'that.c'] == [list(a.about_resource.value)[0] for a in abouts]
+
+    def test_load_inventory_from_sqlite_selects_license_filters_with_the_index(self):
+        test_dir = get_temp_dir()
+        for name, expression in [('this', 'gpl-2.0 or mit'), ('that', 'apache-2.0')]:
+            with open(os.path.join(test_dir, name + '.ABOUT'), 'w') as af:
+                af.write('about_resource: .\nname: {name}\nlicense_expression: {expression}\n'.format(**locals()))
+        _errors, abouts = model.collect_inventory(test_dir)
+        inventory = get_temp_file('inventory.sqlite')
+        model.write_output(abouts, inventory, format='sqlite')
+
+        predicate = compile_filter('license=MIT and name=th*')
+        with mock.patch('attributecode.util.load_sqlite', wraps=util.load_sqlite) as load_sqlite:
+            errors, abouts = gen.load_inventory(inventory, test_dir, predicate=predicate)
+        load_sqlite.assert_called_once_with(inventory, license_key={'mit'})
+        assert not [e for e in errors if e.severity > INFO]
+        assert ['this'] == [a.name.value for a in abouts]
+
+        predicate = compile_filter('license=mit and name=that')
+        errors, abouts = gen.load_inventory(inventory, test_dir, predicate=predicate)
+        assert [] == abouts
+
+    def test_load_inventory_without_path_checks(self):
+        location = get_test_loc('test_gen/lic_issue_450/custom_and_valid_lic_key_with_file.csv')
+        base_dir = get_temp_dir()
+        reference_dir = get_test_loc('test_gen/lic_issue_450')
+        errors, abouts = gen.load_inventory(
+            location, base_dir, reference_dir=reference_dir, check_paths=False)
+        assert [] == [e for e in errors if 'about_resource' in e.message]
+        assert ['test.c', 'test.h'] == [a.name.value for a in abouts]
+        license_texts = list(abouts[0].license_file.value.values())
+        assert ['This is a custom license.'] == [t.strip() for t in license_texts]
+
+    def test_load_inventory_without_path_checks_reports_newline_in_file_fields(self):
+        location = get_temp_file('inventory.csv')
+        with open(location, 'w', newline='') as inv:
+            inv.write('about_resource,name,notice_file\n/test/test.c,test.c,"NOTICE\nNOTICE2"\n')
+        errors, abouts = gen.load_inventory(location, get_temp_dir(), check_paths=False)
+        expected = [
+            Error(CRITICAL,
+                  "New line character detected in 'notice_file' for '/test/test.c' which is not supported."
+                  "\nPlease use ',' to declare multiple files.")]
+        assert expected == errors
+        assert [] == abouts
+
     def test_load_inventory_with_errors(self):
         location = get_test_loc('test_gen/inv4.csv')
         base_dir = get_temp_dir()
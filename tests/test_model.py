@@ -19,6 +19,8 @@ import json
 import os
 import posixpath
 import shutil
+import sqlite3
+import stat
 import unittest
 
 import mock
@@ -32,9 +34,11 @@ from attributecode import Error
 from attributecode import model
 from attributecode.util import add_unc, norm, on_windows
 from attributecode.util import load_csv
+from attributecode.util import load_sqlite
 from attributecode.util import to_posix
 from attributecode.util import replace_tab_with_spaces
 
+from testing_utils import create_test_files
 from testing_utils import extract_test_loc
 from testing_utils import get_temp_dir
 from testing_utils import get_temp_file
@@ -675,6 +679,22 @@ this software and releases the component to Public Domain.
         result = model.get_field_names(abouts)
         assert expected == result
 
+    def test_FieldNamesTracker_tracks_field_names_incrementally(self):
+        tracker = model.FieldNamesTracker()
+        assert [] == tracker.get_field_names()
+        a = model.About()
+        a.version.present = True
+        a.custom_fields['g'] = model.StringField(name='g', value='1', present=True)
+        tracker.add(a)
+        assert ['about_resource', 'name', 'version', 'g'] == tracker.get_field_names()
+        b = model.About()
+        b.license_expression.present = True
+        b.custom_fields['f'] = model.StringField(name='f', value='1', present=True)
+        b.custom_fields['empty'] = model.StringField(name='empty', present=True)
+        tracker.add(b)
+        expected = ['about_resource', 'name', 'version', 'license_expression', 'f', 'g']
+        assert expected == tracker.get_field_names()
+
     def test_comma_in_license(self):
         test_file = get_test_loc('test_model/special_char/about.ABOUT')
         a = model.About(test_file)
@@ -833,6 +853,45 @@ custom1: |
                 filtered_result.append(line)
         assert expected == filtered_result
 
+    def test_dumps_about_is_the_same_as_saneyaml_dump(self):
+        data = dict([
+            ('about_resource', '.'),
+            ('name', 'Domen Kožar: nose'),
+            ('version', '1.0'),
+            ('description', 'multi\nline\n\n  with indent\n'),
+            ('homepage_url', 'http://example.com/#anchor'),
+            ('notes', 'trailing space \nbefore a line break'),
+            ('copyright', 'Copyright (c) 2012 ' + 'x' * 100 + ' and others'),
+            ('owner', "it's 012"),
+            ('contact', '- dash'),
+            ('checksum_md5', '0123'),
+            ('spec_version', 'null'),
+            ('redistribute', True),
+            ('attribute', False),
+            ('custom', '2020-01-01'),
+            ('licenses', [
+                dict([('key', 'mit'), ('name', 'MIT License'), ('file', 'mit.LICENSE')]),
+                dict([('key', 'apache-2.0'), ('name', 'Apache\n2.0')]),
+            ]),
+        ])
+        assert saneyaml.dump(data) == model.dumps_about(data)
+        for key, value in data.items():
+            assert saneyaml.dump({key: value}) == model.dumps_about({key: value})
+        assert saneyaml.dump({}) == model.dumps_about({})
+
+    def test_About_dumps_round_trips_with_load(self):
+        test_file = get_test_loc('test_model/this.ABOUT')
+        a = model.About(test_file)
+        a.notes.value = 'first line\nsecond: line\n\nlast line'
+        a.version.value = '1.10'
+        dumped_file = get_temp_file('that.ABOUT')
+        a.dump(dumped_file)
+
+        b = model.About(dumped_file)
+        assert a.notes.value == b.notes.value
+        assert '1.10' == b.version.value
+        assert a.dumps() == b.dumps()
+
     def test_load_can_load_unicode(self):
         test_file = get_test_loc('test_model/unicode/nose-selecttests.ABOUT')
         a = model.About()
@@ -982,6 +1041,69 @@ custom1: |
         expected = get_test_loc('test_model/expected.json')
         check_json(expected, result)
 
+    def test_write_output_jsonl(self):
+        path = 'test_model/this.ABOUT'
+        test_file = get_test_loc(path)
+        abouts = model.About(location=test_file, about_file_path=path)
+
+        result = get_temp_file('inventory.jsonl')
+        errors = model.write_output([abouts, abouts], result, format='jsonl')
+        assert [] == errors
+
+        expected = dict(about_resource='/test_model/', name='AboutCode', version='0.11.0')
+        with io.open(result, encoding='utf-8') as res:
+            lines = res.read().splitlines()
+        assert [expected, expected] == [json.loads(line) for line in lines]
+
+    def test_write_output_sqlite(self):
+        test_dir = get_temp_dir()
+        for name, expression in [('this', 'gpl-2.0 or mit'), ('that', 'apache-2.0')]:
+            os.mkdir(os.path.join(test_dir, name))
+            with io.open(os.path.join(test_dir, name, name + '.ABOUT'), 'w') as af:
+                af.write('about_resource: .\nname: {name}\nlicense_expression: {expression}\n'.format(**locals()))
+        _errors, abouts = model.collect_inventory(test_dir)
+        abouts = sorted(abouts, key=lambda a: a.name.value)
+
+        result = get_temp_file('inventory.sqlite')
+        errors = model.write_output(
+            abouts, result, format='sqlite', errors=[Error(INFO, 'some info')])
+        assert [] == errors
+
+        # the components are the same as the rows of a CSV inventory
+        csv_result = get_temp_file('inventory.csv')
+        model.write_output(abouts, csv_result, format='csv')
+        assert load_csv(csv_result) == load_sqlite(result)
+
+        # the licenses of the components are the keys of their license expression
+        assert ['this'] == [c['name'] for c in load_sqlite(result, license_key='mit')]
+        assert ['this'] == [c['name'] for c in load_sqlite(result, license_key='gpl-2.0')]
+        assert ['that'] == [c['name'] for c in load_sqlite(result, license_key='apache-2.0')]
+        assert [] == load_sqlite(result, license_key='bsd-new')
+
+        connection = sqlite3.connect(result)
+        try:
+            licenses = list(connection.execute('SELECT key FROM licenses ORDER BY key'))
+            saved_errors = list(connection.execute('SELECT severity, message FROM errors'))
+        finally:
+            connection.close()
+        assert [('apache-2.0',), ('gpl-2.0',), ('mit',)] == licenses
+        assert [(INFO, 'some info')] == saved_errors
+
+    @unittest.skipIf(on_windows, 'Windows has no file mode bits')
+    def test_write_output_sqlite_has_default_or_existing_permissions(self):
+        path = 'test_model/this.ABOUT'
+        about = model.About(location=get_test_loc(path), about_file_path=path)
+        result = get_temp_file('inventory.sqlite')
+        umask = os.umask(0)
+        os.umask(umask)
+
+        assert [] == model.write_output([about], result, format='sqlite')
+        assert 0o666 & ~umask == stat.S_IMODE(os.stat(result).st_mode)
+
+        os.chmod(result, 0o640)
+        assert [] == model.write_output([about], result, format='sqlite')
+        assert 0o640 == stat.S_IMODE(os.stat(result).st_mode)
+
     def test_android_module_license(self):
         path = 'test_model/android/single_license.c.ABOUT'
         test_file = get_test_loc(path)
@@ -1110,6 +1232,13 @@ class CollectorTest(unittest.TestCase):
         # The not supported 'resource' value is collected
         assert abouts[0].resource.value
 
+    def test_collect_inventory_tracks_field_names(self):
+        test_loc = get_test_loc('test_model/inventory/custom_fields.ABOUT')
+        tracker = model.FieldNamesTracker()
+        _errors, abouts = model.collect_inventory(test_loc, tracker=tracker)
+        assert model.get_field_names(abouts) == tracker.get_field_names()
+        assert 'resource' in tracker.get_field_names()
+
     def test_collect_inventory_does_not_raise_error_and_maintains_order_on_custom_fields(self):
         test_loc = get_test_loc('test_model/inventory/custom_fields2.ABOUT')
         errors, abouts = model.collect_inventory(test_loc)
@@ -1135,6 +1264,27 @@ class CollectorTest(unittest.TestCase):
         assert expected_lic == returned_lic
         assert expected_spec_char == spec_char
 
+    def test_parse_license_expression_is_cached_and_returns_new_lists(self):
+        model.parse_license_expression_cached.cache_clear()
+        spec_char, returned_lic = model.parse_license_expression('gpl-2.0 or bsd-new')
+        returned_lic.append('mit')
+        spec_char, returned_lic = model.parse_license_expression('gpl-2.0 or bsd-new')
+        assert returned_lic == ['gpl-2.0', 'bsd-new']
+        assert spec_char == []
+        cache_info = model.parse_license_expression_cached.cache_info()
+        assert cache_info.misses == 1
+        assert cache_info.hits == 1
+
+    def test_preload_license_keys(self):
+        try:
+            model.preload_license_keys(['apache-2.0', 'mit'])
+            _spec_char, returned_lic = model.parse_license_expression('MIT or Apache-2.0')
+            assert returned_lic == ['mit', 'apache-2.0']
+        finally:
+            model.preload_license_keys([])
+        _spec_char, returned_lic = model.parse_license_expression('MIT or Apache-2.0')
+        assert returned_lic == ['MIT', 'Apache-2.0']
+
     def test_collect_inventory_works_with_relative_paths(self):
         # FIXME: This test need to be run under src/attributecode/
         # or otherwise it will fail as the test depends on the launching
@@ -1251,13 +1401,178 @@ class CollectorTest(unittest.TestCase):
         for file in expected_file:
             assert file in copied_files
 
+    def test_copy_redist_src_with_hardlinks(self):
+        test_loc = get_test_loc('test_model/redistribution/')
+        copy_list = [get_test_loc('test_model/redistribution/this.c'), get_test_loc('test_model/redistribution/test/subdir')]
+        output = get_temp_dir()
+
+        err = model.copy_redist_src(copy_list, test_loc, output, True, link_mode='hardlink', threads=2)
+        assert err == []
+
+        for path in ('this.c', 'test/subdir/test.c', 'test/subdir/test.ABOUT'):
+            assert os.path.isfile(os.path.join(output, path))
+
+        err = model.copy_redist_src(copy_list, test_loc, output, True)
+        expected = [
+            Error(WARNING, os.path.join(output, 'this.c') + ' is already existed and is replaced by ' + copy_list[0]),
+            Error(WARNING, os.path.join(output, 'test', 'subdir') + ' is already existed and is replaced by ' + copy_list[1]),
+        ]
+        assert err == expected
+
+    def test_archive_redist_src_to_zip_with_structure(self):
+        import zipfile
+        test_loc = get_test_loc('test_model/redistribution/')
+        copy_list = [get_test_loc('test_model/redistribution/this.c'), get_test_loc('test_model/redistribution/test/subdir')]
+        output = os.path.join(get_temp_dir(), 'output.zip')
+
+        err, counts = model.archive_redist_src(copy_list, test_loc, output, True, compression='store')
+        assert err == []
+        assert dict(duplicates=0, saved=0) == counts
+
+        with zipfile.ZipFile(output) as zipf:
+            expected = ['this.c', 'test/subdir/', 'test/subdir/test.ABOUT', 'test/subdir/test.c']
+            assert expected == zipf.namelist()
+            assert all(info.compress_type == zipfile.ZIP_STORED for info in zipf.infolist())
+
+    def test_archive_redist_src_to_tar_xz_reports_duplicates(self):
+        import tarfile
+        test_loc = get_test_loc('test_model/redistribution/')
+        this = get_test_loc('test_model/redistribution/this.c')
+        output = os.path.join(get_temp_dir(), 'output.tar.xz')
+
+        err, _counts = model.archive_redist_src([this, this], test_loc, output, False)
+        expected = [Error(WARNING, "Duplicated archive member 'this.c' from %r is not added." % this)]
+        assert expected == err
+
+        with tarfile.open(output) as tar:
+            assert ['this.c'] == tar.getnames()
+
+    @unittest.skipIf(on_windows, 'Symlinks are not supported on Windows')
+    def test_archive_redist_src_follows_symlinks_in_zip_and_tar(self):
+        import tarfile
+        import zipfile
+        test_loc = get_temp_dir()
+        create_test_files(test_loc, [('pkg/real/f.txt', 'f'), ('other/o.txt', 'o')])
+        os.symlink('real', os.path.join(test_loc, 'pkg', 'link'))
+        os.symlink('../other/o.txt', os.path.join(test_loc, 'pkg', 'o.txt'))
+        copy_list = [os.path.join(test_loc, 'pkg')]
+        expected = [
+            'pkg/', 'pkg/o.txt', 'pkg/link/', 'pkg/link/f.txt', 'pkg/real/', 'pkg/real/f.txt']
+        expected_files = {'pkg/o.txt': b'o', 'pkg/link/f.txt': b'f', 'pkg/real/f.txt': b'f'}
+
+        output = os.path.join(get_temp_dir(), 'output.zip')
+        err, _counts = model.archive_redist_src(copy_list, test_loc, output, True)
+        assert err == []
+        with zipfile.ZipFile(output) as zipf:
+            assert expected == zipf.namelist()
+            assert expected_files == {name: zipf.read(name) for name in expected_files}
+
+        output = os.path.join(get_temp_dir(), 'output.tar.gz')
+        err, _counts = model.archive_redist_src(copy_list, test_loc, output, True)
+        assert err == []
+        extracted = get_temp_dir()
+        with tarfile.open(output) as tar:
+            assert [name.rstrip('/') for name in expected] == tar.getnames()
+            assert not [member for member in tar.getmembers() if member.issym()]
+            tar.extractall(extracted)
+        for name, content in expected_files.items():
+            with open(os.path.join(extracted, name), 'rb') as inp:
+                assert content == inp.read()
+
+    def test_sync_redist_src_copies_changed_files_and_removes_stale_files(self):
+        test_loc = get_temp_dir()
+        create_test_files(test_loc, [('this.c', 'this'), ('test/subdir/test.c', 'test')])
+        this = os.path.join(test_loc, 'this.c')
+        subdir = os.path.join(test_loc, 'test', 'subdir')
+        output = get_temp_dir()
+        manifest = output + '-manifest.json'
+
+        err, counts = model.sync_redist_src([subdir, this], test_loc, output, True, manifest)
+        assert err == []
+        assert dict(copied=2, unchanged=0, removed=0) == counts
+
+        err, counts = model.sync_redist_src([subdir, this], test_loc, output, True, manifest)
+        assert err == []
+        assert dict(copied=0, unchanged=2, removed=0) == counts
+
+        with open(this, 'w') as of:
+            of.write('changed content')
+        err, counts = model.sync_redist_src([this], test_loc, output, True, manifest, checksum=True)
+        assert err == []
+        assert dict(copied=1, unchanged=0, removed=1) == counts
+        assert ['this.c'] == os.listdir(output)
+        with open(os.path.join(output, 'this.c')) as inp:
+            assert 'changed content' == inp.read()
+
+    def make_duplicated_sources(self):
+        test_loc = get_temp_dir()
+        create_test_files(test_loc, [
+            ('a/vendor.tgz', 'same content'),
+            ('b/vendor.tgz', 'same content'),
+            ('b/other.c', 'other content'),
+        ])
+        copy_list = [os.path.join(test_loc, 'a'), os.path.join(test_loc, 'b')]
+        return test_loc, copy_list
+
+    def test_dedup_redist_src_creates_hard_links(self):
+        test_loc, copy_list = self.make_duplicated_sources()
+        output = get_temp_dir()
+
+        err, counts = model.dedup_redist_src(copy_list, test_loc, output, True, threads=2)
+        assert err == []
+        assert dict(duplicates=1, saved=len('same content')) == counts
+
+        original = os.stat(os.path.join(output, 'a', 'vendor.tgz'))
+        duplicate = os.stat(os.path.join(output, 'b', 'vendor.tgz'))
+        other = os.stat(os.path.join(output, 'b', 'other.c'))
+        if not on_windows:
+            assert original.st_ino == duplicate.st_ino
+            assert original.st_ino != other.st_ino
+
+    def test_dedup_redist_src_does_not_count_duplicates_copied_without_hard_links(self):
+        test_loc, copy_list = self.make_duplicated_sources()
+        output = get_temp_dir()
+
+        with mock.patch('os.link', side_effect=OSError('not supported')):
+            err, counts = model.dedup_redist_src(copy_list, test_loc, output, True)
+        assert err == []
+        assert dict(duplicates=0, saved=0) == counts
+        with open(os.path.join(output, 'b', 'vendor.tgz')) as inp:
+            assert 'same content' == inp.read()
+
+    def test_archive_redist_src_dedup_in_zip_and_tar(self):
+        import tarfile
+        import zipfile
+        test_loc, copy_list = self.make_duplicated_sources()
+
+        output = os.path.join(get_temp_dir(), 'output.zip')
+        err, counts = model.archive_redist_src(copy_list, test_loc, output, True, dedup=True)
+        assert err == []
+        assert dict(duplicates=1, saved=len('same content')) == counts
+        with zipfile.ZipFile(output) as zipf:
+            expected = ['a/', 'a/vendor.tgz', 'b/', 'b/other.c', 'dedup-manifest.json']
+            assert expected == zipf.namelist()
+            manifest = json.loads(zipf.read('dedup-manifest.json'))
+            assert {'b/vendor.tgz': 'a/vendor.tgz'} == manifest['duplicates']
+
+        output = os.path.join(get_temp_dir(), 'output.tar.gz')
+        err, counts = model.archive_redist_src(copy_list, test_loc, output, True, dedup=True)
+        assert err == []
+        assert dict(duplicates=1, saved=len('same content')) == counts
+        extracted = get_temp_dir()
+        with tarfile.open(output) as tar:
+            assert tar.getmember('b/vendor.tgz').islnk()
+            tar.extractall(extracted)
+        with open(os.path.join(extracted, 'b', 'vendor.tgz')) as inp:
+            assert 'same content' == inp.read()
+
     def test_get_copy_list(self):
         location = get_test_loc('test_model/redistribution/')
         result = get_temp_file()
         errors, abouts = model.collect_inventory(location)
         copy_list, err = model.get_copy_list(abouts, location)
         assert err == []
-        expected = [os.path.join(location, 'this.c'), os.path.join(location, 'test/subdir')]
+        expected = [os.path.join(location, 'test/subdir'), os.path.join(location, 'this.c')]
         if on_windows:
             norm_list = []
             for c in copy_list:
@@ -1266,6 +1581,23 @@ class CollectorTest(unittest.TestCase):
         else:
             assert copy_list == expected
 
+    def test_get_copy_list_does_not_match_shared_path_prefixes(self):
+        location = get_temp_dir()
+        create_test_files(location, [
+            ('lib/foo.c', ''),
+            ('lib/lib.ABOUT', 'about_resource: .\nname: lib\nredistribute: yes\n'),
+            ('libfoo/bar.c', ''),
+            ('libfoo/bar.ABOUT', 'about_resource: bar.c\nname: bar\nredistribute: yes\n'),
+            ('lib/sub/baz.c', ''),
+            ('lib/sub/baz.ABOUT', 'about_resource: baz.c\nname: baz\nredistribute: yes\n'),
+        ])
+
+        _errors, abouts = model.collect_inventory(location)
+        copy_list, err = model.get_copy_list(abouts, location)
+        assert err == []
+        expected = [os.path.join(location, 'lib'), os.path.join(location, 'libfoo', 'bar.c')]
+        assert [norm(c) for c in copy_list] == [norm(c) for c in expected]
+
 
 class FetchLicenseTest(unittest.TestCase):
 
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+
+# ============================================================================
+#  Copyright (c) nexB Inc. http://www.nexb.com/ - All rights reserved.
+#  Licensed under the Apache License, Version 2.0 (the "License");
+#  you may not use this file except in compliance with the License.
+#  You may obtain a copy of the License at
+#      http://www.apache.org/licenses/LICENSE-2.0
+#  Unless required by applicable law or agreed to in writing, software
+#  distributed under the License is distributed on an "AS IS" BASIS,
+#  WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#  See the License for the specific language governing permissions and
+#  limitations under the License.
+# ============================================================================
+
+import unittest
+
+from testing_utils import get_test_loc
+
+from attributecode import model
+from attributecode.query import compile_filter
+from attributecode.query import get_tokens
+
+
+class QueryTest(unittest.TestCase):
+
+    def test_get_tokens(self):
+        expected = [
+            ('value', 'owner'), ('operator', '='), ('value', 'nexB Inc.'),
+            ('keyword', 'and'), ('keyword', 'not'), ('value', 'license'),
+            ('keyword', 'in'), ('operator', '('), ('value', 'gpl-*'),
+            ('operator', ','), ('value', 'mit'), ('operator', ')'),
+        ]
+        assert expected == get_tokens('owner="nexB Inc." AND not license in (gpl-*, mit)')
+
+    def test_compile_filter_matches_fields_with_wildcards_and_case(self):
+        data = {'Name': 'zlib', 'owner': 'Jean-loup Gailly', 'version': '1.2.11'}
+        assert compile_filter('name=zlib')(data)
+        assert compile_filter('name=ZLIB')(data)
+        assert compile_filter('owner="jean-loup *"')(data)
+        assert compile_filter('version=1.2.*')(data)
+        assert not compile_filter('name!=zlib')(data)
+        assert compile_filter('name!=openssl')(data)
+        assert not compile_filter('homepage_url=*')(data)
+        assert compile_filter('homepage_url!=*')(data)
+
+    def test_compile_filter_combines_with_and_or_not_and_parentheses(self):
+        data = {'name': 'zlib', 'version': '1.2.11'}
+        assert compile_filter('name=zlib and version=1.2.11')(data)
+        assert not compile_filter('name=zlib and version=1.0')(data)
+        assert compile_filter('name=openssl or version=1.2.11')(data)
+        assert compile_filter('not (name=openssl or version=1.0)')(data)
+        # and binds tighter than or
+        assert compile_filter('name=openssl and version=1.0 or name=zlib')(data)
+        assert not compile_filter('name=openssl and (version=1.0 or name=zlib)')(data)
+
+    def test_compile_filter_matches_booleans(self):
+        assert compile_filter('redistribute=yes')({'redistribute': 'True'})
+        assert compile_filter('redistribute=true')({'redistribute': 'y'})
+        assert compile_filter('redistribute=no')({'redistribute': False})
+        assert not compile_filter('redistribute=yes')({'redistribute': 'no'})
+        assert not compile_filter('redistribute=yes')({})
+
+    def test_compile_filter_matches_license_keys_of_expressions(self):
+        data = {'license_expression': 'gpl-2.0 WITH classpath-exception-2.0 OR mit'}
+        assert compile_filter('license=mit')(data)
+        assert compile_filter('license in (gpl-*, apache-2.0)')(data)
+        assert compile_filter('license=classpath-exception-2.0')(data)
+        assert not compile_filter('license=apache-2.0')(data)
+        assert compile_filter('license=apache-2.0')(
+            {'licenses': [{'key': 'apache-2.0', 'name': 'Apache 2.0'}]})
+        assert compile_filter('license_name="apache 2.0"')(
+            {'licenses': [{'key': 'apache-2.0', 'name': 'Apache 2.0'}]})
+
+    def test_compile_filter_license_keys_are_the_license_keys_required_to_match(self):
+        assert {'mit'} == compile_filter('license=MIT').license_keys
+        assert {'mit', 'gpl-2.0'} == compile_filter('license=mit or license in (gpl-2.0)').license_keys
+        assert {'mit'} == compile_filter('redistribute=yes and license=mit').license_keys
+        assert {'mit'} == compile_filter('license in (mit, bsd-new) and (license=mit)').license_keys
+        assert None is compile_filter('license=mit or name=zlib').license_keys
+        assert None is compile_filter('license in (gpl-*, mit)').license_keys
+        assert None is compile_filter('license!=mit').license_keys
+        assert None is compile_filter('not license=mit').license_keys
+        assert None is compile_filter('name=zlib').license_keys
+
+    def test_compile_filter_matches_multiple_values_of_csv_rows(self):
+        data = {'license_key': 'gpl-2.0\nmit', 'name': 'zlib'}
+        assert compile_filter('license_key=mit')(data)
+        assert compile_filter('license=gpl-2.0')(data)
+
+    def test_compile_filter_raises_value_error_on_invalid_expressions(self):
+        for expression in ('', 'name', 'name=', 'name=zlib and', '(name=zlib',
+                           'name in zlib', 'name=zlib)', 'name==zlib', 'name="zlib'):
+            try:
+                compile_filter(expression)
+                self.fail('No ValueError for: {!r}'.format(expression))
+            except ValueError:
+                pass
+
+    def test_collect_inventory_with_predicate_skips_excluded_about_files(self):
+        location = get_test_loc('test_cmd/repository-mini')
+        predicate = compile_filter('name=xtrans')
+        errors, abouts = model.collect_inventory(location, predicate=predicate)
+        assert ['xtrans'] == [a.name.value for a in abouts]
+        assert not [e for e in errors if 'appdirs' in e.message]
@@ -15,17 +15,29 @@
 # ============================================================================
 
 from collections import OrderedDict
+import io
+import json
+import os
+import stat
 import unittest
 
+from testing_utils import get_temp_dir
 from testing_utils import get_test_loc
 
+from attributecode import CRITICAL
 from attributecode.transform import check_duplicate_fields
+from attributecode.transform import get_csv_chunk_offsets
 from attributecode.transform import read_json
+from attributecode.transform import RequiredFieldsReport
+from attributecode.transform import transform_csv_to_csv
 from attributecode.transform import transform_data
+from attributecode.transform import transform_file
+from attributecode.transform import transform_json_to_json
 from attributecode.transform import normalize_dict_data
 from attributecode.transform import strip_trailing_fields_csv
 from attributecode.transform import strip_trailing_fields_json
 from attributecode.transform import Transformer
+from attributecode.util import on_windows
 
 
 class TransformTest(unittest.TestCase):
@@ -157,3 +169,294 @@ class TransformTest(unittest.TestCase):
         expected = [OrderedDict([(u'about_resource', u'/this.c'), (u'name', u'this.c'), (u'version', u'0.11.0')])]
         result = strip_trailing_fields_json(test)
         assert result == expected
+
+    def test_transform_csv_to_csv_streams_rows(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.csv')
+        with io.open(location, 'w', encoding='utf-8') as inp:
+            inp.write(
+                'Directory/Filename,Component,Confirmed Version\n'
+                '/tmp/test.c,test.c,v0.01\n'
+                '/tmp/tmp.h,tmp.h,\n')
+        output = os.path.join(test_dir, 'output.csv')
+        transformer = Transformer.from_file(get_test_loc('test_transform/configuration2'))
+
+        errors = transform_csv_to_csv(location, output, transformer)
+        assert [] == errors
+        with io.open(output, encoding='utf-8') as out:
+            result = out.read()
+        expected = (
+            'about_resource,name,version\n'
+            '/tmp/test.c,test.c,v0.01\n'
+            '/tmp/tmp.h,tmp.h,\n')
+        assert expected == result
+        assert ['input.csv', 'output.csv'] == sorted(os.listdir(test_dir))
+
+    @unittest.skipIf(on_windows, 'Windows has no file mode bits')
+    def test_transform_csv_to_csv_output_has_default_or_existing_permissions(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.csv')
+        with io.open(location, 'w', encoding='utf-8') as inp:
+            inp.write('Directory/Filename,Component\n/tmp/test.c,test.c\n')
+        transformer = Transformer.from_file(get_test_loc('test_transform/configuration2'))
+        umask = os.umask(0)
+        os.umask(umask)
+
+        for processes in (1, 2):
+            output = os.path.join(test_dir, 'output%d.csv' % processes)
+            errors = transform_csv_to_csv(
+                location, output, transformer, processes=processes, chunk_size=10)
+            assert [] == errors
+            assert 0o666 & ~umask == stat.S_IMODE(os.stat(output).st_mode)
+
+            os.chmod(output, 0o640)
+            errors = transform_csv_to_csv(
+                location, output, transformer, processes=processes, chunk_size=10)
+            assert [] == errors
+            assert 0o640 == stat.S_IMODE(os.stat(output).st_mode)
+
+    def test_transform_csv_to_csv_reports_bounded_errors_without_output(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.csv')
+        with io.open(location, 'w', encoding='utf-8') as inp:
+            inp.write('Directory/Filename,Component\n')
+            for i in range(5):
+                inp.write('/tmp/test{i}.c,\n'.format(i=i))
+        output = os.path.join(test_dir, 'output.csv')
+        transformer = Transformer.from_file(get_test_loc('test_transform/configuration2'))
+
+        errors = transform_csv_to_csv(location, output, transformer)
+        expected = ['Field name is missing required values in 5 rows: 0, 1, 2, 3, 4']
+        assert expected == [e.message for e in errors]
+        assert ['input.csv'] == os.listdir(test_dir)
+
+        errors = transform_csv_to_csv(location, output, transformer, max_errors=2)
+        expected = [
+            'Field name is missing required values in 2 rows: 0, 1',
+            'Transformation stopped after 2 rows with errors.',
+        ]
+        assert expected == [e.message for e in errors]
+        assert ['input.csv'] == os.listdir(test_dir)
+
+    def test_required_fields_report_keeps_counts_and_sample_rows(self):
+        report = RequiredFieldsReport(max_samples=2)
+        for rn in range(5):
+            report.add(rn, ['name', 'version'] if rn % 2 else ['name'])
+        other = RequiredFieldsReport(max_samples=2)
+        other.add(1, ['license_expression'])
+        report.merge(other, first_rn=10)
+
+        assert 6 == report.rows_count
+        expected = [
+            'Field name is missing required values in 5 rows: 0, 1, ...',
+            'Field version is missing required values in 2 rows: 1, 3',
+            'Field license_expression is missing required values in 1 rows: 11',
+        ]
+        assert expected == [e.message for e in report.get_errors()]
+        assert CRITICAL == report.get_errors()[0].severity
+
+    def test_column_plan_renames_filters_and_checks_in_one_pass(self):
+        transformer = Transformer(
+            field_renamings={'about_resource': 'path', 'location': 'path', 'name': 'Component'},
+            required_fields=['version'],
+            exclude_fields=['temp'],
+        )
+        field_names = ('path', 'Component', 'temp', 'version')
+        plan = transformer.get_column_plan(field_names)
+        assert plan is transformer.get_column_plan(list(field_names))
+
+        assert ['about_resource', 'location', 'name', 'version'] == plan.output_field_names
+        values = plan.transform_values(['/tmp/test.c', 'test.c', 'foo', '1.0'])
+        assert ('/tmp/test.c', '/tmp/test.c', 'test.c', '1.0') == values
+        assert [] == plan.get_missing_required_fields(values)
+
+        # short rows are padded with None
+        values = plan.transform_values(['/tmp/test.c', 'test.c'])
+        assert ('/tmp/test.c', '/tmp/test.c', 'test.c', None) == values
+        assert ['version'] == plan.get_missing_required_fields(values)
+
+    def test_column_plan_renamed_field_keeps_dict_semantics(self):
+        data = [OrderedDict([('name', 'a'), ('Component', 'b')])]
+        transformer = Transformer(field_renamings={'name': 'Component'})
+        expected = transformer.apply_renamings(data)
+        plan = transformer.get_column_plan(tuple(data[0]))
+        result = plan.transform_values(tuple(data[0].values()))
+        assert expected == [dict(zip(plan.output_field_names, result))]
+        assert [{'name': 'b'}] == expected
+
+    def test_value_transforms_are_applied_by_column_before_checks(self):
+        transformer = Transformer(
+            value_transforms={
+                'license_expression': [
+                    'strip',
+                    'lowercase',
+                    {'replace': {'pattern': r'gpl-2\.0\+', 'replacement': 'gpl-2.0-plus'}},
+                    {'default': 'unknown'},
+                ],
+                'name': [{'default': 'unnamed'}],
+                'notes': [{'split': ';'}],
+            },
+        )
+        plan = transformer.get_column_plan(['about_resource', 'name', 'license_expression', 'notes'])
+        rows = [
+            ['/a.c', 'a', ' GPL-2.0+ ', 'one; two;'],
+            ['/b.c', '', '', None],
+        ]
+        expected = [
+            ('/a.c', 'a', 'gpl-2.0-plus', 'one\ntwo'),
+            ('/b.c', 'unnamed', 'unknown', None),
+        ]
+        batch = plan.transform_batch(rows)
+        assert expected == batch
+        assert [] == plan.get_missing_required_fields(batch[1])
+
+    def test_value_transforms_are_picklable(self):
+        import pickle
+        transformer = Transformer(
+            value_transforms={'name': ['uppercase', {'replace': {'pattern': 'A+', 'replacement': 'a'}}]})
+        functions = pickle.loads(pickle.dumps(transformer.value_functions['name']))
+        value = 'baar'
+        for function in functions:
+            value = function(value)
+        assert 'BaR' == value
+
+    def test_invalid_value_transforms_raise_value_error(self):
+        for value_transforms in (
+            {'name': ['titlecase']},
+            {'name': [{'split': None}]},
+            {'name': [{'replace': {'pattern': '('}}]},
+            ['name'],
+        ):
+            try:
+                Transformer(value_transforms=value_transforms)
+                self.fail('ValueError not raised')
+            except ValueError:
+                pass
+
+    def test_get_csv_chunk_offsets_respects_quoted_new_lines(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.csv')
+        content = (
+            b'about_resource,notes\n'
+            b'/a.c,"multi\nline ""quoted""\nnotes"\n'
+            b'/b.c,b\n'
+            b'/c.c,"c\n"\n')
+        with open(location, 'wb') as inp:
+            inp.write(content)
+
+        offsets = get_csv_chunk_offsets(location, chunk_size=1)
+        chunks = [content[start:end] for start, end in offsets]
+        expected = [
+            b'/a.c,"multi\nline ""quoted""\nnotes"\n',
+            b'/b.c,b\n',
+            b'/c.c,"c\n"\n',
+        ]
+        assert expected == chunks
+
+    def test_transform_csv_to_csv_in_parallel_keeps_order_and_row_numbers(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.csv')
+        with io.open(location, 'w', encoding='utf-8') as inp:
+            inp.write('Directory/Filename,Component,Confirmed Version\n')
+            for i in range(50):
+                inp.write('/tmp/test{i}.c,"test\n{i}",{i}\n'.format(i=i))
+        transformer = Transformer.from_file(get_test_loc('test_transform/configuration2'))
+
+        serial_output = os.path.join(test_dir, 'serial.csv')
+        errors = transform_csv_to_csv(location, serial_output, transformer)
+        assert [] == errors
+        parallel_output = os.path.join(test_dir, 'parallel.csv')
+        errors = transform_csv_to_csv(
+            location, parallel_output, transformer, processes=3, chunk_size=100)
+        assert [] == errors
+        with open(serial_output, 'rb') as serial, open(parallel_output, 'rb') as parallel:
+            assert serial.read() == parallel.read()
+        assert ['input.csv', 'parallel.csv', 'serial.csv'] == sorted(os.listdir(test_dir))
+
+        with io.open(location, 'a', encoding='utf-8') as inp:
+            inp.write('/tmp/missing.c,,1\n')
+            inp.write('/tmp/test.c,test,1\n')
+            inp.write('/tmp/missing2.c,,1\n')
+        errors = transform_csv_to_csv(
+            location, os.path.join(test_dir, 'errors.csv'), transformer,
+            processes=3, chunk_size=100)
+        expected = ['Field name is missing required values in 2 rows: 50, 52']
+        assert expected == [e.message for e in errors]
+        errors = transform_csv_to_csv(
+            location, os.path.join(test_dir, 'errors.csv'), transformer,
+            processes=3, chunk_size=100, max_errors=1)
+        expected = [
+            'Field name is missing required values in 1 rows: 50',
+            'Transformation stopped after 1 rows with errors.',
+        ]
+        assert expected == [e.message for e in errors]
+        assert ['input.csv', 'parallel.csv', 'serial.csv'] == sorted(os.listdir(test_dir))
+
+    def test_transform_json_to_json_output_is_unchanged(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.json')
+        items = [
+            OrderedDict([('Directory/Filename', '/tmp/test.c'), ('Component', 'test.c'), ('version', '1')]),
+            OrderedDict([('Directory/Filename', '/tmp/tmp.h'), ('Component', 'tmp.h')]),
+        ]
+        with open(location, 'w') as inp:
+            json.dump(items, inp)
+        output = os.path.join(test_dir, 'output.json')
+        transformer = Transformer.from_file(get_test_loc('test_transform/configuration2'))
+
+        errors = transform_json_to_json(location, output, transformer)
+        assert [] == errors
+        expected = [
+            OrderedDict([('about_resource', '/tmp/test.c'), ('name', 'test.c'), ('version', '1')]),
+            OrderedDict([('about_resource', '/tmp/tmp.h'), ('name', 'tmp.h')]),
+        ]
+        with open(output) as out:
+            assert json.dumps(expected, indent=3) == out.read()
+
+    def test_transform_file_converts_json_to_csv_and_json_lines(self):
+        test_dir = get_temp_dir()
+        location = os.path.join(test_dir, 'input.json')
+        items = [
+            OrderedDict([('about_resource', '/a.c'), ('name', 'a'), ('authors', ['x', 'y'])]),
+            OrderedDict([('about_resource', '/b.c'), ('name', 'b'), ('license', 'mit')]),
+        ]
+        with open(location, 'w') as inp:
+            json.dump(items, inp)
+
+        csv_output = os.path.join(test_dir, 'output.csv')
+        assert [] == transform_file(location, csv_output, Transformer.default())
+        with io.open(csv_output, encoding='utf-8') as out:
+            result = out.read()
+        expected = (
+            'about_resource,name,authors,license\n'
+            '/a.c,a,"x\ny"\n'
+            '/b.c,b,,mit\n')
+        assert expected == result
+
+        jsonl_output = os.path.join(test_dir, 'output.jsonl')
+        assert [] == transform_file(csv_output, jsonl_output, Transformer.default())
+        with open(jsonl_output) as out:
+            result = [json.loads(line) for line in out]
+        expected = [
+            dict(about_resource='/a.c', name='a', authors='x\ny', license=None),
+            dict(about_resource='/b.c', name='b', authors='', license='mit'),
+        ]
+        assert expected == result
+
+        json_output = os.path.join(test_dir, 'output.json')
+        assert [] == transform_file(jsonl_output, json_output, Transformer.default())
+        with open(json_output) as out:
+            assert expected == json.load(out)
+
+    def test_transform_file_streams_scancode_files(self):
+        test_file = get_test_loc('test_transform/input_scancode.json')
+        output = os.path.join(get_temp_dir(), 'output.jsonl')
+        transformer = Transformer(
+            field_renamings={'about_resource': 'path'},
+            field_filters=['about_resource', 'name', 'size_count'])
+        errors = transform_file(test_file, output, transformer)
+        assert [] == errors
+        with open(output) as out:
+            result = [json.loads(line) for line in out]
+        expected = [dict(about_resource='samples', name='samples', size_count=1161083)]
+        assert expected == result
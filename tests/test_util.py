@@ -14,9 +14,13 @@
 #  limitations under the License.
 # ============================================================================
 
+import errno
+import os
+import shutil
 import string
 import unittest
 
+import mock
 import saneyaml
 
 from testing_utils import extract_test_loc
@@ -227,6 +231,24 @@ class TestResourcePaths(unittest.TestCase):
             result = util.get_relative_path(base_loc, full_loc)
             assert expected == result
 
+    def test_PathTrie_get_selected_is_minimal_and_sorted(self):
+        trie = util.PathTrie()
+        assert trie.add(('lib', 'foo.c'))
+        assert trie.add(('libfoo',))
+        assert trie.add(('lib',))
+        assert not trie.add(('lib', 'bar.c'))
+        assert not trie.add(('lib',))
+        assert trie.add(('a', 'b'))
+        expected = [('a', 'b'), ('lib',), ('libfoo',)]
+        assert expected == trie.get_selected()
+
+    def test_PathTrie_root_covers_all_paths(self):
+        trie = util.PathTrie()
+        assert trie.add(('lib', 'foo.c'))
+        assert trie.add(())
+        assert not trie.add(('src',))
+        assert [()] == trie.get_selected()
+
     def test_get_relative_path_with_same_path_twice(self):
         test = [('/some/path/file', 'path/file'),
                 ('/path/file', 'path/file'),
@@ -411,6 +433,67 @@ class TestJson(unittest.TestCase):
         result = util.load_json(test_file)
         assert expected == result
 
+    def test_load_json_keeps_the_order_of_a_list(self):
+        test_file = os.path.join(get_temp_dir(), 'inventory.json')
+        with open(test_file, 'w') as tf:
+            tf.write('[{"name": "b"}, {"name": "a", "version": "1"}]')
+        expected = [dict(name='b'), dict(name='a', version='1')]
+        result = util.load_json(test_file)
+        assert expected == result
+
+    def test_read_json_lines(self):
+        test_file = get_test_loc('test_util/json/multi.jsonl')
+        expected = [
+            dict(about_resource='/load/this.c', name='this', version='0.11.0'),
+            dict(about_resource='/load/that.c', name='that'),
+        ]
+        result = list(util.read_json_lines(test_file))
+        assert expected == result
+
+    def test_read_json_entries_streams_scancode_files_with_small_chunks(self):
+        test_file = get_test_loc('test_util/json/scancode_info.json')
+        expected = util.load_json(test_file)
+        for chunk_size in (1, 7, 64):
+            result = list(util.read_json_entries(test_file, chunk_size=chunk_size))
+            assert expected == result
+
+    def test_read_json_entries_yields_items_before_the_end_of_the_file(self):
+        test_file = os.path.join(get_temp_dir(), 'scan.json')
+        with open(test_file, 'w') as tf:
+            tf.write(
+                '{"headers": [{"tool_name": "scancode-toolkit"}], '
+                '"files": [{"path": "a", "size": 12345}, {"path": "b", "size": 0}], '
+                'this is not valid JSON')
+        entries = util.read_json_entries(
+            test_file, util.get_scancode_entries_key, chunk_size=5)
+        expected = [dict(path='a', size=12345), dict(path='b', size=0)]
+        assert expected == list(entries)
+
+    def test_read_json_entries_loads_entries_found_before_the_format_key(self):
+        test_file = os.path.join(get_temp_dir(), 'export.json')
+        with open(test_file, 'w') as tf:
+            tf.write(
+                '{"components": [{"name": "a"}, {"name": "b"}], '
+                '"aboutcode_manager_notice": "notice"}')
+        result = list(util.read_json_entries(test_file, chunk_size=3))
+        assert [dict(name='a'), dict(name='b')] == result
+
+    def test_read_json_entries_yields_a_single_object(self):
+        test_file = os.path.join(get_temp_dir(), 'single.json')
+        with open(test_file, 'w') as tf:
+            tf.write('{"name": "a", "files": [1, 2]}')
+        result = list(util.read_json_entries(test_file, chunk_size=2))
+        assert [dict(name='a', files=[1, 2])] == result
+
+    def test_read_json_entries_reads_numbers_split_across_chunks(self):
+        test_file = os.path.join(get_temp_dir(), 'numbers.json')
+        with open(test_file, 'w') as tf:
+            tf.write('[100.25, 1.5e10, -3, 2E-3, 0]')
+        expected = [100.25, 1.5e10, -3, 2E-3, 0]
+        for chunk_size in range(1, 32):
+            result = list(util.read_json_entries(test_file, chunk_size=chunk_size))
+            assert expected == result, chunk_size
+
     def test_load_json_from_abc_mgr(self):
         test_file = get_test_loc('test_util/json/aboutcode_manager_exported.json')
         expected = [dict(dict([
@@ -658,3 +741,185 @@ description: sample
         assert len(licenses) == len(files_list)
         for license in licenses:
             assert license in files_list
+
+    def test_copy_file_data_copy_does_not_write_through_hard_links(self):
+        base = get_temp_dir()
+        source = os.path.join(base, 'source.txt')
+        target = os.path.join(base, 'target.txt')
+        with open(source, 'w') as of:
+            of.write('source')
+        os.link(source, target)
+
+        other = os.path.join(base, 'other.txt')
+        with open(other, 'w') as of:
+            of.write('other')
+        util.copy_file_data(other, target)
+
+        with open(source) as inp:
+            assert 'source' == inp.read()
+        with open(target) as inp:
+            assert 'other' == inp.read()
+
+    def test_copy_file_data_with_link_modes(self):
+        base = get_temp_dir()
+        source = os.path.join(base, 'source.txt')
+        content = 'some content\n' * 10000
+        with open(source, 'w') as of:
+            of.write(content)
+
+        for link_mode in util.LINK_MODES:
+            target = os.path.join(base, link_mode + '.txt')
+            util.copy_file_data(source, target, link_mode)
+            with open(target) as inp:
+                assert content == inp.read()
+            assert os.path.getmtime(source) == os.path.getmtime(target)
+
+        if on_posix:
+            assert os.stat(source).st_ino == os.stat(os.path.join(base, 'hardlink.txt')).st_ino
+            assert os.stat(source).st_ino != os.stat(os.path.join(base, 'copy.txt')).st_ino
+
+    def test_copy_file_content_falls_back_to_buffered_copy(self):
+        base = get_temp_dir()
+        source = os.path.join(base, 'source.txt')
+        target = os.path.join(base, 'target.txt')
+        with open(source, 'w') as of:
+            of.write('content')
+
+        def unsupported(*args):
+            raise OSError(errno.ENOSYS, 'not supported')
+
+        with mock.patch.object(util, 'get_kernel_copies', return_value=[unsupported]):
+            with open(source, 'rb') as inp, open(target, 'wb') as out:
+                util.copy_file_content(inp, out)
+        with open(target) as inp:
+            assert 'content' == inp.read()
+
+    def test_copy_files_in_parallel_reports_errors(self):
+        base = get_temp_dir()
+        copies = []
+        for i in range(20):
+            source = os.path.join(base, 'source%d.txt' % i)
+            with open(source, 'w') as of:
+                of.write(str(i))
+            copies.append((source, os.path.join(base, 'target%d.txt' % i)))
+        missing = os.path.join(base, 'missing.txt')
+        copies.append((missing, os.path.join(base, 'target.txt')))
+
+        errors = util.copy_files(copies, threads=4)
+        assert [Error(CRITICAL, 'Cannot copy file at %r.' % missing)] == errors
+        for i in range(20):
+            with open(os.path.join(base, 'target%d.txt' % i)) as inp:
+                assert str(i) == inp.read()
+
+    def test_get_archive_format(self):
+        assert 'zip' == util.get_archive_format('/out/sources.ZIP')
+        assert 'w:gz' == util.get_archive_format('sources.tar.gz')
+        assert 'w:gz' == util.get_archive_format('sources.tgz')
+        assert 'w:xz' == util.get_archive_format('sources.tar.xz')
+        assert util.get_archive_format('sources.tar') is None
+
+    def test_get_zip_compression(self):
+        import zipfile
+        assert zipfile.ZIP_STORED == util.get_zip_compression('lib/foo.JAR')
+        assert zipfile.ZIP_DEFLATED == util.get_zip_compression('lib/foo.c')
+        assert zipfile.ZIP_DEFLATED == util.get_zip_compression('lib/foo.jar', 'deflate')
+        assert zipfile.ZIP_STORED == util.get_zip_compression('lib/foo.c', 'store')
+
+    def test_get_duplicates(self):
+        base = get_temp_dir()
+        locations = []
+        for name, content in [('1', 'a'), ('2', 'b'), ('3', 'a'), ('4', 'ab'), ('5', ''), ('6', '')]:
+            location = os.path.join(base, name)
+            with open(location, 'w') as of:
+                of.write(content)
+            locations.append(location)
+
+        result = util.get_duplicates(locations + [os.path.join(base, 'missing')], threads=2)
+        assert {locations[2]: locations[0]} == result
+
+    def test_extract_zip_without_cache_dir_extracts_in_a_temporary_directory(self):
+        import zipfile
+        location = os.path.join(get_temp_dir(), 'project.zip')
+        with zipfile.ZipFile(location, 'w') as zipf:
+            zipf.writestr('project/a.ABOUT', 'name: a\n')
+
+        target_dir = util.extract_zip(location)
+        other_target_dir = util.extract_zip(location)
+        assert target_dir != other_target_dir
+        for extracted in (target_dir, other_target_dir):
+            assert 'project' == os.path.basename(extracted)
+            assert os.path.dirname(extracted) in util.temp_dirs_to_remove
+            assert os.path.exists(os.path.join(extracted, 'project', 'a.ABOUT'))
+        util.remove_temp_dirs()
+        assert not os.path.exists(target_dir)
+
+    def test_extract_zip_is_cached_by_content(self):
+        import zipfile
+        base = get_temp_dir()
+        location = os.path.join(base, 'project.zip')
+        with zipfile.ZipFile(location, 'w') as zipf:
+            zipf.writestr('project/a.ABOUT', 'name: a\n')
+            zipf.writestr('project/empty/', '')
+            zipf.writestr('../outside.txt', 'outside')
+        cache_dir = get_temp_dir()
+
+        target_dir = util.extract_zip(location, cache_dir=cache_dir, threads=2)
+        assert os.path.join(cache_dir, util.get_file_sha1(location), 'project') == target_dir
+        with open(os.path.join(target_dir, 'project', 'a.ABOUT')) as inp:
+            assert 'name: a\n' == inp.read()
+        assert os.path.isdir(os.path.join(target_dir, 'project', 'empty'))
+        assert ['project'] == os.listdir(target_dir)
+
+        # the same content is not extracted again
+        extra = os.path.join(target_dir, 'project', 'extra.txt')
+        with open(extra, 'w') as of:
+            of.write('extra')
+        assert target_dir == util.extract_zip(location, cache_dir=cache_dir)
+        assert os.path.exists(extra)
+
+        # unless the cached tree is incomplete
+        os.remove(os.path.join(target_dir, 'project', 'a.ABOUT'))
+        assert target_dir == util.extract_zip(location, cache_dir=cache_dir)
+        assert os.path.exists(os.path.join(target_dir, 'project', 'a.ABOUT'))
+        assert not os.path.exists(extra)
+        with open(os.path.join(target_dir, 'project', 'a.ABOUT'), 'w') as of:
+            of.write('name:')
+        assert target_dir == util.extract_zip(location, cache_dir=cache_dir)
+        with open(os.path.join(target_dir, 'project', 'a.ABOUT')) as inp:
+            assert 'name: a\n' == inp.read()
+
+        copy = os.path.join(base, 'copy.zip')
+        shutil.copyfile(location, copy)
+        copy_target_dir = util.extract_zip(copy, cache_dir=cache_dir)
+        assert os.path.join(os.path.dirname(target_dir), 'copy') == copy_target_dir
+        assert os.path.exists(os.path.join(copy_target_dir, 'project', 'a.ABOUT'))
+        util.remove_temp_dirs()
+        assert [util.get_file_sha1(location)] == os.listdir(cache_dir)
+
+    @unittest.skipIf(on_windows, 'Windows has no file mode bits')
+    def test_get_extract_cache_dir_is_private_to_the_user(self):
+        import stat
+        cache_home = get_temp_dir()
+        util.get_extract_cache_dir.cache_clear()
+        try:
+            with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}):
+                cache_dir = util.get_extract_cache_dir()
+            assert os.path.join(cache_home, 'aboutcode-toolkit', 'extract-cache') == cache_dir
+            assert 0o700 == stat.S_IMODE(os.stat(cache_dir).st_mode)
+
+            # a directory owned by another user is not used
+            util.get_extract_cache_dir.cache_clear()
+            with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': cache_home}), \
+                    mock.patch('os.getuid', return_value=os.getuid() + 1):
+                temp_cache_dir = util.get_extract_cache_dir()
+            assert cache_dir != temp_cache_dir
+            assert 0o700 == stat.S_IMODE(os.stat(temp_cache_dir).st_mode)
+            assert temp_cache_dir in util.temp_dirs_to_remove
+        finally:
+            util.get_extract_cache_dir.cache_clear()
+
+    def test_remove_temp_dirs(self):
+        location = get_temp_dir()
+        util.remove_at_exit(location)
+        util.remove_temp_dirs()
+        assert not os.path.exists(location)
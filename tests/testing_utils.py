@@ -98,6 +98,19 @@ def get_temp_dir(sub_dir_path=None):
     return new_temp_dir
 
 
+def create_test_files(location, files):
+    """
+    Create the files of a `files` list of (relative posix path, text content)
+    in the `location` directory, creating their parent directories as needed.
+    """
+    for path, content in files:
+        path = os.path.join(location, *path.split('/'))
+        if not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as of:
+            of.write(content)
+
+
 def extract_zip(location, target_dir):
     """
     Extract a zip archive file at location in the target_dir directory.